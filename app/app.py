@@ -2,16 +2,29 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from flask import Flask, request, jsonify, render_template, send_file
+from utils.model_registry import ModelRegistry, record_timing, timed_import, STARTUP_TIMINGS
+with record_timing('import flask'):
+    from flask import Flask, request, jsonify, render_template, send_file, stream_with_context, make_response, url_for
 import io
 import json
+import importlib.util
+import threading
+import time
 import uuid
 from datetime import datetime
-import numpy as np
-from tensorflow import keras
-from utils.preprocessing import preprocess_image
-from utils.qr_utils import generate_qr_image_bytes
-from utils.export_utils import export_predictions_to_csv
+from concurrent.futures import ThreadPoolExecutor
+with record_timing('import numpy'):
+    import numpy as np
+from utils.export_utils import EXPORT_FORMATS, iter_export
+from utils.prediction_store import PredictionStore
+from utils.batching import MicroBatcher
+from utils.inference_runtime import create_runtime, InferenceRuntime
+from utils.result_cache import LRUCache, hash_bytes, hash_array
+from utils.realtime import RealtimeHub, SharedFrames
+from utils.aggregates import RollingAggregates, WINDOWS as STATS_WINDOWS
+from utils.instrumentation import (
+    REGISTRY, Histogram, stage, begin_request_timing, end_request_timing, server_timing_header,
+)
 
 # -------------------------
 # Inicialización de Flask
@@ -25,61 +38,209 @@ app.config['UPLOAD_FOLDER'] = os.path.join('app','uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # -------------------------
-# Carga de modelos
+# Instrumentación por petición
+# -------------------------
+# Duración de cada petición por endpoint. La cabecera Server-Timing con el
+# desglose por etapas se añade con SERVER_TIMING=1 o, petición a petición,
+# con la cabecera `X-Server-Timing: 1` o el parámetro `?timing=1`.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+HTTP_DURATION = REGISTRY.histogram_family(
+    'http_request_duration_ms', 'Duración de las peticiones HTTP en milisegundos', 'endpoint'
+)
+
+@app.before_request
+def _start_request_timer():
+    request.start_time = time.perf_counter()
+    request.server_timing = (
+        SERVER_TIMING or request.headers.get('X-Server-Timing') == '1' or request.args.get('timing') == '1'
+    )
+    if request.server_timing:
+        begin_request_timing()
+
+@app.after_request
+def _finish_request_timer(response):
+    elapsed_ms = (time.perf_counter() - request.start_time) * 1000.0
+    HTTP_DURATION.labels(request.endpoint or 'unknown').observe(elapsed_ms)
+    if request.server_timing:
+        timings = end_request_timing() + [('total', elapsed_ms)]
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+# -------------------------
+# Carga de modelos (perezosa)
 # -------------------------
+# TensorFlow, OpenCV, PIL y qrcode se importan solo cuando una ruta los
+# necesita; las rutas sin inferencia sirven en cuanto arranca Flask.
 MLP_PATH = os.path.join('models', 'MLP_NUEVO.keras')
 CNN_PATH = os.path.join('models', 'CNN_MNIST.keras')
 
-mlp_model = keras.models.load_model(MLP_PATH, compile=False) if os.path.exists(MLP_PATH) else None
-cnn_model = keras.models.load_model(CNN_PATH, compile=False) if os.path.exists(CNN_PATH) else None
-
-if mlp_model:
-    mlp_model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
-if cnn_model:
-    cnn_model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+def _backend_for(model_name: str):
+    return os.environ.get(f'{model_name.upper()}_INFERENCE_BACKEND') or os.environ.get('INFERENCE_BACKEND')
+
+def _load_keras_model(path: str):
+    if not os.path.exists(path):
+        return None
+    keras = timed_import('tensorflow').keras
+    model = keras.models.load_model(path, compile=False)
+    model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    return model
+
+def _load_runtime(model_name: str, path: str):
+    # Runtime de inferencia (INFERENCE_BACKEND = function | tflite | keras | numpy)
+    # MLP_INFERENCE_BACKEND / CNN_INFERENCE_BACKEND permiten elegirlo por modelo
+    if not os.path.exists(path):
+        return None
+    backend = _backend_for(model_name)
+    if backend == 'numpy' and model_name == 'mlp':
+        # Motor NumPy cargado directamente del .keras, sin importar TensorFlow
+        mlp_numpy = timed_import('utils.mlp_numpy')
+        return InferenceRuntime(None, backend='numpy', name=model_name, engine=mlp_numpy.load_keras_mlp(path))
+    return create_runtime(model_registry.get(f'{model_name}_keras'), backend=backend, name=model_name)
+
+model_registry = ModelRegistry()
+model_registry.register('mlp_keras', lambda: _load_keras_model(MLP_PATH))
+model_registry.register('cnn_keras', lambda: _load_keras_model(CNN_PATH))
+model_registry.register('mlp', lambda: _load_runtime('mlp', MLP_PATH))
+model_registry.register('cnn', lambda: _load_runtime('cnn', CNN_PATH))
+
+def _preprocessing():
+    return timed_import('utils.preprocessing')
+
+# Calentamiento en segundo plano (MODEL_WARMUP=0 lo desactiva)
+if os.environ.get('MODEL_WARMUP', '1') != '0':
+    model_registry.warmup(names=['mlp', 'cnn'], imports=('utils.preprocessing', 'utils.qr_utils'))
 
 # -------------------------
 # Log de predicciones
 # -------------------------
+# El antiguo predictions.json se importa una sola vez al crear la base de datos
 PRED_LOG = os.path.join('app','predictions.json')
-if not os.path.exists(PRED_LOG):
-    with open(PRED_LOG, 'w') as f:
-        json.dump([], f)
+# PREDICTIONS_DB: otra base (p. ej. temporal en los benchmarks); no importa el JSON antiguo
+PRED_DB = os.environ.get('PREDICTIONS_DB', os.path.join('app','predictions.db'))
+prediction_store = PredictionStore(PRED_DB, legacy_json=None if 'PREDICTIONS_DB' in os.environ else PRED_LOG)
+
+# Copia opcional en Firestore (FIREBASE_SYNC=1): se encola y se envía por
+# lotes en segundo plano, así que no añade latencia a /predict
+FIREBASE_SYNC = os.environ.get('FIREBASE_SYNC', '0') == '1'
 
 def save_prediction_local(record: dict):
-    with open(PRED_LOG, 'r+', encoding='utf-8') as fh:
+    prediction_store.add(record)
+    if FIREBASE_SYNC and record.get('user'):
         try:
-            data = json.load(fh)
-        except json.JSONDecodeError:
-            data = []
-        data.insert(0, record)
-        fh.seek(0)
-        json.dump(data, fh, ensure_ascii=False, indent=2)
-        fh.truncate()
+            timed_import('utils.firebase_utils').save_prediction_to_firebase(record['user'], record)
+        except Exception as e:
+            print(f"Error encolando la predicción para Firestore: {e}")
+
+# -------------------------
+# Agregados para el panel (/stats)
+# -------------------------
+# La fuente es el almacén SQLite, común a todos los workers: cada lectura
+# suma las escrituras con `seq` posterior a la última contada por este
+# proceso, hagan las predicciones este worker u otro. La primera vez se
+# recorre el historial completo (`total`), guardando solo last_n + 24 h.
+STATS_LAST_N = int(os.environ.get('STATS_LAST_N', 500))
+prediction_stats = RollingAggregates(models=('mlp', 'cnn'), last_n=STATS_LAST_N)
+_stats_seq = None  # última `seq` del almacén incluida en los agregados
+_stats_lock = threading.Lock()
+
+def get_prediction_stats() -> RollingAggregates:
+    global _stats_seq
+    with _stats_lock:
+        # Las escrituras se serializan: todo lo que hay hasta MAX(seq) ya está confirmado
+        last = prediction_store.last_seq()
+        if _stats_seq is None:
+            with record_timing('seed stats'):
+                prediction_stats.seed(prediction_store.iter_records(before=last + 1))
+        elif last > _stats_seq:
+            prediction_stats.observe_many(
+                prediction_store.iter_records(after=_stats_seq, before=last + 1, oldest_first=True)
+            )
+        _stats_seq = last
+    return prediction_stats
 
 # -------------------------
 # Función para predecir con ambos modelos
 # -------------------------
-def predict_both_models(image_array):
-    result = {}
-
-    if mlp_model:
-        mlp_input = image_array.reshape(1, -1)
-        mlp_pred = mlp_model.predict(mlp_input)
-        result['mlp'] = {
-            'pred': int(np.argmax(mlp_pred)),
-            'confidence': float(np.max(mlp_pred))
-        }
+PREDICT_TOP_K = int(os.environ.get('PREDICT_TOP_K', 3))
+
+def _top_k(probs, k: int = PREDICT_TOP_K):
+    idx = np.argsort(probs)[::-1][:k]
+    return [{'digit': int(i), 'prob': float(probs[i])} for i in idx]
+
+def predict_arrays(batch):
+    """
+    Ejecuta una única pasada por modelo sobre un lote `(N,28,28)` y devuelve
+    una lista con el resultado de cada imagen (clase, confianza y top-k).
+    """
+    batch = np.asarray(batch, dtype=np.float32).reshape(-1, 28, 28)
+    results = [{} for _ in range(len(batch))]
+    mlp_runtime = model_registry.get('mlp')
+    cnn_runtime = model_registry.get('cnn')
+
+    if mlp_runtime:
+        with stage('model_mlp'):
+            mlp_pred = mlp_runtime(batch.reshape(len(batch), -1))
+        for res, probs in zip(results, mlp_pred):
+            res['mlp'] = {
+                'pred': int(np.argmax(probs)),
+                'confidence': float(np.max(probs)),
+                'top': _top_k(probs)
+            }
 
-    if cnn_model:
-        cnn_input = image_array.reshape(1,28,28,1)
-        cnn_pred = cnn_model.predict(cnn_input)
-        result['cnn'] = {
-            'pred': int(np.argmax(cnn_pred)),
-            'confidence': float(np.max(cnn_pred))
-        }
+    if cnn_runtime:
+        with stage('model_cnn'):
+            cnn_pred = cnn_runtime(batch.reshape(len(batch), 28, 28, 1))
+        for res, probs in zip(results, cnn_pred):
+            res['cnn'] = {
+                'pred': int(np.argmax(probs)),
+                'confidence': float(np.max(probs)),
+                'top': _top_k(probs)
+            }
 
-    return result
+    return results
+
+# Las peticiones concurrentes a /predict se agrupan en un solo lote por modelo
+inference_batcher = MicroBatcher(
+    predict_arrays,
+    max_batch_size=int(os.environ.get('BATCH_MAX_SIZE', 32)),
+    max_wait_ms=float(os.environ.get('BATCH_MAX_WAIT_MS', 5)),
+)
+
+def predict_both_models(image_array):
+    return inference_batcher.predict(image_array)
+
+# -------------------------
+# Caché de resultados por contenido
+# -------------------------
+# Nivel 1: hash de la imagen recibida -> array 28x28 (evita el preprocesado)
+# Nivel 2: hash del 28x28 cuantizado -> predicciones (evita la inferencia)
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 2048))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 600)) or None
+preprocess_cache = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+inference_cache = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+def preprocess_cached(image_input):
+    key = hash_bytes(image_input)
+    arr = preprocess_cache.get(key)
+    if arr is None:
+        arr = _preprocessing().preprocess_image(image_input, target_size=(28,28), flatten=False)
+        arr.setflags(write=False)
+        preprocess_cache.put(key, arr)
+    return arr
+
+def predict_cached(image_array):
+    key = hash_array(image_array)
+    predictions = inference_cache.get(key)
+    if predictions is None:
+        predictions = predict_both_models(image_array)
+        inference_cache.put(key, predictions)
+    return predictions
+
+def invalidate_inference_cache():
+    """
+    Se llama cuando cambian los pesos de un modelo (p. ej. /train_feedback).
+    """
+    inference_cache.clear()
 
 # -------------------------
 # Rutas principales
@@ -108,15 +269,70 @@ def register():
 # -------------------------
 # Predicciones individuales con QR personalizado
 # -------------------------
+# Entrada binaria: cuerpo application/octet-stream con píxeles uint8 crudos
+# (ancho x alto) y cabeceras X-Image-Width / X-Image-Height. X-Pixel-Format:
+# 'ink' (por defecto, tinta clara sobre fondo negro como MNIST) o 'gray'
+# (tinta oscura sobre fondo claro, como una imagen normal en escala de grises).
+RAW_MAX_SIDE = 2048
+INGEST_BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+INGEST_CPU_MS_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100)
+ingest_stats = {
+    kind: {'bytes': Histogram(INGEST_BYTES_BUCKETS), 'cpu_ms': Histogram(INGEST_CPU_MS_BUCKETS)}
+    for kind in ('dataurl', 'raw')
+}
+
+def _read_raw_canvas():
+    """
+    Valida una petición binaria y devuelve `(ancho, alto, formato, cuerpo)`.
+    Lanza ValueError si las cabeceras o el tamaño del cuerpo no son válidos.
+    """
+    width = int(request.headers.get('X-Image-Width', 0))
+    height = int(request.headers.get('X-Image-Height', 0))
+    pixel_format = request.headers.get('X-Pixel-Format', 'ink').lower()
+    if not (0 < width <= RAW_MAX_SIDE and 0 < height <= RAW_MAX_SIDE):
+        raise ValueError('Invalid X-Image-Width / X-Image-Height')
+    if pixel_format not in ('ink', 'gray'):
+        raise ValueError(f'Unsupported X-Pixel-Format: {pixel_format}')
+    body = request.get_data(cache=False)
+    if len(body) != width * height:
+        raise ValueError(f'Expected {width * height} bytes, got {len(body)}')
+    return width, height, pixel_format, body
+
+def preprocess_raw_cached(width: int, height: int, pixel_format: str, body: bytes):
+    key = hash_bytes(f"{width}x{height}:{pixel_format}:".encode('ascii') + body)
+    arr = preprocess_cache.get(key)
+    if arr is None:
+        pixels = np.frombuffer(body, dtype=np.uint8).reshape(height, width)
+        arr = _preprocessing().preprocess_canvas_data(
+            pixels, target_size=(28,28), flatten=False, inverted=(pixel_format == 'ink')
+        )
+        arr.setflags(write=False)
+        preprocess_cache.put(key, arr)
+    return arr
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    data = request.get_json()
-    if not data or 'image' not in data:
-        return jsonify({'error': 'No image provided'}), 400
+    cpu_start = time.thread_time()
+    if request.mimetype == 'application/octet-stream':
+        kind = 'raw'
+        user = request.headers.get('X-User') or request.args.get('user')
+        try:
+            arr = preprocess_raw_cached(*_read_raw_canvas())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        kind = 'dataurl'
+        data = request.get_json()
+        if not data or 'image' not in data:
+            return jsonify({'error': 'No image provided'}), 400
+        user = data.get('user')
+        arr = None
 
     try:
-        arr = preprocess_image(data['image'], target_size=(28,28), flatten=False)
-        predictions = predict_both_models(arr)
+        if arr is None:
+            arr = preprocess_cached(data['image'])
+        with stage('inference'):
+            predictions = predict_cached(arr)
 
         # 🆕 Generar ID único
         pred_id = str(uuid.uuid4())
@@ -125,26 +341,18 @@ def predict():
         record = {
             'id': pred_id,
             'time': datetime.utcnow().isoformat(),
-            'user': data.get('user'),
+            'user': user,
             'pred_mlp': predictions.get('mlp', {}).get('pred', None),
             'conf_mlp': predictions.get('mlp', {}).get('confidence', None),
             'pred_cnn': predictions.get('cnn', {}).get('pred', None),
             'conf_cnn': predictions.get('cnn', {}).get('confidence', None),
         }
-        save_prediction_local(record)
+        with stage('store_write'):
+            save_prediction_local(record)
 
-        # 🆕 Generar URL única para QR
+        # 🆕 URL única de la predicción; el QR se genera bajo demanda en /qr/<id>.png
         qr_url_text = f"{request.host_url}prediction/{pred_id}"
-
-        # 🆕 Generar QR y guardarlo en static/qr_predictions
-        qr_folder = os.path.join('app', 'static', 'qr_predictions')
-        os.makedirs(qr_folder, exist_ok=True)
-        filename = f"qr_{pred_id}.png"
-        filepath = os.path.join(qr_folder, filename)
-        img_bytes = generate_qr_image_bytes(qr_url_text)
-        with open(filepath, 'wb') as f:
-            f.write(img_bytes)
-        qr_url = f"/static/qr_predictions/{filename}"
+        qr_url = f"/qr/{pred_id}.png"
 
         return jsonify({
             'predictions': predictions,
@@ -154,6 +362,95 @@ def predict():
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        ingest_stats[kind]['bytes'].observe(request.content_length or 0)
+        ingest_stats[kind]['cpu_ms'].observe((time.thread_time() - cpu_start) * 1000.0)
+
+# -------------------------
+# Vista previa en tiempo real (SSE + POST de frames, sin log ni QR)
+# -------------------------
+# GET /realtime/stream abre el flujo y emite `ready` con el id de sesión;
+# POST /realtime/frame/<id> con el mismo cuerpo binario que /predict y la
+# cabecera X-Frame-Seq. Solo se evalúa el último frame pendiente de cada sesión.
+# Con varios procesos (REALTIME_SHARED_DB, lo fija serve.py) las sesiones y
+# el último frame de cada una se comparten por SQLite: el POST puede llegar a
+# cualquier worker y lo recoge el que mantiene el flujo.
+def _realtime_frame(payload):
+    return {'predictions': predict_cached(preprocess_raw_cached(*payload))}
+
+def _encode_frame(payload):
+    width, height, pixel_format, body = payload
+    return json.dumps([width, height, pixel_format]).encode('ascii') + b'\n' + bytes(body)
+
+def _decode_frame(blob):
+    header, body = blob.split(b'\n', 1)
+    width, height, pixel_format = json.loads(header)
+    return width, height, pixel_format, body
+
+REALTIME_SHARED_DB = os.environ.get('REALTIME_SHARED_DB', '')
+realtime_hub = RealtimeHub(
+    _realtime_frame,
+    max_sessions=int(os.environ.get('REALTIME_MAX_SESSIONS', 256)),
+    keepalive_s=float(os.environ.get('REALTIME_KEEPALIVE_S', 15)),
+    shared=SharedFrames(REALTIME_SHARED_DB, _encode_frame, _decode_frame) if REALTIME_SHARED_DB else None,
+    poll_s=float(os.environ.get('REALTIME_POLL_S', 0.02)),
+)
+
+@app.route('/realtime/stream', methods=['GET'])
+def realtime_stream():
+    try:
+        session = realtime_hub.open()
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    response = app.response_class(stream_with_context(realtime_hub.stream(session)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/realtime/frame/<session_id>', methods=['POST'])
+def realtime_frame(session_id):
+    session = realtime_hub.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown realtime session'}), 404
+    try:
+        seq = int(request.headers.get('X-Frame-Seq', ''))
+        payload = _read_raw_canvas()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status = realtime_hub.push(session, seq, payload)
+    return jsonify({'seq': seq, 'status': status}), 202
+
+@app.route('/metrics/realtime', methods=['GET'])
+def realtime_metrics():
+    return jsonify(realtime_hub.stats())
+
+# -------------------------
+# QR de una predicción (generado bajo demanda y cacheado en memoria)
+# -------------------------
+qr_cache = LRUCache(int(os.environ.get('QR_CACHE_SIZE', 512)))
+
+@app.route('/qr/<pred_id>.png')
+def prediction_qr(pred_id):
+    qr_text = f"{request.host_url}prediction/{pred_id}"
+    etag = hash_bytes(qr_text)
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    img_bytes = qr_cache.get(etag)
+    if img_bytes is None:
+        if prediction_store.get(pred_id) is None:
+            return jsonify({'error': 'Prediction not found'}), 404
+        with stage('qr_generate'):
+            img_bytes = timed_import('utils.qr_utils').generate_qr_image_bytes(qr_text)
+        qr_cache.put(etag, img_bytes)
+
+    response = app.response_class(img_bytes, mimetype='image/png')
+    response.set_etag(etag)
+    # El contenido de un id no cambia nunca
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
 
 # -------------------------
 # Vista bonita para predicción única
@@ -161,13 +458,7 @@ def predict():
 @app.route('/prediction/<pred_id>')
 def prediction_view(pred_id):
     try:
-        if not os.path.exists(PRED_LOG):
-            return render_template('prediction_view.html', record=None)
-
-        with open(PRED_LOG, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        record = next((item for item in data if item.get('id') == pred_id), None)
+        record = prediction_store.get(pred_id)
         return render_template('prediction_view.html', record=record)
 
     except Exception as e:
@@ -177,70 +468,205 @@ def prediction_view(pred_id):
 # -------------------------
 # Predicciones batch
 # -------------------------
+BATCH_PREPROCESS_WORKERS = int(os.environ.get('BATCH_PREPROCESS_WORKERS', min(8, os.cpu_count() or 1)))
+
+def _decode_upload(raw: bytes):
+    return _preprocessing().decode_image(raw)
+
 @app.route('/predict_batch', methods=['POST'])
 def predict_batch():
-    results = []
     files = request.files.getlist('files')
     if not files:
         return jsonify({'error': 'No files provided'}), 400
 
-    for f in files:
+    # 1) Leer y decodificar todos los archivos en paralelo
+    uploads = [(getattr(f, 'filename', None), f.read()) for f in files]
+    with stage('decode_batch'), ThreadPoolExecutor(max_workers=BATCH_PREPROCESS_WORKERS) as pool:
+        futures = [pool.submit(_decode_upload, raw) for _, raw in uploads]
+
+    results = [None] * len(uploads)
+    ok_idx, arrays = [], []
+    for i, ((filename, _), fut) in enumerate(zip(uploads, futures)):
         try:
-            arr = preprocess_image(f.read(), target_size=(28,28), flatten=False)
-            predictions = predict_both_models(arr)
+            arrays.append(fut.result())
+            ok_idx.append(i)
+        except Exception as e:
+            results[i] = {'filename': filename, 'error': str(e)}
+
+    # 2) Preprocesado vectorizado y una sola pasada por modelo sobre (N,28,28)
+    records = []
+    if arrays:
+        # Los errores de preprocesado son por imagen: no arrastran al resto
+        batch, errors = _preprocessing().preprocess_batch(arrays, return_errors=True)
+        for i, error in zip(ok_idx, errors):
+            if error is not None:
+                results[i] = {'filename': uploads[i][0], 'error': error}
+        keep = [k for k, error in enumerate(errors) if error is None]
+        ok_idx = [ok_idx[k] for k in keep]
+        try:
+            batch_preds = predict_arrays(batch if len(keep) == len(errors) else batch[keep]) if keep else []
+        except Exception as e:
+            for i in ok_idx:
+                results[i] = {'filename': uploads[i][0], 'error': str(e)}
+            batch_preds = []
+
+        now = datetime.utcnow().isoformat()
+        for i, predictions in zip(ok_idx, batch_preds):
             record = {
-                'time': datetime.utcnow().isoformat(),
-                'filename': f.filename,
+                'time': now,
+                'filename': uploads[i][0],
                 'pred_mlp': predictions.get('mlp', {}).get('pred', None),
                 'conf_mlp': predictions.get('mlp', {}).get('confidence', None),
                 'pred_cnn': predictions.get('cnn', {}).get('pred', None),
                 'conf_cnn': predictions.get('cnn', {}).get('confidence', None),
             }
-            save_prediction_local(record)
-            results.append(record)
-        except Exception as e:
-            results.append({'filename': getattr(f,'filename', None), 'error': str(e)})
+            records.append(record)
+            results[i] = record
 
+    # 3) Una sola transacción para todo el lote
+    with stage('store_write_batch'):
+        prediction_store.add_many(records)
     return jsonify(results)
 
 # -------------------------
 # Historial de predicciones (JSON)
 # -------------------------
+def _iso_arg(name):
+    value = request.args.get(name)
+    if value:
+        datetime.fromisoformat(value)  # ValueError si no es ISO-8601
+    return value
+
+MAX_PAGE_SIZE = 1000
+
+def _history_query(default_limit: int, strict: bool = True):
+    """
+    Lee los parámetros comunes de /history y /predictions_view.
+    Con `strict` lanza ValueError si alguno no es válido; si no, lo ignora.
+    """
+    def _parse(parse, *names):
+        value = next((request.args[n] for n in names if request.args.get(n)), None)
+        if value is None:
+            return None
+        try:
+            return parse(value)
+        except ValueError:
+            if strict:
+                raise
+            return None
+
+    limit = _parse(int, 'limit') or default_limit
+    return {
+        'limit': max(1, min(limit, MAX_PAGE_SIZE)),
+        'cursor': _parse(int, 'cursor'),
+        'user': request.args.get('user'),
+        'since': _parse(lambda v: datetime.fromisoformat(v) and v, 'since'),
+        'until': _parse(lambda v: datetime.fromisoformat(v) and v, 'until'),
+        'digit': _parse(int, 'digit', 'pred'),
+    }
+
+def _history_etag() -> str:
+    # Solo hay inserciones: la última secuencia + la consulta identifican la respuesta
+    return hash_bytes(f"{prediction_store.last_seq()}|{request.path}|{request.query_string.decode()}")
+
+def _paged_response(response, next_cursor, etag):
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # revalidar siempre con If-None-Match
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
 @app.route('/history', methods=['GET'])
 def history():
-    limit = int(request.args.get('limit', 50))
-    user = request.args.get('user')
+    etag = _history_etag()
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"'}
 
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        data = json.load(fh)
+    try:
+        query = _history_query(default_limit=50)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    if user:
-        data = [d for d in data if d.get('user') == user]
+    data, next_cursor = prediction_store.query(**query)
+    return _paged_response(jsonify(data), next_cursor, etag)
 
-    return jsonify(data[:limit])
+# -------------------------
+# Estadísticas agregadas para el panel
+# -------------------------
+@app.route('/stats', methods=['GET'])
+def stats_summary():
+    window = request.args.get('window', 'last')
+    if window not in STATS_WINDOWS:
+        return jsonify({'error': f"window must be one of {', '.join(STATS_WINDOWS)}"}), 400
+
+    snapshot = get_prediction_stats().snapshot(window, now=time.time())
+    # Hash del contenido: cada worker tiene sus propios agregados, así que un
+    # contador de versión no sirve entre procesos; el resumen es pequeño
+    etag = f"{window}-{hash_bytes(json.dumps(snapshot, sort_keys=True))}"
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    response = jsonify(snapshot)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 # -------------------------
 # Ver predicciones HTML
 # -------------------------
 @app.route('/predictions_view', methods=['GET'])
 def predictions_view():
-    limit = int(request.args.get('limit', 10))
-    user = request.args.get('user')
-    pred_filter = request.args.get('pred')
+    etag = _history_etag()
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"'}
 
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        data = json.load(fh)
+    # Filtros no válidos se ignoran, como antes
+    query = _history_query(default_limit=10, strict=False)
 
-    if user:
-        data = [d for d in data if d.get('user') == user]
-    if pred_filter is not None:
-        try:
-            pval = int(pred_filter)
-            data = [d for d in data if d.get('pred_mlp') == pval or d.get('pred_cnn') == pval]
-        except ValueError:
-            pass
+    data, next_cursor = prediction_store.query(**query)
+    response = make_response(render_template("predictions_view.html", predictions=data, next_cursor=next_cursor))
+    return _paged_response(response, next_cursor, etag)
+
+# -------------------------
+# Estadísticas del planificador de lotes
+# -------------------------
+@app.route('/metrics/batching', methods=['GET'])
+def batching_metrics():
+    return jsonify(inference_batcher.stats())
 
-    return render_template("predictions_view.html", predictions=data[:limit])
+# -------------------------
+# Estadísticas de la caché de resultados
+# -------------------------
+@app.route('/metrics/cache', methods=['GET'])
+def cache_metrics():
+    return jsonify({
+        'preprocess': preprocess_cache.stats(),
+        'inference': inference_cache.stats(),
+        'qr': qr_cache.stats(),
+    })
+
+# -------------------------
+# Tamaño de petición y CPU por predicción según el formato de entrada
+# -------------------------
+@app.route('/metrics/ingest', methods=['GET'])
+def ingest_metrics():
+    return jsonify({
+        kind: {name: hist.snapshot() for name, hist in stats.items()}
+        for kind, stats in ingest_stats.items()
+    })
+
+# -------------------------
+# Tiempos de arranque y estado de los modelos
+# -------------------------
+@app.route('/metrics/startup', methods=['GET'])
+def startup_metrics():
+    return jsonify({
+        'timings': STARTUP_TIMINGS,
+        'models': model_registry.status(),
+    })
 
 # -------------------------
 # Generación de QR manual
@@ -252,22 +678,41 @@ def generate_qr():
         return jsonify({'error': 'No payload'}), 400
 
     text = payload.get('url') or payload.get('text') or "https://tus-predicciones.com"
-    img_bytes = generate_qr_image_bytes(text)
+    img_bytes = timed_import('utils.qr_utils').generate_qr_image_bytes(text)
     return send_file(io.BytesIO(img_bytes), mimetype='image/png')
 
 # -------------------------
-# Exportar CSV
+# Exportar (CSV / NDJSON / Parquet en streaming)
 # -------------------------
 @app.route('/export', methods=['GET'])
 def export():
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        data = json.load(fh)
-    csv_bytes = export_predictions_to_csv(data)
-    return send_file(
-        io.BytesIO(csv_bytes),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='predictions_export.csv'
+    fmt = request.args.get('format', 'csv').lower()
+    use_gzip = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    if fmt == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        return jsonify({'error': 'Parquet export requires pyarrow'}), 400
+
+    try:
+        filters = {
+            'user': request.args.get('user'),
+            'since': _iso_arg('since'),
+            'until': _iso_arg('until'),
+            'digit': int(request.args['digit']) if request.args.get('digit') else None,
+        }
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = f'predictions_export.{ext}'
+    if use_gzip:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+
+    chunks = iter_export(lambda: prediction_store.iter_records(**filters), fmt=fmt, gzip=use_gzip)
+    return app.response_class(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
     )
 
 # -------------------------
@@ -285,6 +730,87 @@ def admin():
             return "Contraseña incorrecta", 403
     return render_template('admin_login.html')
 
+# Entrenador en segundo plano: mini-lotes + replay MNIST + doble buffer
+_trainer = None
+_trainer_lock = threading.Lock()
+
+def _publish_mlp(model, runtime):
+    model_registry.publish('mlp_keras', model)
+    model_registry.publish('mlp', runtime)
+
+def _make_mlp_runtime(model):
+    backend = _backend_for('mlp')
+    if backend == 'numpy':
+        return InferenceRuntime(model, backend='numpy', name='mlp')
+    return create_runtime(model, backend=backend, check_parity=False, name='mlp')
+
+def get_online_trainer():
+    """
+    Crea el entrenador la primera vez que llega feedback (None si no hay MLP).
+    """
+    global _trainer
+    if _trainer is None:
+        with _trainer_lock:
+            if _trainer is None:
+                mlp_model = model_registry.get('mlp_keras')
+                if mlp_model is None:
+                    return None
+                online_trainer = timed_import('utils.online_trainer')
+                _trainer = online_trainer.OnlineTrainer(
+                    mlp_model,
+                    model_registry.get('mlp'),
+                    make_runtime=_make_mlp_runtime,
+                    publish=_publish_mlp,
+                    batch_size=int(os.environ.get('FEEDBACK_BATCH_SIZE', 32)),
+                    max_wait_s=float(os.environ.get('FEEDBACK_MAX_WAIT_S', 2)),
+                    replay_ratio=float(os.environ.get('FEEDBACK_REPLAY_RATIO', 1)),
+                    on_publish=invalidate_inference_cache,
+                )
+                REGISTRY.register_histogram(
+                    'feedback_to_deploy_seconds', 'Segundos desde el feedback hasta publicar los pesos',
+                    _trainer.feedback_to_deploy_s,
+                )
+                REGISTRY.register_histogram('train_batch_ms', 'Duración de cada mini-lote de entrenamiento', _trainer.train_ms)
+    return _trainer
+
+# Dataset persistente de feedback (memmap) para reentrenamientos completos
+FEEDBACK_DIR = os.path.join('app', 'feedback')
+_feedback_dataset = None
+
+def get_feedback_dataset():
+    global _feedback_dataset
+    if _feedback_dataset is None:
+        with _trainer_lock:
+            if _feedback_dataset is None:
+                _feedback_dataset = timed_import('utils.feedback_store').FeedbackDataset(FEEDBACK_DIR)
+    return _feedback_dataset
+
+# Evaluación en línea: matriz de confusión por modelo a partir del feedback
+_evaluator = None
+_evaluator_synced = 0  # muestras del dataset de feedback ya contadas
+_evaluator_lock = threading.Lock()
+
+def get_evaluator():
+    """
+    Evaluador al día con el dataset de feedback compartido: en cada llamada
+    cuenta las muestras nuevas (guardadas por cualquier worker) cuyo
+    `pred_id` sigue en el log de predicciones. Todos los procesos recorren
+    las mismas muestras en el mismo orden, así que ven las mismas matrices.
+    """
+    global _evaluator, _evaluator_synced
+    dataset = get_feedback_dataset()
+    with _evaluator_lock:
+        if _evaluator is None:
+            _evaluator = timed_import('utils.analysis').StreamingEvaluator(models=('mlp', 'cnn'))
+        if len(dataset) != _evaluator_synced:
+            with record_timing('sync evaluator'):
+                for meta in dataset.iter_metadata(start=_evaluator_synced):
+                    record = prediction_store.get(meta['pred_id']) if meta['pred_id'] else None
+                    if record:
+                        _evaluator.update_from_record(record, meta['label'])
+                    _evaluator_synced = meta['idx'] + 1
+    return _evaluator
+
 @app.route('/train_feedback', methods=['POST'])
 def train_feedback():
     data = request.get_json()
@@ -292,20 +818,147 @@ def train_feedback():
         return jsonify({"message":"Faltan datos"}), 400
 
     try:
-        arr = preprocess_image(data['image'], target_size=(28,28), flatten=True)
+        arr = _preprocessing().preprocess_image(data['image'], target_size=(28,28), flatten=True)
         label = int(data['label'])
+        if not 0 <= label <= 9:
+            return jsonify({"message": "Etiqueta fuera de rango"}), 400
 
-        if mlp_model:
-            y_true = keras.utils.to_categorical([label], num_classes=10)
-            mlp_model.fit(arr.reshape(1,-1), y_true, epochs=1, verbose=0)
-            return jsonify({"message": f"Modelo actualizado con etiqueta {label}"})
-        else:
+        get_feedback_dataset().append(arr, label, user=data.get('user'), pred_id=data.get('pred_id'))
+        get_evaluator()  # cuenta esta etiqueta (y las de otros workers)
+
+        trainer = get_online_trainer()
+        if trainer is None:
             return jsonify({"message": "No hay modelo MLP cargado"}), 500
+        depth = trainer.submit(arr, label)
+        return jsonify({
+            "message": f"Etiqueta {label} encolada para entrenamiento",
+            "queue_depth": depth,
+        }), 202
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
+@app.route('/metrics/training', methods=['GET'])
+def training_metrics():
+    stats = _trainer.stats() if _trainer else {'queue_depth': 0, 'samples_trained': 0, 'batches_trained': 0}
+    stats['feedback_samples'] = len(get_feedback_dataset())
+    return jsonify(stats)
+
+@app.route('/metrics/model', methods=['GET'])
+def model_metrics():
+    evaluator = get_evaluator()
+    return jsonify(evaluator.summary(per_class=request.args.get('per_class') == '1'))
+
+@app.route('/metrics/model/<model_name>/confusion.png', methods=['GET'])
+def model_confusion_png(model_name):
+    evaluator = get_evaluator()
+    if model_name not in evaluator.models:
+        return jsonify({'error': 'Unknown model'}), 404
+    # Derivado del contenido: igual en todos los workers y tras reiniciar
+    etag = f"{model_name}-{evaluator.digest(model_name)}"
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"'}
+    response = app.response_class(evaluator.confusion_png(model_name), mimetype='image/png')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# -------------------------
+# Salud, disponibilidad y parada ordenada
+# -------------------------
+_draining = threading.Event()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Listo cuando los runtimes ya se cargaron (o se comprobó que no existen)
+    models = {name: model_registry.is_loaded(name) for name in ('mlp', 'cnn')}
+    ready = all(models.values()) and not _draining.is_set()
+    body = {'ready': ready, 'draining': _draining.is_set(), 'models': models, 'pid': os.getpid()}
+    return jsonify(body), 200 if ready else 503
+
+def begin_shutdown():
+    """
+    Marca el proceso como no disponible (/readyz -> 503) y cierra los flujos SSE.
+    """
+    _draining.set()
+    realtime_hub.shutdown()
+
+def shutdown_app(timeout: float = 30.0):
+    """
+    Parada ordenada: termina las predicciones encoladas en el micro-batcher y
+    el entrenamiento pendiente antes de que el proceso salga.
+    """
+    begin_shutdown()
+    inference_batcher.shutdown(drain=True, timeout=timeout)
+    if _trainer is not None:
+        _trainer.shutdown(drain=True, timeout=timeout)
+    if _feedback_dataset is not None:
+        _feedback_dataset.close()
+    if FIREBASE_SYNC and 'utils.firebase_utils' in sys.modules:
+        sys.modules['utils.firebase_utils'].get_sync().shutdown(timeout=timeout)
+
+# -------------------------
+# Métricas en formato Prometheus
+# -------------------------
+def _store_bytes():
+    return sum(os.path.getsize(p) for p in (PRED_DB, PRED_DB + '-wal') if os.path.exists(p))
+
+_caches = {'preprocess': preprocess_cache, 'inference': inference_cache, 'qr': qr_cache}
+
+REGISTRY.register_histogram('batch_size', 'Imágenes por lote de inferencia', inference_batcher.batch_sizes)
+REGISTRY.register_histogram('batch_latency_ms', 'Espera en cola más inferencia por imagen', inference_batcher.latency_ms)
+REGISTRY.register_histogram('batch_inference_ms', 'Duración de cada lote de inferencia', inference_batcher.inference_ms)
+REGISTRY.register_gauge('batch_queue_depth', 'Imágenes esperando al micro-batcher', inference_batcher.queue_depth)
+for _kind, _stats in ingest_stats.items():
+    REGISTRY.register_histogram('ingest_request_bytes', 'Tamaño del cuerpo de /predict', _stats['bytes'], {'kind': _kind})
+    REGISTRY.register_histogram('ingest_cpu_ms', 'CPU por petición a /predict', _stats['cpu_ms'], {'kind': _kind})
+REGISTRY.register_histogram('realtime_latency_ms', 'Desde la llegada de un frame hasta su evento SSE', realtime_hub.latency_ms)
+
+REGISTRY.register_gauge('cache_entries', 'Entradas en cada caché', lambda: {n: len(c) for n, c in _caches.items()}, label='cache')
+REGISTRY.register_counter('cache_hits_total', 'Aciertos de caché', lambda: {n: c.hits for n, c in _caches.items()}, label='cache')
+REGISTRY.register_counter('cache_misses_total', 'Fallos de caché', lambda: {n: c.misses for n, c in _caches.items()}, label='cache')
+REGISTRY.register_gauge(
+    'cache_hit_ratio', 'Tasa de aciertos de caché', lambda: {n: c.stats()['hit_rate'] for n, c in _caches.items()}, label='cache'
+)
+REGISTRY.register_gauge('prediction_store_rows', 'Predicciones guardadas', prediction_store.count)
+REGISTRY.register_gauge('prediction_store_bytes', 'Tamaño en disco de la base de predicciones', _store_bytes)
+REGISTRY.register_gauge(
+    'feedback_samples', 'Muestras en el dataset de feedback', lambda: len(_feedback_dataset) if _feedback_dataset else None
+)
+REGISTRY.register_gauge('trainer_queue_depth', 'Feedback pendiente de entrenar', lambda: _trainer.queue_depth() if _trainer else 0)
+REGISTRY.register_counter('trainer_samples_total', 'Muestras de feedback entrenadas', lambda: _trainer.samples_trained if _trainer else 0)
+REGISTRY.register_gauge(
+    'firebase_queue_depth', 'Registros pendientes de enviar a Firestore',
+    lambda: sys.modules['utils.firebase_utils'].get_sync().queue_depth() if 'utils.firebase_utils' in sys.modules else None,
+)
+REGISTRY.register_gauge(
+    'model_accuracy', 'Exactitud según el feedback etiquetado',
+    lambda: {m: v['accuracy'] for m, v in _evaluator.summary().items() if v['accuracy'] is not None} if _evaluator else None,
+    label='model',
+)
+REGISTRY.register_gauge(
+    'model_agreement_rate', 'Coincidencia MLP/CNN en la última hora',
+    lambda: get_prediction_stats().snapshot('hour')['agreement'],
+)
+REGISTRY.register_gauge('realtime_sessions', 'Flujos SSE abiertos', lambda: realtime_hub.stats()['sessions'])
+REGISTRY.register_counter(
+    'realtime_frames_total', 'Frames de vista previa por resultado',
+    lambda: {k[len('frames_'):]: v for k, v in realtime_hub.stats().items() if k.startswith('frames_')}, label='status',
+)
+REGISTRY.register_gauge(
+    'model_loaded', 'Runtimes cargados (1) o pendientes (0)',
+    lambda: {name: int(info['loaded']) for name, info in model_registry.status().items()}, label='model',
+)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return app.response_class(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # -------------------------
-# Run server
+# Run server (desarrollo; en producción usar app/serve.py)
 # -------------------------
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -3,24 +3,21 @@
 from flask import Blueprint, request, jsonify, session
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import json
+
+from utils.user_store import UserStore
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 USERS_FILE = os.path.join("app", "users.json")
 
-# Asegurar archivo de usuarios
-if not os.path.exists(USERS_FILE):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump({}, f)
+# Caché en memoria del fichero de usuarios (se relee solo si cambia en disco)
+user_store = UserStore(USERS_FILE)
 
 def load_users():
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return user_store.all()
 
 def save_users(users):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2)
+    user_store.replace_all(users)
 
 @auth_bp.route("/register", methods=["POST"])
 def register():
@@ -31,12 +28,11 @@ def register():
     if not username or not password:
         return jsonify({"error": "Usuario y contraseña requeridos"}), 400
 
-    users = load_users()
-    if username in users:
+    # El hash se calcula fuera del lock; `add` comprueba y escribe de forma atómica
+    if username in user_store:
+        return jsonify({"error": "Usuario ya existe"}), 400
+    if not user_store.add(username, generate_password_hash(password)):
         return jsonify({"error": "Usuario ya existe"}), 400
-
-    users[username] = generate_password_hash(password)
-    save_users(users)
     return jsonify({"msg": "Usuario registrado exitosamente"})
 
 @auth_bp.route("/login", methods=["POST"])
@@ -48,11 +44,11 @@ def login():
     if not username or not password:
         return jsonify({"error": "Usuario y contraseña requeridos"}), 400
 
-    users = load_users()
-    if username not in users:
+    password_hash = user_store.get(username)
+    if password_hash is None:
         return jsonify({"error": "Usuario no encontrado"}), 404
 
-    if not check_password_hash(users[username], password):
+    if not check_password_hash(password_hash, password):
         return jsonify({"error": "Contraseña incorrecta"}), 401
 
     session["user"] = username
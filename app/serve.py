@@ -0,0 +1,166 @@
+# serve.py
+"""
+Lanzador de producción (gunicorn, varios procesos).
+
+Uso (desde la raíz del repositorio):
+
+    python app/serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+
+Cada opción también se puede dar por entorno: WEB_CONCURRENCY, WEB_THREADS,
+BIND, GRACEFUL_TIMEOUT.
+
+- Los pesos que no dependen de TensorFlow (MLP con el motor NumPy) se cargan
+  en el proceso maestro antes del fork y los workers los comparten en
+  copy-on-write. TensorFlow no sobrevive a un fork, así que los modelos que
+  lo necesitan (CNN, o cualquier otro backend) se calientan en cada worker.
+- Los hilos de TensorFlow/BLAS se reparten entre workers para no
+  sobresuscribir la CPU (TF_NUM_INTRAOP_THREADS, TF_NUM_INTEROP_THREADS,
+  OMP_NUM_THREADS...). Se respetan los valores que ya vengan en el entorno.
+- /healthz responde mientras el proceso vive; /readyz devuelve 503 hasta que
+  los modelos del worker están cargados y en cuanto empieza la parada.
+- Con SIGTERM cada worker deja de estar listo, cierra los flujos SSE y vacía
+  la cola del micro-batcher y del entrenador antes de salir.
+- Vista previa en tiempo real: las sesiones se comparten entre workers en
+  app/realtime.db (REALTIME_SHARED_DB), porque el POST de un frame puede
+  llegar a un worker distinto del que mantiene el flujo SSE. Cada flujo
+  ocupa un hilo de gthread mientras está abierto, así que por defecto se
+  limitan a la mitad de los hilos de cada worker (REALTIME_MAX_SESSIONS) y
+  el resto queda para /predict y las demás rutas.
+- El entrenamiento en línea (/train_feedback) actualiza el MLP del worker
+  que recibe el feedback: con varios workers sus pesos divergen hasta que se
+  reinician. Para que todos sirvan los mismos pesos, usa --workers 1 o
+  entrena fuera de línea con el dataset de feedback compartido.
+"""
+import argparse
+import os
+import signal
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS')
+
+
+def configure_threads(workers: int):
+    """
+    Reparte los núcleos entre workers. Debe llamarse antes de importar NumPy
+    o TensorFlow, que leen estas variables al inicializarse.
+    """
+    per_worker = max(1, (os.cpu_count() or 1) // max(1, workers))
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(per_worker))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1' if per_worker <= 2 else '2')
+    return per_worker
+
+
+def configure_realtime(workers: int, threads: int):
+    """
+    Sesiones de tiempo real compartidas entre workers y límite de flujos SSE
+    por debajo de los hilos de cada worker. Respeta los valores del entorno.
+    """
+    if workers > 1:
+        os.environ.setdefault('REALTIME_SHARED_DB', os.path.join('app', 'realtime.db'))
+    os.environ.setdefault('REALTIME_MAX_SESSIONS', str(max(1, threads // 2)))
+    return int(os.environ['REALTIME_MAX_SESSIONS'])
+
+
+def _load_app():
+    # Sin calentamiento en segundo plano en el maestro: no se hace fork con hilos vivos
+    os.environ['MODEL_WARMUP'] = '0'
+    # El MLP se sirve con el motor NumPy por defecto para poder compartir sus pesos
+    os.environ.setdefault('MLP_INFERENCE_BACKEND', 'numpy')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+
+    return app_module
+
+
+def preload_shared_models(app_module):
+    """
+    Carga en el maestro los modelos que no importan TensorFlow.
+    """
+    if app_module._backend_for('mlp') == 'numpy':
+        try:
+            app_module.model_registry.get('mlp')
+        except Exception as e:
+            print(f"Error precargando el MLP: {e}")
+    if 'tensorflow' in sys.modules:
+        print("Aviso: TensorFlow se importó en el proceso maestro antes del fork")
+
+
+def build_options(args, app_module) -> dict:
+    def post_fork(server, worker):
+        # Cada worker calienta lo que no se pudo compartir (p. ej. la CNN en TF)
+        app_module.model_registry.warmup(names=['mlp', 'cnn'], imports=('utils.preprocessing',))
+
+    def post_worker_init(worker):
+        # gunicorn ya instaló su manejador de SIGTERM; se encadena el nuestro
+        # para marcar el worker como no listo y cerrar los flujos SSE antes
+        # de esperar a las peticiones en curso
+        original = signal.getsignal(signal.SIGTERM)
+
+        def _on_term(signum, frame):
+            app_module.begin_shutdown()
+            if callable(original):
+                original(signum, frame)
+
+        signal.signal(signal.SIGTERM, _on_term)
+
+    def worker_exit(server, worker):
+        app_module.shutdown_app(timeout=args.graceful_timeout)
+
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'chdir': ROOT,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de producción (gunicorn)")
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 2)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)))
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('GRACEFUL_TIMEOUT', 30)))
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    per_worker = configure_threads(args.workers)
+    max_streams = configure_realtime(args.workers, args.threads)
+    print(f"{args.workers} workers x {args.threads} hilos, {per_worker} hilos de cómputo por worker, "
+          f"hasta {max_streams} flujos en tiempo real por worker")
+    if max_streams >= args.threads:
+        print("Aviso: REALTIME_MAX_SESSIONS >= hilos por worker; los flujos SSE pueden bloquear las demás rutas")
+    if args.workers > 1:
+        print("Aviso: el entrenamiento en línea actualiza solo el MLP del worker que recibe el feedback")
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit("gunicorn no está instalado (pip install gunicorn); para desarrollo usa python app/app.py")
+
+    # preload_app: la aplicación se importa una vez en el maestro, antes del fork
+    app_module = _load_app()
+    preload_shared_models(app_module)
+    options = build_options(args, app_module)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app_module.app
+
+    Application().run()
+
+
+if __name__ == '__main__':
+    main()
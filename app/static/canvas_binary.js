@@ -0,0 +1,54 @@
+// app/static/canvas_binary.js
+// Envío del canvas a /predict como píxeles uint8 crudos (sin PNG ni base64).
+
+(function () {
+    // Lado al que se reduce el canvas antes de enviarlo; el servidor recorta,
+    // centra y reescala a 28x28 igualmente, así que 56x56 conserva el detalle
+    // del trazo con ~3 KB por petición.
+    const SEND_SIZE = 56;
+
+    // Devuelve { pixels, width, height, hasInk } con la "tinta" de cada píxel
+    // (0 = fondo, 255 = trazo), es decir, la polaridad de MNIST.
+    function canvasToInk(canvas, size = SEND_SIZE) {
+        const tmp = document.createElement("canvas");
+        tmp.width = size;
+        tmp.height = size;
+        const tmpCtx = tmp.getContext("2d");
+        tmpCtx.drawImage(canvas, 0, 0, size, size);
+        const rgba = tmpCtx.getImageData(0, 0, size, size).data;
+
+        const pixels = new Uint8Array(size * size);
+        let hasInk = false;
+        for (let i = 0, j = 0; j < pixels.length; i += 4, j++) {
+            const luma = (rgba[i] * 299 + rgba[i + 1] * 587 + rgba[i + 2] * 114) / 1000;
+            const ink = Math.round(rgba[i + 3] * (255 - luma) / 255);
+            pixels[j] = ink;
+            if (ink) hasInk = true;
+        }
+        return { pixels, width: size, height: size, hasInk };
+    }
+
+    // POST binario a /predict; devuelve la promesa de fetch o null si el canvas está vacío.
+    function postCanvasPixels(canvas, options = {}) {
+        const { pixels, width, height, hasInk } = canvasToInk(canvas, options.size);
+        if (!hasInk) return null;
+
+        const headers = {
+            "Content-Type": "application/octet-stream",
+            "X-Image-Width": String(width),
+            "X-Image-Height": String(height),
+            "X-Pixel-Format": "ink",
+        };
+        if (options.user) headers["X-User"] = options.user;
+        Object.assign(headers, options.headers || {});
+        return fetch(options.url || "/predict", {
+            method: "POST",
+            headers,
+            body: pixels,
+            signal: options.signal,
+        });
+    }
+
+    window.canvasToInk = canvasToInk;
+    window.postCanvasPixels = postCanvasPixels;
+})();
@@ -1,66 +1,119 @@
 // app/charts.js
+// Panel de estadísticas: consulta /stats (agregados ya calculados en el
+// servidor) en lugar de descargar y procesar el historial completo.
 
 document.addEventListener("DOMContentLoaded", () => {
-    // --- Gráfica de precisión y pérdida ---
-    const ctxLoss = document.getElementById("loss-chart").getContext("2d");
-    const ctxAcc = document.getElementById("accuracy-chart").getContext("2d");
+    const digitsCanvas = document.getElementById("digits-chart");
+    const agreementCanvas = document.getElementById("agreement-chart");
+    const confidenceCanvas = document.getElementById("confidence-chart");
+    const summary = document.getElementById("stats-summary");
+    if (!digitsCanvas || typeof Chart === "undefined") return;
 
-    let lossChart = new Chart(ctxLoss, {
-        type: 'line',
-        data: {
-            labels: [], // epochs
-            datasets: [{
-                label: 'Loss',
-                data: [],
-                borderColor: 'rgba(255, 99, 132, 1)',
-                backgroundColor: 'rgba(255, 99, 132, 0.2)',
-                fill: true
-            }]
-        },
-        options: {
-            responsive: true,
-            scales: { y: { beginAtZero: true } }
-        }
+    const DIGITS = [...Array(10).keys()].map(String);
+    const COLORS = {
+        mlp: { border: 'rgba(54, 162, 235, 1)', fill: 'rgba(54, 162, 235, 0.4)' },
+        cnn: { border: 'rgba(255, 99, 132, 1)', fill: 'rgba(255, 99, 132, 0.4)' }
+    };
+    let windowName = "hour";
+    let etag = null;
+
+    // --- Dígitos predichos por modelo ---
+    const digitsChart = new Chart(digitsCanvas.getContext("2d"), {
+        type: 'bar',
+        data: { labels: DIGITS, datasets: [] },
+        options: { responsive: true, scales: { y: { beginAtZero: true } } }
     });
 
-    let accChart = new Chart(ctxAcc, {
+    // --- Predicciones y coincidencia MLP/CNN por minuto u hora ---
+    const agreementChart = new Chart(agreementCanvas.getContext("2d"), {
         type: 'line',
         data: {
-            labels: [], // epochs
-            datasets: [{
-                label: 'Accuracy',
-                data: [],
-                borderColor: 'rgba(54, 162, 235, 1)',
-                backgroundColor: 'rgba(54, 162, 235, 0.2)',
-                fill: true
-            }]
+            labels: [],
+            datasets: [
+                { label: 'Coincidencia MLP/CNN', data: [], yAxisID: 'rate', spanGaps: true,
+                  borderColor: 'rgba(10, 147, 150, 1)', backgroundColor: 'rgba(10, 147, 150, 0.2)' },
+                { label: 'Predicciones', data: [], yAxisID: 'count', type: 'bar',
+                  backgroundColor: 'rgba(150, 150, 150, 0.3)' }
+            ]
         },
         options: {
             responsive: true,
-            scales: { y: { min: 0, max: 1 } }
+            scales: {
+                rate: { position: 'left', min: 0, max: 1 },
+                count: { position: 'right', beginAtZero: true, grid: { drawOnChartArea: false } }
+            }
         }
     });
 
-    // Función para actualizar los datos dinámicamente
-    async function updateCharts() {
-        const res = await fetch("/history?limit=50"); // ejemplo: usar historial de predicciones
-        const data = await res.json();
-        if (!data.length) return;
+    // --- Distribución de la confianza ---
+    const confidenceChart = new Chart(confidenceCanvas.getContext("2d"), {
+        type: 'bar',
+        data: { labels: [], datasets: [] },
+        options: { responsive: true, scales: { y: { beginAtZero: true } } }
+    });
 
-        // Extraer precisión por predicción (ejemplo simple)
-        const labels = data.map((d, i) => i+1);
-        const accData = data.map(d => d.confidence);
-        const lossData = data.map(d => 1 - d.confidence);
+    function modelDatasets(values) {
+        return Object.entries(values).map(([model, data]) => ({
+            label: model.toUpperCase(),
+            data: data,
+            borderColor: (COLORS[model] || COLORS.mlp).border,
+            backgroundColor: (COLORS[model] || COLORS.mlp).fill
+        }));
+    }
 
-        accChart.data.labels = labels;
-        accChart.data.datasets[0].data = accData;
-        accChart.update();
+    function seriesLabels(series) {
+        const n = series.n.length;
+        const unit = series.bucket_s >= 3600 ? 'h' : 'min';
+        return series.n.map((_, i) => i === n - 1 ? 'ahora' : `-${n - 1 - i}${unit}`);
+    }
+
+    function render(stats) {
+        const fmt = v => v === null ? '-' : `${(v * 100).toFixed(1)}%`;
+        const means = Object.entries(stats.confidence)
+            .map(([m, c]) => `${m.toUpperCase()} ${fmt(c.mean)}`).join(' · ');
+        summary.textContent = `${stats.n} predicciones · coincidencia ${fmt(stats.agreement)} · confianza media ${means}`;
+
+        digitsChart.data.datasets = modelDatasets(stats.digits);
+        digitsChart.update();
+
+        const bins = Object.values(stats.confidence)[0].hist.length;
+        confidenceChart.data.labels = [...Array(bins).keys()].map(i => `${i / bins}-${(i + 1) / bins}`);
+        confidenceChart.data.datasets = modelDatasets(
+            Object.fromEntries(Object.entries(stats.confidence).map(([m, c]) => [m, c.hist]))
+        );
+        confidenceChart.update();
+
+        agreementCanvas.parentElement.style.display = stats.series ? "" : "none";
+        if (stats.series) {
+            agreementChart.data.labels = seriesLabels(stats.series);
+            agreementChart.data.datasets[0].data = stats.series.agreement;
+            agreementChart.data.datasets[1].data = stats.series.n;
+            agreementChart.update();
+        }
+    }
+
+    async function updateCharts() {
+        try {
+            const headers = etag ? { "If-None-Match": etag } : {};
+            const res = await fetch(`/stats?window=${windowName}`, { headers });
+            if (res.status === 304 || !res.ok) return;
+            etag = res.headers.get("ETag");
+            render(await res.json());
+        } catch (err) {
+            console.error("Error cargando /stats:", err);
+        }
+    }
 
-        lossChart.data.labels = labels;
-        lossChart.data.datasets[0].data = lossData;
-        lossChart.update();
+    const selector = document.getElementById("stats-window");
+    if (selector) {
+        selector.value = windowName;
+        selector.addEventListener("change", () => {
+            windowName = selector.value;
+            etag = null;
+            updateCharts();
+        });
     }
 
     updateCharts();
-    setInterval(updateCharts, 5000); // refrescar cada 5s
+    setInterval(updateCharts, 5000); // refrescar cada 5s (304 si no hay cambios)
 });
@@ -98,34 +98,11 @@ document.addEventListener("DOMContentLoaded", () => {
         // -------------------------
         function predictCanvas() {
             try {
-                const tempCanvas = document.createElement("canvas");
-                const tempCtx = tempCanvas.getContext("2d");
-                tempCanvas.width = canvas.width;
-                tempCanvas.height = canvas.height;
-
-                tempCtx.drawImage(canvas, 0, 0);
-                const imgData = tempCtx.getImageData(0, 0, tempCanvas.width, tempCanvas.height);
-                const dataPixels = imgData.data;
-
-                let hasDrawing = false;
-                for (let i = 0; i < dataPixels.length; i += 4) {
-                    if (dataPixels[i] !== 255 || dataPixels[i+1] !== 255 || dataPixels[i+2] !== 255) {
-                        hasDrawing = true;
-                    }
-                    dataPixels[i] = 255 - dataPixels[i];
-                    dataPixels[i + 1] = 255 - dataPixels[i + 1];
-                    dataPixels[i + 2] = 255 - dataPixels[i + 2];
-                }
-
-                if (!hasDrawing) return;
-                tempCtx.putImageData(imgData, 0, 0);
-                const imgBase64 = tempCanvas.toDataURL("image/png");
+                // Píxeles crudos en vez de PNG+base64 (ver canvas_binary.js)
+                const request = postCanvasPixels(canvas);
+                if (!request) return;
 
-                fetch("/predict", {
-                    method: "POST",
-                    headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify({ image: imgBase64 })
-                })
+                request
                 .then(res => res.json())
                 .then(data => {
                     if (data.error) {
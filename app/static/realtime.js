@@ -8,6 +8,37 @@ document.addEventListener("DOMContentLoaded", () => {
     let drawing = false;
     let timeoutId = null;
 
+    // Canal persistente: el servidor emite por SSE la predicción del último
+    // frame enviado y descarta los intermedios (sin log ni QR)
+    let sessionId = null;
+    let seq = 0;
+    let source = null;
+
+    function connect() {
+        source = new EventSource("/realtime/stream");
+        source.addEventListener("ready", (e) => {
+            sessionId = JSON.parse(e.data).session;
+        });
+        source.addEventListener("prediction", (e) => {
+            const data = JSON.parse(e.data);
+            if (data.seq !== seq) return;  // ya hay un trazo más nuevo en camino
+            const format = (name, res) => {
+                if (!res) return `${name}: -`;
+                const top = (res.top || []).map(t => `${t.digit} ${(t.prob*100).toFixed(1)}%`).join(", ");
+                return `${name}: ${top}`;
+            };
+            feedbackEl.innerText = `Predicción en tiempo real: ${format("MLP", data.predictions.mlp)} | ${format("CNN", data.predictions.cnn)}`;
+        });
+        source.addEventListener("error", (e) => {
+            // EventSource reconecta solo; la sesión nueva llega en otro "ready"
+            sessionId = null;
+            if (e.data) feedbackEl.innerText = `Error: ${JSON.parse(e.data).error}`;
+            // Con 503 (límite de flujos) no reintenta: se vuelve a abrir más tarde
+            if (source.readyState === EventSource.CLOSED) setTimeout(connect, 3000);
+        });
+    }
+    connect();
+
     canvas.addEventListener("mousedown", () => drawing = true);
     canvas.addEventListener("mouseup", () => drawing = false);
     canvas.addEventListener("mouseout", () => drawing = false);
@@ -24,24 +55,26 @@ document.addEventListener("DOMContentLoaded", () => {
         ctx.beginPath();
         ctx.moveTo(x, y);
 
-        // Llamada al servidor con debounce de 500ms
+        // Debounce corto: los frames superados se descartan en el servidor
         if (timeoutId) clearTimeout(timeoutId);
-        timeoutId = setTimeout(sendRealtimePrediction, 500);
+        timeoutId = setTimeout(sendRealtimeFrame, 100);
     }
 
-    async function sendRealtimePrediction() {
-        const dataURL = canvas.toDataURL("image/png");
+    async function sendRealtimeFrame() {
+        if (!sessionId) return;
+        seq += 1;
+        const request = postCanvasPixels(canvas, {
+            url: `/realtime/frame/${sessionId}`,
+            headers: { "X-Frame-Seq": String(seq) },
+        });
+        if (!request) return;
         try {
-            const res = await fetch("/predict", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ image: dataURL })
-            });
-            const json = await res.json();
-            if (json.pred !== undefined) {
-                feedbackEl.innerText = `Predicción en tiempo real: ${json.pred} (Confianza: ${(json.confidence*100).toFixed(2)}%)`;
-            } else {
-                feedbackEl.innerText = `Error: ${json.error}`;
+            const res = await request;
+            if (res.status === 404) {
+                // Sesión caducada en el servidor: abrir otra
+                source.close();
+                sessionId = null;
+                connect();
             }
         } catch (err) {
             feedbackEl.innerText = `Error conexión: ${err.message}`;
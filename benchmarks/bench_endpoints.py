@@ -0,0 +1,90 @@
+# benchmarks/bench_endpoints.py
+"""
+Peticiones de extremo a extremo a /predict (data URL y píxeles crudos) y
+/predict_batch con el cliente de pruebas de Flask.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.bench_endpoints --iterations 50
+
+Las predicciones se guardan en una base temporal (PREDICTIONS_DB), no en
+app/predictions.db.
+Cada iteración usa una imagen distinta (caché fría); la variante `.cached`
+repite siempre la misma.
+"""
+import argparse
+import atexit
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import ROOT, measure
+from benchmarks.fixtures import synthetic_digits, data_urls, ink_pixels, png_bytes
+
+
+def load_app():
+    """
+    Importa app/app.py sin calentamiento en segundo plano y con el log de
+    predicciones en un directorio temporal (PREDICTIONS_DB se fija antes del
+    import, así que app/predictions.db no se llega a abrir). El directorio
+    se borra al salir del proceso.
+    """
+    if 'app' not in sys.modules:
+        workdir = tempfile.mkdtemp(prefix='bench_endpoints_')
+        atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+        os.environ['PREDICTIONS_DB'] = os.path.join(workdir, 'predictions.db')
+        os.environ['MODEL_WARMUP'] = '0'
+    os.chdir(ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'app'))
+    import app as app_module
+
+    # Cargar los modelos antes de medir
+    app_module.model_registry.warmup(names=['mlp', 'cnn'], background=False)
+    return app_module
+
+
+def suite(iterations: int = 50, batch_sizes=(8, 32), seed: int = 0) -> dict:
+    app_module = load_app()
+    # Caché fría también al repetir la suite en el mismo proceso (--repeat)
+    app_module.preprocess_cache.clear()
+    app_module.invalidate_inference_cache()
+    client = app_module.app.test_client()
+    n = iterations + 3
+    images = synthetic_digits(n + max(batch_sizes), seed=seed)
+    urls = data_urls(images)
+    raws = ink_pixels(images)
+    pngs = png_bytes(images)
+    raw_headers = {'Content-Type': 'application/octet-stream', 'X-Image-Width': '56', 'X-Image-Height': '56'}
+
+    def _check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    results = {
+        'endpoint.predict.dataurl': measure(
+            lambda i: _check(client.post('/predict', json={'image': urls[i]})), iterations),
+        'endpoint.predict.raw': measure(
+            lambda i: _check(client.post('/predict', data=raws[i], headers=raw_headers)), iterations),
+        'endpoint.predict.dataurl.cached': measure(
+            lambda i: _check(client.post('/predict', json={'image': urls[0]})), iterations),
+    }
+    for size in batch_sizes:
+        def _batch(i, size=size):
+            files = [(io.BytesIO(pngs[(i + k) % len(pngs)]), f'{k}.png') for k in range(size)]
+            _check(client.post('/predict_batch', data={'files': files}, content_type='multipart/form-data'))
+        results[f'endpoint.predict_batch.b{size}'] = measure(_batch, max(5, iterations // 5), items=size)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args(argv)
+    print(json.dumps(suite(args.iterations), indent=2))
+
+
+if __name__ == '__main__':
+    main()
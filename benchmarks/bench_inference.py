@@ -0,0 +1,135 @@
+# benchmarks/bench_inference.py
+"""
+Latencia y rendimiento de la inferencia del MLP por backend y tamaño de
+lote, y del micro-batcher (`predict_both_models`) con N peticiones
+concurrentes.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.bench_inference --backends numpy,function,tflite
+"""
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.common import measure
+from benchmarks.fixtures import mnist_like_batch
+
+MLP_PATH = os.path.join('models', 'MLP_NUEVO.keras')
+BACKENDS = ('numpy', 'function', 'tflite', 'keras')
+
+
+def load_mlp_runtimes(backends, path: str = MLP_PATH) -> dict:
+    """
+    Un runtime por backend; los que necesitan TensorFlow se omiten si no
+    está instalado.
+    """
+    from utils.inference_runtime import InferenceRuntime, create_runtime
+    from utils.mlp_numpy import load_keras_mlp
+
+    runtimes = {}
+    keras_model = None
+    for backend in backends:
+        if backend == 'numpy':
+            runtimes[backend] = InferenceRuntime(None, backend='numpy', name='mlp', engine=load_keras_mlp(path))
+            continue
+        try:
+            if keras_model is None:
+                from tensorflow import keras
+                keras_model = keras.models.load_model(path, compile=False)
+            runtimes[backend] = create_runtime(keras_model, backend=backend, check_parity=False, name='mlp')
+        except ImportError as e:
+            print(f"Backend '{backend}' omitido: {e}")
+    return runtimes
+
+
+def batcher_results(runtime, concurrency=(1, 8, 32), iterations: int = 20, max_batch_size: int = 32,
+                    max_wait_ms: float = 5.0) -> dict:
+    """
+    `MicroBatcher.predict` desde `c` hilos a la vez; cada medida es el tiempo
+    hasta que las `c` peticiones tienen respuesta.
+    """
+    from utils.batching import MicroBatcher
+
+    batcher = MicroBatcher(lambda batch: list(runtime(batch.reshape(len(batch), -1))),
+                           max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    images = mnist_like_batch(max(concurrency), seed=1)
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(concurrency)) as pool:
+            for c in concurrency:
+                def _round(_):
+                    list(pool.map(batcher.predict, images[:c]))
+                results[f'inference.batcher.c{c}'] = measure(_round, iterations, items=c)
+    finally:
+        batcher.shutdown()
+    return results
+
+
+def assert_keras_loader_parity(hidden_layers: int = 11, seed: int = 0):
+    """
+    Falla (AssertionError) si `load_keras_mlp` no reproduce las salidas de
+    Keras con capas de nombre propio y más de diez capas Dense (Keras 3
+    guarda los pesos como `dense`, `dense_1`, ..., no por nombre).
+    """
+    from tensorflow import keras
+    from utils.mlp_numpy import load_keras_mlp
+
+    keras.utils.set_random_seed(seed)
+    model = keras.Sequential(
+        [keras.Input((28*28,)), keras.layers.Dense(32, activation='relu', name='oculta')]
+        + [keras.layers.Dense(16, activation='relu', name=f'capa_{i}') for i in range(hidden_layers - 1)]
+        + [keras.layers.Dense(10, activation='softmax', name='salida')]
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'custom.keras')
+        model.save(path)
+        mlp = load_keras_mlp(path)
+
+    x = mnist_like_batch(16).reshape(16, -1)
+    diff = float(np.abs(mlp.predict(x) - model.predict(x, verbose=0)).max())
+    assert diff < 1e-5, f"load_keras_mlp difiere de Keras: max|diff|={diff}"
+
+
+def suite(backends=('numpy', 'function'), batch_sizes=(1, 8, 32, 256), iterations: int = 50,
+          path: str = MLP_PATH) -> dict:
+    try:
+        assert_keras_loader_parity()
+    except ImportError as e:
+        print(f"Comprobación de load_keras_mlp omitida: {e}")
+    if not os.path.exists(path):
+        print(f"No existe {path}: se omiten los benchmarks de inferencia")
+        return {}
+    runtimes = load_mlp_runtimes(backends, path)
+    batch = mnist_like_batch(max(batch_sizes))
+    flat = batch.reshape(len(batch), -1)
+
+    results = {}
+    for backend, runtime in runtimes.items():
+        for n in batch_sizes:
+            x = flat[:n]
+            results[f'inference.mlp.{backend}.b{n}'] = measure(lambda i: runtime(x), iterations, items=n)
+    if 'numpy' in runtimes:
+        results.update(batcher_results(runtimes['numpy'], iterations=max(5, iterations // 2)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backends', default='numpy,function')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    backends = [b for b in args.backends.split(',') if b]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"Backends desconocidos: {', '.join(sorted(unknown))}")
+    print(json.dumps(suite(backends, iterations=args.iterations), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_preprocessing.py
+"""
+Compara `preprocess_batch` con el camino imagen a imagen
+(`_mnist_style_preprocess`) y comprueba que las salidas coinciden.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.bench_preprocessing --n 512
+"""
+import argparse
+import json
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.common import measure
+from benchmarks.fixtures import synthetic_digits, png_bytes, ink_pixels
+from utils.preprocessing import _mnist_style_preprocess, preprocess_batch, preprocess_image, preprocess_canvas_data
+
+
+def check_parity(images) -> float:
+    """
+    Máxima diferencia absoluta entre ambos caminos (debe ser 0).
+    """
+    expected = np.stack([_mnist_style_preprocess(img) for img in images])
+    got = preprocess_batch([np.asarray(img) for img in images])
+    return float(np.max(np.abs(expected - got)))
+
+
+def degenerate_digits(size: int = 240) -> list:
+    """
+    Casos límite del bounding box: trazos de 1 px muy alargados (el lado
+    corto escala a 0 px), un punto y una imagen en blanco.
+    """
+    cases = []
+    for box in [(size // 2, 10, size // 2, size - 10),   # línea vertical de 1 px
+                (10, size // 2, size - 10, size // 2),   # línea horizontal de 1 px
+                (size // 3, size // 3, size // 3, size // 3),  # un solo píxel
+                None]:                                   # vacía
+        arr = np.full((size, size), 255, dtype=np.uint8)
+        if box is not None:
+            x0, y0, x1, y1 = box
+            arr[y0:y1 + 1, x0:x1 + 1] = 0
+        cases.append(Image.fromarray(arr))
+    return cases
+
+
+def assert_parity(n: int = 64, seed: int = 0):
+    """
+    Falla (AssertionError) si `preprocess_batch` no da exactamente lo mismo
+    que el camino por imagen, incluidos los casos límite, o si un error en
+    una imagen afecta a las demás.
+    """
+    images = synthetic_digits(n, seed=seed) + degenerate_digits()
+    diff = check_parity(images)
+    assert diff == 0.0, f"preprocess_batch difiere del camino por imagen: max|diff|={diff}"
+
+    arrays = [np.asarray(img) for img in images[:2]] + [np.zeros((4, 4, 4, 4), dtype=np.uint8)]
+    out, errors = preprocess_batch(arrays, return_errors=True)
+    assert errors[0] is None and errors[1] is None and errors[2], f"errores por imagen inesperados: {errors}"
+    assert np.array_equal(out[:2], preprocess_batch(arrays[:2])), "un error en una imagen alteró las demás"
+    assert not out[2].any(), "la fila de una imagen con error debe quedar a cero"
+
+
+def _time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(n: int = 512, repeat: int = 5, seed: int = 0) -> dict:
+    images = synthetic_digits(n, seed=seed)
+    arrays = [np.asarray(img) for img in images]
+    out = np.empty((n, 28, 28), dtype=np.float32)
+
+    max_diff = check_parity(images)
+    per_image = _time(lambda: [_mnist_style_preprocess(img) for img in images], repeat)
+    batched = _time(lambda: preprocess_batch(arrays, out=out), repeat)
+    return {
+        'n': n,
+        'parity_max_abs_diff': max_diff,
+        'per_image_s': per_image,
+        'batch_s': batched,
+        'per_image_img_per_s': n / per_image,
+        'batch_img_per_s': n / batched,
+        'speedup': per_image / batched,
+    }
+
+
+def suite(batch_sizes=(1, 32, 256), iterations: int = 20, seed: int = 0) -> dict:
+    """
+    Resultados con nombre para `benchmarks.run`: imagen a imagen (PNG y
+    píxeles crudos) y `preprocess_batch` a varios tamaños de lote.
+    """
+    assert_parity(seed=seed)
+    pool = synthetic_digits(max(64, max(batch_sizes)), seed=seed)
+    pngs = png_bytes(pool)
+    raws = [np.frombuffer(b, dtype=np.uint8).reshape(56, 56) for b in ink_pixels(pool)]
+
+    results = {
+        'preprocessing.preprocess_image_png': measure(
+            lambda i: preprocess_image(pngs[i % len(pngs)], flatten=False), iterations * 5),
+        'preprocessing.canvas_raw_56': measure(
+            lambda i: preprocess_canvas_data(raws[i % len(raws)], flatten=False, inverted=True), iterations * 5),
+    }
+    for n in batch_sizes:
+        arrays = [np.asarray(img) for img in pool[:n]]
+        out = np.empty((n, 28, 28), dtype=np.float32)
+        results[f'preprocessing.batch.b{n}'] = measure(lambda i: preprocess_batch(arrays, out=out), iterations, items=n)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--n', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    assert_parity(seed=args.seed)
+    result = run(args.n, args.repeat, args.seed)
+    print(json.dumps(result, indent=2))
+    if result['parity_max_abs_diff'] != 0.0:
+        sys.exit("preprocess_batch no coincide con _mnist_style_preprocess")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_store.py
+"""
+Escritura y lectura del log de predicciones (`PredictionStore`) con logs
+de distinto tamaño (1k / 100k / 1M registros).
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.bench_store --sizes 1000,100000,1000000
+
+Las bases de datos se crean en un directorio temporal; la de 1M registros
+tarda un rato en generarse la primera vez.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import measure
+from benchmarks.fixtures import prediction_records
+
+FILL_CHUNK = 10000
+
+
+def build_store(root: str, size: int, seed: int = 0):
+    """
+    Crea un `PredictionStore` con `size` registros sintéticos.
+    """
+    from utils.prediction_store import PredictionStore
+
+    store = PredictionStore(os.path.join(root, f'predictions_{size}.db'))
+    if store.count() >= size:
+        return store
+    records = prediction_records(size, seed=seed)
+    while True:
+        chunk = list(itertools.islice(records, FILL_CHUNK))
+        if not chunk:
+            break
+        store.add_many(chunk)
+    return store
+
+
+def suite(sizes=(1000, 100000), iterations: int = 50, seed: int = 0, workdir: str = None) -> dict:
+    root = workdir or tempfile.mkdtemp(prefix='bench_store_')
+    results = {}
+    try:
+        for size in sizes:
+            store = build_store(root, size, seed=seed)
+            # Los ids consultados se toman del principio y del final del log
+            ids = [r['id'] for r in store.query(limit=100)[0]]
+            ids += [r['id'] for r in store.query(limit=100, cursor=101)[0]]
+            many = max(5, iterations // 5)
+            # Otra semilla: ids distintos de los ya guardados
+            fresh = prediction_records(iterations + (many + 3) * 100 + 3, seed=seed + 1)
+
+            results[f'store.add.n{size}'] = measure(lambda i: store.add(next(fresh)), iterations)
+            results[f'store.add_many_100.n{size}'] = measure(
+                lambda i: store.add_many(list(itertools.islice(fresh, 100))), many, items=100)
+            results[f'store.get.n{size}'] = measure(lambda i: store.get(ids[i % len(ids)]), iterations)
+            results[f'store.page_50.n{size}'] = measure(lambda i: store.query(limit=50), iterations, items=50)
+            results[f'store.page_user_digit.n{size}'] = measure(
+                lambda i: store.query(limit=50, user=f'user{i % 50}', digit=i % 10), iterations, items=50)
+            results[f'store.count.n{size}'] = measure(lambda i: store.count(), iterations)
+            scan = min(size, 100000)
+            results[f'store.iter_scan.n{size}'] = measure(
+                lambda i: sum(1 for _ in itertools.islice(store.iter_records(), scan)), 3, warmup=1, items=scan)
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--workdir', default=None, help="reutilizar las bases generadas en este directorio")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    print(json.dumps(suite(sizes, args.iterations, workdir=args.workdir), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/common.py
+"""
+Utilidades compartidas por los benchmarks: medición con percentiles,
+metadatos del entorno y comparación con una línea base guardada.
+"""
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+
+def measure(fn, iterations: int = 50, warmup: int = 3, items: int = 1) -> dict:
+    """
+    Ejecuta `fn()` `iterations` veces (tras `warmup` llamadas sin medir).
+
+    Args:
+        fn: función sin argumentos; recibe el índice de iteración si lo acepta
+        iterations: repeticiones medidas
+        warmup: repeticiones previas descartadas
+        items: elementos procesados por llamada (imágenes, registros...),
+            para calcular el rendimiento
+
+    Returns:
+        latencias en ms (media, p50, p90, p99, mín, máx) y elementos/s
+    """
+    for i in range(warmup):
+        fn(i)
+    samples = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(warmup + i)
+        samples[i] = time.perf_counter() - t0
+    ms = samples * 1000.0
+    total = float(samples.sum())
+    return {
+        'iterations': iterations,
+        'items': items,
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'min_ms': float(ms.min()),
+        'max_ms': float(ms.max()),
+        'items_per_s': iterations * items / total if total else 0.0,
+    }
+
+
+def median_of_runs(runs) -> dict:
+    """
+    Combina varias ejecuciones (`{benchmark: stats}`) en una: mediana de cada
+    métrica de tiempo o rendimiento, solo para los benchmarks presentes en
+    todas. Reduce el ruido de una sola ejecución al comparar con la base.
+    """
+    runs = list(runs)
+    if len(runs) == 1:
+        return runs[0]
+    names = set(runs[0]).intersection(*runs[1:])
+    merged = {}
+    for name in sorted(names):
+        stats = [run[name] for run in runs]
+        merged[name] = {
+            key: float(np.median([s[key] for s in stats])) if isinstance(value, float) else value
+            for key, value in stats[0].items()
+        }
+        merged[name]['repeats'] = len(runs)
+    return merged
+
+
+def environment() -> dict:
+    return {
+        'time': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def save_results(results: dict, path: str):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_results(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def compare(current: dict, baseline: dict, metric: str = 'p50_ms', tolerance: float = 0.10) -> list:
+    """
+    Compara cada benchmark presente en ambos resultados.
+
+    Returns:
+        lista de `(nombre, base, actual, ratio, estado)` con estado
+        'regression' (más lento que `1 + tolerance`), 'improvement'
+        (más rápido que `1 - tolerance`) u 'ok'
+    """
+    rows = []
+    base_results = baseline.get('results', {})
+    for name, stats in sorted(current.get('results', {}).items()):
+        base = base_results.get(name)
+        if not base or metric not in base or metric not in stats or not base[metric]:
+            continue
+        ratio = stats[metric] / base[metric]
+        if ratio > 1.0 + tolerance:
+            status = 'regression'
+        elif ratio < 1.0 - tolerance:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, base[metric], stats[metric], ratio, status))
+    return rows
+
+
+def format_comparison(rows, metric: str = 'p50_ms') -> str:
+    lines = [f"{'benchmark':<48} {'base ' + metric:>14} {'actual':>12} {'ratio':>7}  estado"]
+    for name, base, cur, ratio, status in rows:
+        lines.append(f"{name:<48} {base:>14.3f} {cur:>12.3f} {ratio:>7.2f}  {status}")
+    return '\n'.join(lines)
@@ -0,0 +1,88 @@
+# benchmarks/fixtures.py
+"""
+Datos sintéticos deterministas para los benchmarks: dígitos dibujados,
+sus PNG / data URLs / píxeles crudos y registros de predicción.
+"""
+import base64
+import io
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def synthetic_digits(n: int, seed: int = 0, sizes=((280, 280), (200, 150), (64, 64))):
+    """
+    Trazos sintéticos deterministas (tinta negra sobre blanco) de varios
+    tamaños, incluida alguna imagen vacía y alguna RGBA.
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(n):
+        w, h = sizes[i % len(sizes)]
+        mode = 'RGBA' if i % 7 == 3 else 'L'
+        img = Image.new(mode, (w, h), 'white')
+        if i % 50 != 49:  # algunas vacías
+            draw = ImageDraw.Draw(img)
+            for _ in range(int(rng.integers(1, 4))):
+                pts = [tuple(int(v) for v in rng.integers(0, (w, h))) for _ in range(3)]
+                draw.line(pts, fill='black', width=int(rng.integers(max(2, w // 40), max(3, w // 12))))
+        images.append(img)
+    return images
+
+
+def png_bytes(images) -> list:
+    out = []
+    for img in images:
+        buf = io.BytesIO()
+        img.save(buf, format='PNG')
+        out.append(buf.getvalue())
+    return out
+
+
+def data_urls(images) -> list:
+    return ['data:image/png;base64,' + base64.b64encode(raw).decode('ascii') for raw in png_bytes(images)]
+
+
+def ink_pixels(images, size: int = 56) -> list:
+    """
+    Cuerpos binarios para /predict (uint8 `size x size`, polaridad MNIST),
+    como los que envía canvas_binary.js.
+    """
+    return [
+        (255 - np.asarray(img.convert('L').resize((size, size), Image.BILINEAR))).astype(np.uint8).tobytes()
+        for img in images
+    ]
+
+
+def mnist_like_batch(n: int, seed: int = 0) -> np.ndarray:
+    """
+    Lote `(n,28,28)` float32 en [0,1] ya preprocesado, para medir solo la inferencia.
+    """
+    from utils.preprocessing import preprocess_batch
+
+    images = synthetic_digits(n, seed=seed, sizes=((64, 64),))
+    return preprocess_batch([np.asarray(img) for img in images])
+
+
+def prediction_records(n: int, seed: int = 0, users: int = 50, start: datetime = None):
+    """
+    Genera `n` registros con el formato de /predict (ids y horas deterministas).
+    """
+    rng = np.random.default_rng(seed)
+    start = start or datetime(2024, 1, 1)
+    preds = rng.integers(0, 10, size=(n, 2))
+    confs = rng.random((n, 2))
+    user_ids = rng.integers(0, users, size=n)
+    seed_bytes = rng.bytes(16)
+    for i in range(n):
+        yield {
+            'id': str(uuid.UUID(bytes=bytes(a ^ b for a, b in zip(seed_bytes, i.to_bytes(16, 'big'))))),
+            'time': (start + timedelta(seconds=i)).isoformat(),
+            'user': f'user{int(user_ids[i])}',
+            'pred_mlp': int(preds[i, 0]),
+            'conf_mlp': float(confs[i, 0]),
+            'pred_cnn': int(preds[i, 1]),
+            'conf_cnn': float(confs[i, 1]),
+        }
@@ -0,0 +1,120 @@
+# benchmarks/run.py
+"""
+Ejecuta los benchmarks, guarda los resultados en JSON y los compara con
+una línea base.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.run -o resultados.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+    python -m benchmarks.run --suites preprocessing,inference --save-baseline
+
+Con `--baseline` se compara la latencia p50 de cada benchmark y el proceso
+termina con código 1 si alguno es más lento que la tolerancia (`--tolerance`,
+10% por defecto y 50% con `--quick`, cuyas 10 iteraciones son mucho más
+ruidosas). Al guardar o comparar una línea base, cada suite se ejecuta
+`--repeat` veces (3 por defecto) y se usa la mediana de cada métrica. La
+línea base depende de la máquina: genérala con `--save-baseline` en la
+misma máquina y con el mismo modo (`--quick` o no) con el que se vaya a
+comparar.
+"""
+import argparse
+import os
+import sys
+
+from benchmarks.common import (
+    ROOT, environment, save_results, load_results, compare, format_comparison, median_of_runs,
+)
+
+SUITES = ('preprocessing', 'inference', 'store', 'endpoints')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+TOLERANCE = 0.10
+QUICK_TOLERANCE = 0.50
+
+
+def _run_suite(name: str, iterations: int, quick: bool, store_sizes, backends, seed: int) -> dict:
+    if name == 'preprocessing':
+        from benchmarks import bench_preprocessing
+        return bench_preprocessing.suite(iterations=max(5, iterations // 2), seed=seed)
+    if name == 'inference':
+        from benchmarks import bench_inference
+        return bench_inference.suite(backends or ('numpy', 'function'), iterations=iterations)
+    if name == 'store':
+        from benchmarks import bench_store
+        sizes = store_sizes or ((1000,) if quick else (1000, 100000))
+        return bench_store.suite(sizes, iterations=iterations, seed=seed)
+    from benchmarks import bench_endpoints
+    return bench_endpoints.suite(iterations=iterations, seed=seed)
+
+
+def run_suites(suites, quick: bool = False, store_sizes=None, backends=None, seed: int = 0,
+               repeat: int = 1) -> dict:
+    """
+    Ejecuta las suites `repeat` veces y guarda la mediana de cada métrica.
+    """
+    iterations = 10 if quick else 50
+    results = {}
+    for name in suites:
+        runs = []
+        for r in range(max(1, repeat)):
+            print(f"Ejecutando benchmarks de {name} ({r + 1}/{max(1, repeat)})...", file=sys.stderr)
+            runs.append(_run_suite(name, iterations, quick, store_sizes, backends, seed))
+        results.update(median_of_runs(runs))
+    return {'environment': environment(), 'seed': seed, 'quick': quick, 'repeat': max(1, repeat),
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de benchmarks del proyecto")
+    parser.add_argument('-o', '--output', default=None, help="fichero JSON de resultados")
+    parser.add_argument('--suites', default=','.join(SUITES))
+    parser.add_argument('--quick', action='store_true', help="menos iteraciones y solo el log de 1k registros")
+    parser.add_argument('--store-sizes', default=None, help="p. ej. 1000,100000,1000000")
+    parser.add_argument('--backends', default=None, help="backends del MLP, p. ej. numpy,function,tflite")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=None, help=f"línea base a comparar (p. ej. {os.path.relpath(DEFAULT_BASELINE, ROOT)})")
+    parser.add_argument('--save-baseline', action='store_true', help="guardar los resultados como línea base")
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help=f"regresión si es más lento que 1+tolerancia ({TOLERANCE}, {QUICK_TOLERANCE} con --quick)")
+    parser.add_argument('--repeat', type=int, default=None,
+                        help="ejecuciones por suite, se usa la mediana (1; 3 con --baseline o --save-baseline)")
+    parser.add_argument('--metric', default='p50_ms')
+    args = parser.parse_args(argv)
+
+    suites = [s for s in args.suites.split(',') if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Suites desconocidas: {', '.join(sorted(unknown))}")
+    store_sizes = [int(s) for s in args.store_sizes.split(',')] if args.store_sizes else None
+    backends = [b for b in args.backends.split(',') if b] if args.backends else None
+
+    comparing = bool(args.baseline) and not args.save_baseline
+    repeat = args.repeat or (3 if args.baseline or args.save_baseline else 1)
+    tolerance = args.tolerance if args.tolerance is not None else (QUICK_TOLERANCE if args.quick else TOLERANCE)
+
+    current = run_suites(suites, quick=args.quick, store_sizes=store_sizes, backends=backends, seed=args.seed,
+                         repeat=repeat)
+
+    if args.output:
+        save_results(current, args.output)
+    if args.save_baseline:
+        save_results(current, args.baseline or DEFAULT_BASELINE)
+
+    for name, stats in sorted(current['results'].items()):
+        print(f"{name:<48} p50 {stats['p50_ms']:>10.3f} ms  p99 {stats['p99_ms']:>10.3f} ms  {stats['items_per_s']:>12.1f}/s")
+
+    if comparing:
+        baseline = load_results(args.baseline)
+        if baseline.get('quick', args.quick) != args.quick:
+            print("Aviso: la línea base y esta ejecución no usan el mismo modo (--quick); "
+                  "las latencias no son comparables")
+        rows = compare(current, baseline, metric=args.metric, tolerance=tolerance)
+        print()
+        print(f"Tolerancia {tolerance:.0%}, mediana de {repeat} ejecuciones")
+        print(format_comparison(rows, args.metric))
+        if any(status == 'regression' for *_, status in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+# utils/aggregates.py
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+WINDOWS = ('last', 'hour', 'day', 'total')
+
+
+def record_timestamp(record: dict, default: float = None) -> float:
+    """
+    Epoch (s) del campo `time` de un registro (ISO-8601; sin zona = UTC).
+    """
+    value = record.get('time')
+    if value:
+        try:
+            dt = datetime.fromisoformat(value)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.timestamp()
+        except (TypeError, ValueError):
+            pass
+    return time.time() if default is None else default
+
+
+class _Counts:
+    """
+    Conteos de un conjunto de predicciones: dígitos predichos e histograma
+    de confianza por modelo, y coincidencias entre modelos.
+    """
+
+    def __init__(self, models, num_classes: int, conf_bins: int):
+        self.n = 0
+        self.both = 0    # predicciones con resultado de todos los modelos
+        self.agree = 0   # ... en las que todos coinciden
+        self.digits = {m: np.zeros(num_classes, dtype=np.int64) for m in models}
+        self.conf_hist = {m: np.zeros(conf_bins, dtype=np.int64) for m in models}
+        self.conf_sum = dict.fromkeys(models, 0.0)
+        self.conf_n = dict.fromkeys(models, 0)
+
+    def add(self, sample, sign: int = 1):
+        preds, bins, confs, agree = sample
+        self.n += sign
+        if agree is not None:
+            self.both += sign
+            self.agree += sign * agree
+        for model, pred in preds.items():
+            self.digits[model][pred] += sign
+        for model, b in bins.items():
+            self.conf_hist[model][b] += sign
+            self.conf_sum[model] += sign * confs[model]
+            self.conf_n[model] += sign
+
+    def merge(self, other):
+        self.n += other.n
+        self.both += other.both
+        self.agree += other.agree
+        for model in self.digits:
+            self.digits[model] += other.digits[model]
+            self.conf_hist[model] += other.conf_hist[model]
+            self.conf_sum[model] += other.conf_sum[model]
+            self.conf_n[model] += other.conf_n[model]
+
+
+class _TimeBuckets:
+    """
+    Anillo de `size` buckets de `width_s` segundos; un bucket se reutiliza
+    (y se vacía) cuando le toca a un intervalo nuevo.
+    """
+
+    def __init__(self, width_s: int, size: int, factory):
+        self.width_s = width_s
+        self.size = size
+        self._factory = factory
+        self._keys = [None] * size
+        self._buckets = [factory() for _ in range(size)]
+
+    def add(self, ts: float, now: float, sample):
+        key, now_key = int(ts // self.width_s), int(now // self.width_s)
+        if key <= now_key - self.size or key > now_key:
+            return  # fuera de la ventana
+        slot = key % self.size
+        if self._keys[slot] != key:
+            if self._keys[slot] is not None and self._keys[slot] > key:
+                return  # el hueco ya es de un intervalo más nuevo
+            self._keys[slot] = key
+            self._buckets[slot] = self._factory()
+        self._buckets[slot].add(sample)
+
+    def series(self, now: float):
+        """
+        Buckets de la ventana, del más antiguo al actual (None = vacío).
+        """
+        now_key = int(now // self.width_s)
+        out = []
+        for key in range(now_key - self.size + 1, now_key + 1):
+            slot = key % self.size
+            out.append(self._buckets[slot] if self._keys[slot] == key else None)
+        return out
+
+
+class RollingAggregates:
+    """
+    Agregados de predicciones para el panel de estadísticas, actualizados
+    de forma incremental (`observe_many` con las escrituras nuevas) en vez
+    de recalcularse desde el historial.
+
+    Ventanas:
+    - `last`: las últimas `last_n` predicciones
+    - `hour`: la última hora, en buckets de un minuto
+    - `day`: las últimas 24 horas, en buckets de una hora
+    - `total`: todo el historial (`seed`) más lo observado después
+
+    Para cada ventana: número de predicciones, dígitos predichos por modelo,
+    tasa de coincidencia entre modelos e histograma y media de la confianza.
+
+    Args:
+        models: modelos con campos `pred_<modelo>` / `conf_<modelo>` en los registros
+        num_classes: número de clases
+        last_n: tamaño de la ventana `last`
+        conf_bins: intervalos del histograma de confianza en [0, 1]
+    """
+
+    def __init__(self, models=('mlp', 'cnn'), num_classes: int = 10, last_n: int = 500, conf_bins: int = 10):
+        self.models = tuple(models)
+        self.num_classes = num_classes
+        self.last_n = last_n
+        self.conf_bins = conf_bins
+        self._lock = threading.Lock()
+        self._last = deque()
+        self._last_counts = self._new_counts()
+        self._minutes = _TimeBuckets(60, 60, self._new_counts)
+        self._hours = _TimeBuckets(3600, 24, self._new_counts)
+        self._total = self._new_counts()
+        self.version = 0
+
+    def _new_counts(self) -> _Counts:
+        return _Counts(self.models, self.num_classes, self.conf_bins)
+
+    def _sample(self, record: dict):
+        preds, bins, confs = {}, {}, {}
+        for model in self.models:
+            pred = record.get(f'pred_{model}')
+            if pred is not None and 0 <= int(pred) < self.num_classes:
+                preds[model] = int(pred)
+            conf = record.get(f'conf_{model}')
+            if conf is not None:
+                conf = min(max(float(conf), 0.0), 1.0)
+                confs[model] = conf
+                bins[model] = min(int(conf * self.conf_bins), self.conf_bins - 1)
+        agree = None
+        if len(preds) == len(self.models) > 1:
+            agree = int(len(set(preds.values())) == 1)
+        return preds, bins, confs, agree
+
+    # -------------------------
+    # Actualización
+    # -------------------------
+    def observe(self, record: dict, now: float = None):
+        self.observe_many([record], now=now)
+
+    def observe_many(self, records, now: float = None, windows=WINDOWS):
+        """
+        Suma registros a las ventanas indicadas (por defecto, a todas).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            for record in records:
+                sample = self._sample(record)
+                ts = record_timestamp(record, default=now)
+                if 'last' in windows:
+                    self._last.append(sample)
+                    self._last_counts.add(sample)
+                    if len(self._last) > self.last_n:
+                        self._last_counts.add(self._last.popleft(), sign=-1)
+                if 'hour' in windows:
+                    self._minutes.add(ts, now, sample)
+                if 'day' in windows:
+                    self._hours.add(ts, now, sample)
+                if 'total' in windows:
+                    self._total.add(sample)
+            self.version += 1
+
+    def seed(self, records_newest_first, now: float = None):
+        """
+        Carga el historial anterior a las escrituras ya observadas (más
+        reciente primero). Todos los registros cuentan en `total`, pero solo
+        se guardan las últimas `last_n` predicciones y las de las últimas
+        24 h. Puede llamarse después de `observe`, porque los registros
+        sembrados se colocan detrás de los ya observados.
+        """
+        now = time.time() if now is None else now
+        day_start = now - self._hours.width_s * self._hours.size
+        recent, in_day = [], []
+        total = self._new_counts()
+        for record in records_newest_first:
+            total.add(self._sample(record))
+            if len(recent) < self.last_n:
+                recent.append(record)
+            if record_timestamp(record, default=now) >= day_start:
+                in_day.append(record)
+
+        with self._lock:
+            for record in recent:
+                if len(self._last) >= self.last_n:
+                    break
+                sample = self._sample(record)
+                self._last.appendleft(sample)
+                self._last_counts.add(sample)
+            self._total.merge(total)
+        self.observe_many(in_day, now=now, windows=('hour', 'day'))
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+    def _window(self, window: str, now: float):
+        if window == 'last':
+            return self._last_counts, None
+        if window == 'total':
+            return self._total, None
+        buckets = self._minutes if window == 'hour' else self._hours
+        series = buckets.series(now)
+        counts = self._new_counts()
+        for bucket in series:
+            if bucket is not None:
+                counts.merge(bucket)
+        return counts, (buckets.width_s, series)
+
+    def snapshot(self, window: str = 'last', now: float = None) -> dict:
+        """
+        Resumen compacto de una ventana. `hour` y `day` incluyen además la
+        serie por bucket (predicciones y tasa de coincidencia).
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"Ventana no válida: {window} (usa {', '.join(WINDOWS)})")
+        now = time.time() if now is None else now
+        with self._lock:
+            counts, series = self._window(window, now)
+            result = {
+                'window': window,
+                'n': counts.n,
+                'agreement': _rate(counts.agree, counts.both),
+                'digits': {m: counts.digits[m].tolist() for m in self.models},
+                'confidence': {
+                    m: {
+                        'mean': _rate(counts.conf_sum[m], counts.conf_n[m]),
+                        'hist': counts.conf_hist[m].tolist(),
+                    }
+                    for m in self.models
+                },
+            }
+            if series is not None:
+                width_s, buckets = series
+                result['series'] = {
+                    'bucket_s': width_s,
+                    'n': [b.n if b else 0 for b in buckets],
+                    'agreement': [_rate(b.agree, b.both) if b else None for b in buckets],
+                }
+        return result
+
+
+def _rate(num, den):
+    return round(num / den, 4) if den else None
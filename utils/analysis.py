@@ -1,67 +1,358 @@
 # utils/analysis.py
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import confusion_matrix, classification_report
-import numpy as np
 import io
+import json
+import threading
+
+import numpy as np
+
+from utils.result_cache import LRUCache, hash_bytes
+
+# matplotlib, seaborn y sklearn se importan solo al dibujar: importar este
+# módulo (p. ej. desde app.py) no los carga.
+
+# PNG ya dibujados (p. ej. el mismo historial de entrenamiento)
+_plot_cache = LRUCache(64)
+# pyplot/seaborn no son seguros entre hilos
+_plot_lock = threading.Lock()
+
+
+def _label_index(y_true, y_pred, labels=None):
+    y_true = np.asarray(y_true).ravel()
+    y_pred = np.asarray(y_pred).ravel()
+    if labels is None:
+        labels = np.union1d(y_true, y_pred)
+    labels = np.asarray(labels)
+    return labels, y_true, y_pred
+
+
+def confusion_counts(y_true, y_pred, num_classes: int) -> np.ndarray:
+    """
+    Matriz de confusión `(K,K)` de enteros 0..K-1 con un único `bincount`.
+    """
+    idx = np.asarray(y_true, dtype=np.int64).ravel() * num_classes + np.asarray(y_pred, dtype=np.int64).ravel()
+    return np.bincount(idx, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
 
 def compute_confusion(y_true, y_pred, labels=None):
     """
-    Calcula la matriz de confusión.
+    Calcula la matriz de confusión (filas = real, columnas = predicho), en el
+    orden de `labels` (por defecto, las etiquetas presentes ordenadas).
     """
-    cm = confusion_matrix(y_true, y_pred, labels=labels)
-    return cm
+    labels, y_true, y_pred = _label_index(y_true, y_pred, labels)
+    order = np.argsort(labels)
+    sorted_labels = labels[order]
+    t = np.searchsorted(sorted_labels, y_true)
+    p = np.searchsorted(sorted_labels, y_pred)
+    t = np.clip(t, 0, len(labels) - 1)
+    p = np.clip(p, 0, len(labels) - 1)
+    # Las etiquetas fuera de `labels` no cuentan
+    valid = (sorted_labels[t] == y_true) & (sorted_labels[p] == y_pred)
+    cm_sorted = confusion_counts(t[valid], p[valid], len(labels))
+    inverse = np.argsort(order)
+    return cm_sorted[np.ix_(inverse, inverse)]
 
-def plot_confusion_matrix(cm, labels=None):
+
+def metrics_from_confusion(cm, labels=None) -> dict:
     """
-    Genera un heatmap de la matriz de confusión.
+    Precision, recall, F1 y soporte por clase a partir de una matriz de
+    confusión, con el mismo formato que `classification_report(output_dict=True)`.
     """
-    plt.figure(figsize=(8,6))
-    sns.heatmap(cm, annot=True, fmt='d', xticklabels=labels, yticklabels=labels, cmap='Blues')
-    plt.ylabel('Actual')
-    plt.xlabel('Predicted')
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
-    return buf
+    cm = np.asarray(cm, dtype=np.float64)
+    labels = list(range(len(cm))) if labels is None else list(labels)
+    return _report_from_counts(np.diag(cm), cm.sum(axis=1), cm.sum(axis=0), labels)
+
+
+def _report_from_counts(tp, support, predicted, labels, micro: bool = False) -> dict:
+    """
+    Informe tipo sklearn a partir de aciertos, soporte y predichos por clase.
+    Con `micro` (etiquetas que no cubren todas las presentes) incluye
+    `micro avg` en lugar de `accuracy`, como `classification_report`.
+    """
+    tp, support, predicted = (np.asarray(v, dtype=np.float64) for v in (tp, support, predicted))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    total = support.sum()
+    report = {}
+    for i, label in enumerate(labels):
+        report[str(label)] = {
+            'precision': float(precision[i]),
+            'recall': float(recall[i]),
+            'f1-score': float(f1[i]),
+            'support': int(support[i]),
+        }
+    if micro:
+        micro_p = tp.sum() / predicted.sum() if predicted.sum() else 0.0
+        micro_r = tp.sum() / total if total else 0.0
+        report['micro avg'] = {
+            'precision': float(micro_p),
+            'recall': float(micro_r),
+            'f1-score': float(2 * micro_p * micro_r / (micro_p + micro_r)) if micro_p + micro_r else 0.0,
+            'support': int(total),
+        }
+    else:
+        report['accuracy'] = float(tp.sum() / total) if total else 0.0
+    report['macro avg'] = {
+        'precision': float(precision.mean()) if len(tp) else 0.0,
+        'recall': float(recall.mean()) if len(tp) else 0.0,
+        'f1-score': float(f1.mean()) if len(tp) else 0.0,
+        'support': int(total),
+    }
+    weights = support / total if total else np.zeros_like(support)
+    report['weighted avg'] = {
+        'precision': float((precision * weights).sum()),
+        'recall': float((recall * weights).sum()),
+        'f1-score': float((f1 * weights).sum()),
+        'support': int(total),
+    }
+    return report
+
 
 def print_classification_report(y_true, y_pred, labels=None):
     """
     Retorna el reporte de clasificación tipo precision, recall y f1-score.
+
+    Igual que `classification_report(output_dict=True)`: si `labels` no
+    cubre todas las etiquetas presentes, las muestras de otras clases
+    siguen contando en el soporte y los predichos de cada clase, y el
+    informe lleva `micro avg` en lugar de `accuracy`.
     """
-    report = classification_report(y_true, y_pred, labels=labels, output_dict=True)
-    return report
+    labels, y_true, y_pred = _label_index(y_true, y_pred, labels)
+    if np.isin(np.union1d(y_true, y_pred), labels).all():
+        return metrics_from_confusion(compute_confusion(y_true, y_pred, labels), labels.tolist())
+    order = np.argsort(labels)
+    sorted_labels = labels[order]
+
+    def per_label(values):
+        idx = np.clip(np.searchsorted(sorted_labels, values), 0, len(labels) - 1)
+        valid = sorted_labels[idx] == values
+        return np.bincount(idx[valid], minlength=len(labels))[np.argsort(order)]
+
+    return _report_from_counts(per_label(y_true[y_true == y_pred]), per_label(y_true), per_label(y_pred),
+                               labels.tolist(), micro=True)
+
+
+def plot_confusion_matrix(cm, labels=None):
+    """
+    Genera un heatmap de la matriz de confusión (cacheado por contenido).
+    """
+    cm = np.asarray(cm)
+    label_names = [str(l) for l in labels] if labels is not None else []
+    key = hash_bytes(cm.astype(np.int64).tobytes() + json.dumps(label_names).encode())
+    png = _plot_cache.get(key)
+    if png is None:
+        png = _render_confusion(cm, labels)
+        _plot_cache.put(key, png)
+    return io.BytesIO(png)
+
+
+def _render_confusion(cm, labels=None, title: str = None) -> bytes:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    with _plot_lock:
+        fig = plt.figure(figsize=(8,6))
+        sns.heatmap(cm, annot=True, fmt='d', xticklabels=labels if labels is not None else 'auto',
+                    yticklabels=labels if labels is not None else 'auto', cmap='Blues')
+        plt.ylabel('Actual')
+        plt.xlabel('Predicted')
+        if title:
+            plt.title(title)
+        plt.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        plt.close(fig)
+    return buf.getvalue()
+
 
 def plot_training_history(history):
     """
-    history: objeto retornado por model.fit()
-    Retorna figura matplotlib de accuracy y loss
-    """
-    plt.figure(figsize=(10,4))
-
-    # Accuracy
-    plt.subplot(1,2,1)
-    plt.plot(history.history['accuracy'], label='train_acc')
-    plt.plot(history.history.get('val_accuracy', []), label='val_acc')
-    plt.title('Accuracy')
-    plt.xlabel('Epoch')
-    plt.ylabel('Accuracy')
-    plt.legend()
-
-    # Loss
-    plt.subplot(1,2,2)
-    plt.plot(history.history['loss'], label='train_loss')
-    plt.plot(history.history.get('val_loss', []), label='val_loss')
-    plt.title('Loss')
-    plt.xlabel('Epoch')
-    plt.ylabel('Loss')
-    plt.legend()
-
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
-    return buf
+    history: objeto retornado por model.fit() (o su diccionario `history`)
+    Retorna un PNG (BytesIO) de accuracy y loss, cacheado por contenido
+    """
+    values = getattr(history, 'history', history)
+    key = hash_bytes(json.dumps(values, sort_keys=True, default=float))
+    png = _plot_cache.get(key)
+    if png is None:
+        png = _render_training_history(values)
+        _plot_cache.put(key, png)
+    return io.BytesIO(png)
+
+
+def _render_training_history(values: dict) -> bytes:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    with _plot_lock:
+        fig = plt.figure(figsize=(10,4))
+
+        # Accuracy
+        plt.subplot(1,2,1)
+        plt.plot(values['accuracy'], label='train_acc')
+        plt.plot(values.get('val_accuracy', []), label='val_acc')
+        plt.title('Accuracy')
+        plt.xlabel('Epoch')
+        plt.ylabel('Accuracy')
+        plt.legend()
+
+        # Loss
+        plt.subplot(1,2,2)
+        plt.plot(values['loss'], label='train_loss')
+        plt.plot(values.get('val_loss', []), label='val_loss')
+        plt.title('Loss')
+        plt.xlabel('Epoch')
+        plt.ylabel('Loss')
+        plt.legend()
+
+        plt.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        plt.close(fig)
+    return buf.getvalue()
+
+
+# -------------------------
+# Evaluación incremental en línea
+# -------------------------
+class StreamingEvaluator:
+    """
+    Matrices de confusión acumuladas por modelo, actualizadas muestra a
+    muestra con las etiquetas que llegan por `/train_feedback`.
+
+    Además de la matriz se mantienen los totales por fila (soporte), por
+    columna (predichos), la diagonal y los aciertos, así que cada
+    actualización es O(1) y las métricas no recorren el historial. Cada
+    modelo tiene un número de versión que cambia con sus cuentas; el PNG de
+    su matriz se cachea hasta que cambia la versión.
+
+    Args:
+        models: nombres de los modelos a evaluar
+        num_classes: número de clases (etiquetas 0..K-1)
+    """
+
+    def __init__(self, models=('mlp', 'cnn'), num_classes: int = 10):
+        self.num_classes = num_classes
+        self._lock = threading.Lock()
+        self._cm = {m: np.zeros((num_classes, num_classes), dtype=np.int64) for m in models}
+        self._support = {m: np.zeros(num_classes, dtype=np.int64) for m in models}
+        self._predicted = {m: np.zeros(num_classes, dtype=np.int64) for m in models}
+        self._tp = {m: np.zeros(num_classes, dtype=np.int64) for m in models}
+        self._correct = dict.fromkeys(models, 0)
+        self._total = dict.fromkeys(models, 0)
+        self._version = dict.fromkeys(models, 0)
+        self._seen = set()
+        self._png = {}
+
+    @property
+    def models(self):
+        return list(self._cm)
+
+    # -------------------------
+    # Actualización
+    # -------------------------
+    def update(self, model: str, y_true: int, y_pred: int):
+        t, p = int(y_true), int(y_pred)
+        if not (0 <= t < self.num_classes and 0 <= p < self.num_classes):
+            return
+        with self._lock:
+            self._cm[model][t, p] += 1
+            self._support[model][t] += 1
+            self._predicted[model][p] += 1
+            if t == p:
+                self._tp[model][t] += 1
+                self._correct[model] += 1
+            self._total[model] += 1
+            self._version[model] += 1
+
+    def update_from_record(self, record: dict, label: int) -> bool:
+        """
+        Une una etiqueta con el registro de su predicción (`pred_<modelo>`).
+        Cada predicción cuenta una sola vez aunque se etiquete de nuevo.
+        Devuelve True si se ha contado.
+        """
+        pred_id = record.get('id')
+        with self._lock:
+            if pred_id is not None:
+                if pred_id in self._seen:
+                    return False
+                self._seen.add(pred_id)
+        counted = False
+        for model in self._cm:
+            pred = record.get(f'pred_{model}')
+            if pred is not None:
+                self.update(model, label, pred)
+                counted = True
+        return counted
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+    def version(self, model: str) -> int:
+        return self._version[model]
+
+    def digest(self, model: str) -> str:
+        """
+        Hash del contenido de la matriz de `model` (para ETags entre procesos).
+        """
+        return hash_bytes(self.confusion(model).tobytes())
+
+    def confusion(self, model: str) -> np.ndarray:
+        with self._lock:
+            return self._cm[model].copy()
+
+    def metrics(self, model: str, per_class: bool = False) -> dict:
+        """
+        Exactitud, precision/recall/F1 macro y (opcional) por clase, a
+        partir de los totales mantenidos.
+        """
+        with self._lock:
+            tp = self._tp[model].astype(np.float64)
+            support = self._support[model].astype(np.float64)
+            predicted = self._predicted[model].astype(np.float64)
+            total, correct, version = self._total[model], self._correct[model], self._version[model]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, tp / predicted, 0.0)
+            recall = np.where(support > 0, tp / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        present = support > 0
+        result = {
+            'samples': total,
+            'version': version,
+            'accuracy': correct / total if total else None,
+            'macro_precision': float(precision[present].mean()) if present.any() else None,
+            'macro_recall': float(recall[present].mean()) if present.any() else None,
+            'macro_f1': float(f1[present].mean()) if present.any() else None,
+        }
+        if per_class:
+            result['per_class'] = {
+                str(c): {
+                    'precision': float(precision[c]),
+                    'recall': float(recall[c]),
+                    'f1-score': float(f1[c]),
+                    'support': int(support[c]),
+                }
+                for c in range(self.num_classes)
+            }
+        return result
+
+    def summary(self, per_class: bool = False) -> dict:
+        return {model: self.metrics(model, per_class=per_class) for model in self._cm}
+
+    def confusion_png(self, model: str) -> bytes:
+        """
+        PNG de la matriz de confusión de `model`, redibujado solo si cambió.
+        """
+        version = self._version[model]
+        cached = self._png.get(model)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        cm = self.confusion(model)
+        png = _render_confusion(cm, list(range(self.num_classes)), title=f"{model.upper()} (n={int(cm.sum())})")
+        self._png[model] = (version, png)
+        return png
@@ -0,0 +1,154 @@
+# utils/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils.instrumentation import Histogram
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes de inferencia en un único lote.
+
+    Cada llamada a `submit` encola un array 28x28 y devuelve un Future. Un
+    hilo de fondo vacía la cola cuando se alcanza `max_batch_size` o han
+    pasado `max_wait_ms` desde la primera petición del lote, ejecuta
+    `predict_fn` una sola vez con el lote apilado `(N,28,28)` y entrega a
+    cada llamador su propio resultado.
+
+    Args:
+        predict_fn: función que recibe un array `(N,28,28)` y devuelve una
+            lista de N resultados
+        max_batch_size: tamaño máximo de lote
+        max_wait_ms: espera máxima desde la primera petición encolada
+    """
+
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+    LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    def __init__(self, predict_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+
+        self.batch_sizes = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.latency_ms = Histogram(self.LATENCY_BUCKETS_MS)
+        self.inference_ms = Histogram(self.LATENCY_BUCKETS_MS)
+
+    # -------------------------
+    # API pública
+    # -------------------------
+    def submit(self, image_array) -> Future:
+        if self._stopping:
+            raise RuntimeError("El planificador de lotes se está deteniendo")
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((np.asarray(image_array, dtype=np.float32).reshape(28, 28), fut, time.perf_counter()))
+        return fut
+
+    def predict(self, image_array, timeout: float = None):
+        """
+        Encola una imagen y espera su resultado.
+        """
+        return self.submit(image_array).result(timeout=timeout)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self.queue_depth(),
+            'batch_size': self.batch_sizes.snapshot(),
+            'latency_ms': self.latency_ms.snapshot(),
+            'inference_ms': self.inference_ms.snapshot(),
+        }
+
+    def shutdown(self, drain: bool = True, timeout: float = None):
+        """
+        Detiene el hilo de fondo. Con `drain=True` se procesan antes las
+        peticiones que ya estaban en cola.
+        """
+        self._stopping = True
+        if self._thread is None:
+            return
+        if not drain:
+            self._fail_pending(RuntimeError("Planificador detenido"))
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # -------------------------
+    # Hilo de fondo
+    # -------------------------
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def _fail_pending(self, exc):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[1].set_exception(exc)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        stop = False
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            self._process(batch)
+            if stop:
+                # Vaciar lo que quede antes de terminar
+                while not self._queue.empty():
+                    first = self._queue.get_nowait()
+                    if first is not None:
+                        self._process(self._collect(first)[0])
+                return
+
+    def _process(self, batch):
+        arrays = np.stack([item[0] for item in batch])
+        self.batch_sizes.observe(len(batch))
+        t0 = time.perf_counter()
+        try:
+            results = self.predict_fn(arrays)
+        except Exception as e:
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+        t1 = time.perf_counter()
+        self.inference_ms.observe((t1 - t0) * 1000.0)
+        for (_, fut, enqueued), result in zip(batch, results):
+            self.latency_ms.observe((t1 - enqueued) * 1000.0)
+            fut.set_result(result)
@@ -0,0 +1,330 @@
+# utils/bulk_score.py
+"""
+Puntuación masiva offline de imágenes con los modelos MLP/CNN.
+
+Uso (desde la raíz del repositorio):
+
+    python -m utils.bulk_score imagenes/ -o resultados.csv
+    python -m utils.bulk_score dataset.zip -o resultados.parquet --batch-size 2048
+
+Las imágenes se leen en streaming de un directorio, un .zip o un .tar(.gz),
+se preprocesan en un pool de procesos con `preprocess_image`, se evalúan en
+lotes grandes de tamaño fijo y los resultados se escriben de forma
+incremental. Tras cada lote se guarda un checkpoint (`<salida>.ckpt.json`),
+así que si el proceso se interrumpe, volver a lanzarlo continúa donde se quedó.
+El checkpoint guarda también la posición de la salida (bytes del CSV o número
+de ficheros Parquet): al reanudar se descarta lo escrito después, de modo que
+un lote escrito sin llegar a guardar su checkpoint no se duplica.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from multiprocessing import Pool
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+FIELDNAMES = ['filename', 'pred_mlp', 'conf_mlp', 'pred_cnn', 'conf_cnn', 'error']
+MLP_PATH = os.path.join('models', 'MLP_NUEVO.keras')
+CNN_PATH = os.path.join('models', 'CNN_MNIST.keras')
+
+
+# -------------------------
+# Fuentes de imágenes (en orden determinista)
+# -------------------------
+def _is_image(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_images(source: str):
+    """
+    Itera `(nombre, bytes)` de un directorio, .zip o .tar sin cargarlo entero.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if _is_image(name):
+                    path = os.path.join(root, name)
+                    with open(path, 'rb') as fh:
+                        yield os.path.relpath(path, source), fh.read()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _is_image(info.filename):
+                    yield info.filename, zf.read(info)
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source, 'r:*') as tf:
+            for member in tf:
+                if member.isfile() and _is_image(member.name):
+                    yield member.name, tf.extractfile(member).read()
+    else:
+        raise ValueError(f"Unsupported source: {source}")
+
+
+def _take(iterator, n: int) -> list:
+    items = []
+    for item in iterator:
+        items.append(item)
+        if len(items) >= n:
+            break
+    return items
+
+
+# -------------------------
+# Preprocesado (en procesos hijos)
+# -------------------------
+def _preprocess_one(item):
+    from utils.preprocessing import preprocess_image
+
+    name, raw = item
+    try:
+        return name, preprocess_image(raw, target_size=(28, 28), flatten=False), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+# -------------------------
+# Modelos
+# -------------------------
+def load_runtimes(mlp_path: str, cnn_path: str, backend: str = None):
+    """
+    Devuelve `{'mlp': runtime, 'cnn': runtime}` con los modelos que existan.
+    """
+    from utils.inference_runtime import InferenceRuntime, create_runtime
+
+    runtimes = {}
+    for name, path in (('mlp', mlp_path), ('cnn', cnn_path)):
+        if not path or not os.path.exists(path):
+            continue
+        if backend == 'numpy' and name == 'mlp':
+            from utils.mlp_numpy import load_keras_mlp
+            runtimes[name] = InferenceRuntime(None, backend='numpy', name=name, engine=load_keras_mlp(path))
+            continue
+        from tensorflow import keras
+        model = keras.models.load_model(path, compile=False)
+        runtimes[name] = create_runtime(model, backend=None if backend == 'numpy' else backend, name=name)
+    return runtimes
+
+
+def score_batch(runtimes: dict, arrays: np.ndarray) -> dict:
+    """
+    Una pasada por modelo sobre `(N,28,28)`; devuelve `{modelo: (pred, conf)}`.
+    """
+    out = {}
+    if 'mlp' in runtimes:
+        probs = runtimes['mlp'](arrays.reshape(len(arrays), -1))
+        out['mlp'] = (probs.argmax(axis=1), probs.max(axis=1))
+    if 'cnn' in runtimes:
+        probs = runtimes['cnn'](arrays.reshape(len(arrays), 28, 28, 1))
+        out['cnn'] = (probs.argmax(axis=1), probs.max(axis=1))
+    return out
+
+
+# -------------------------
+# Escritores incrementales
+# -------------------------
+class CsvSink:
+    """
+    Añade filas a un CSV. Con `resume` (estado del checkpoint) el fichero se
+    recorta a `offset`, el tamaño que tenía al guardar ese checkpoint.
+    """
+
+    def __init__(self, path: str, resume: dict = None):
+        exists = resume is not None and os.path.exists(path) and os.path.getsize(path) > 0
+        if exists and resume.get('offset') is not None:
+            os.truncate(path, min(int(resume['offset']), os.path.getsize(path)))
+        self._fh = open(path, 'a' if exists else 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._fh, fieldnames=FIELDNAMES)
+        if not exists:
+            self._writer.writeheader()
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def state(self) -> dict:
+        return {'offset': self._fh.tell()}
+
+    def close(self):
+        self._fh.close()
+
+
+class ParquetSink:
+    """
+    Escribe un fichero Parquet por lote dentro del directorio `path`
+    (`part-00000.parquet`, ...), de modo que cada lote queda cerrado en disco.
+
+    El siguiente índice sale del checkpoint (`resume['parts']`), no de los
+    ficheros presentes: las partes posteriores se borran. Sin `resume` se
+    borran todas las de una ejecución anterior.
+    """
+
+    def __init__(self, path: str, resume: dict = None):
+        import pyarrow as pa
+
+        self._pa = pa
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        if resume is not None and resume.get('parts') is None:
+            # Checkpoint sin `parts`: se confía en los ficheros ya escritos
+            self._part = len(self._parts())
+        else:
+            self._part = int(resume['parts']) if resume is not None else 0
+        for name in self._parts():
+            if name.endswith('.tmp') or int(name[len('part-'):].split('.')[0]) >= self._part:
+                os.remove(os.path.join(path, name))
+        self._schema = pa.schema([
+            ('filename', pa.string()),
+            ('pred_mlp', pa.int64()), ('conf_mlp', pa.float64()),
+            ('pred_cnn', pa.int64()), ('conf_cnn', pa.float64()),
+            ('error', pa.string()),
+        ])
+
+    def write(self, rows: list):
+        import pyarrow.parquet as pq
+
+        table = self._pa.Table.from_pylist(rows, schema=self._schema)
+        final = os.path.join(self.path, f'part-{self._part:05d}.parquet')
+        tmp = final + '.tmp'
+        pq.write_table(table, tmp)
+        os.replace(tmp, final)
+        self._part += 1
+
+    def _parts(self) -> list:
+        return sorted(f for f in os.listdir(self.path)
+                      if f.startswith('part-') and f.endswith(('.parquet', '.parquet.tmp')))
+
+    def state(self) -> dict:
+        return {'parts': self._part}
+
+    def close(self):
+        pass
+
+
+# -------------------------
+# Checkpoints
+# -------------------------
+def _load_checkpoint(path: str, source: str):
+    """
+    Checkpoint de `source` (`processed` y la posición de la salida) o None.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as fh:
+        ckpt = json.load(fh)
+    if ckpt.get('source') != os.path.abspath(source):
+        raise ValueError(f"Checkpoint {path} belongs to another source: {ckpt.get('source')}")
+    return ckpt if int(ckpt.get('processed', 0)) > 0 else None
+
+
+def _save_checkpoint(path: str, source: str, processed: int, sink_state: dict):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump({'source': os.path.abspath(source), 'processed': processed, **sink_state,
+                   'time': time.time()}, fh)
+    os.replace(tmp, path)
+
+
+# -------------------------
+# Bucle principal
+# -------------------------
+def run(source: str, output: str, fmt: str = None, batch_size: int = 1024, workers: int = None,
+        backend: str = None, mlp_path: str = MLP_PATH, cnn_path: str = CNN_PATH,
+        resume: bool = True, log=sys.stderr) -> dict:
+    """
+    Puntúa todas las imágenes de `source` y escribe los resultados en `output`.
+
+    Returns:
+        resumen con imágenes procesadas, errores, segundos e imágenes/s
+    """
+    fmt = fmt or ('parquet' if output.endswith('.parquet') else 'csv')
+    ckpt_path = output + '.ckpt.json'
+    ckpt = _load_checkpoint(ckpt_path, source) if resume else None
+    if ckpt is None and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)  # no debe emparejarse con la salida nueva
+    skip = int(ckpt['processed']) if ckpt else 0
+    sink = ParquetSink(output, resume=ckpt) if fmt == 'parquet' else CsvSink(output, resume=ckpt)
+
+    images = iter_images(source)
+    for _ in range(skip):
+        next(images, None)
+    if skip:
+        print(f"Reanudando tras {skip} imágenes ya puntuadas", file=log)
+
+    # El pool se crea antes de cargar TensorFlow para no hacer fork con TF inicializado
+    pool = Pool(processes=workers or os.cpu_count())
+    processed, errors = skip, 0
+    t0 = time.perf_counter()
+    try:
+        runtimes = load_runtimes(mlp_path, cnn_path, backend)
+        if not runtimes:
+            raise ValueError("No model found")
+
+        chunksize = max(1, batch_size // (4 * (workers or os.cpu_count() or 1)))
+        pending = pool.map_async(_preprocess_one, _take(images, batch_size), chunksize)
+        while True:
+            items = pending.get()
+            if not items:
+                break
+            # Preprocesar el siguiente lote mientras se evalúa este
+            pending = pool.map_async(_preprocess_one, _take(images, batch_size), chunksize)
+
+            ok = [i for i, (_, arr, _) in enumerate(items) if arr is not None]
+            rows = [{'filename': name, 'error': err} for name, _, err in items]
+            if ok:
+                scores = score_batch(runtimes, np.stack([items[i][1] for i in ok]))
+                for model_name, (preds, confs) in scores.items():
+                    for j, i in enumerate(ok):
+                        rows[i][f'pred_{model_name}'] = int(preds[j])
+                        rows[i][f'conf_{model_name}'] = float(confs[j])
+
+            sink.write(rows)
+            processed += len(items)
+            errors += len(items) - len(ok)
+            _save_checkpoint(ckpt_path, source, processed, sink.state())
+
+            elapsed = time.perf_counter() - t0
+            print(f"{processed} imágenes ({(processed - skip) / elapsed:.1f} img/s)", file=log)
+    finally:
+        pool.close()
+        pool.join()
+        sink.close()
+
+    elapsed = time.perf_counter() - t0
+    summary = {
+        'processed': processed,
+        'new': processed - skip,
+        'errors': errors,
+        'seconds': elapsed,
+        'images_per_sec': (processed - skip) / elapsed if elapsed else 0.0,
+    }
+    print(json.dumps(summary), file=log)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Puntuación masiva offline con los modelos MLP/CNN")
+    parser.add_argument('source', help="directorio, .zip o .tar(.gz) con imágenes")
+    parser.add_argument('-o', '--output', required=True, help="fichero .csv o directorio .parquet de salida")
+    parser.add_argument('--format', choices=('csv', 'parquet'), help="por defecto según la extensión de salida")
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=None, help="procesos de preprocesado")
+    parser.add_argument('--backend', choices=('function', 'tflite', 'keras', 'numpy'), default=None)
+    parser.add_argument('--mlp-path', default=MLP_PATH)
+    parser.add_argument('--cnn-path', default=CNN_PATH)
+    parser.add_argument('--no-resume', action='store_true', help="ignorar el checkpoint y empezar de cero")
+    args = parser.parse_args(argv)
+
+    run(args.source, args.output, fmt=args.format, batch_size=args.batch_size, workers=args.workers,
+        backend=args.backend, mlp_path=args.mlp_path, cnn_path=args.cnn_path, resume=not args.no_resume)
+
+
+if __name__ == '__main__':
+    main()
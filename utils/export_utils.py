@@ -1,6 +1,181 @@
 # utils/export_utils.py
 import csv
 import io
+import json
+import zlib
+
+# Filas por bloque emitido en las exportaciones en streaming
+CHUNK_ROWS = 500
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def collect_fieldnames(records) -> list:
+    """
+    Recorre los registros una vez y devuelve la unión de sus claves en orden
+    de aparición (los registros de lote usan `filename` en vez de `id`/`user`).
+    """
+    fields = {}
+    for record in records:
+        for key in record:
+            fields.setdefault(key, None)
+    return list(fields)
+
+
+def iter_csv(records_factory, fieldnames=None, chunk_rows: int = CHUNK_ROWS):
+    """
+    Genera el CSV en bloques de bytes.
+
+    Args:
+        records_factory: función sin argumentos que devuelve un iterador nuevo
+            de registros (se recorre dos veces si no se dan `fieldnames`)
+        fieldnames: cabeceras; por defecto la unión de claves de todos los registros
+        chunk_rows: filas por bloque emitido
+    """
+    if fieldnames is None:
+        fieldnames = collect_fieldnames(records_factory())
+    if not fieldnames:
+        return
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    rows = 0
+    for record in records_factory():
+        writer.writerow(record)
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def iter_ndjson(records, chunk_rows: int = CHUNK_ROWS):
+    """
+    Genera NDJSON (un objeto JSON por línea) en bloques de bytes.
+    """
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _arrow_schema(records):
+    import pyarrow as pa
+
+    kinds = {}
+    for record in records:
+        for key, value in record.items():
+            if value is None:
+                kinds.setdefault(key, set())
+            elif isinstance(value, bool):
+                kinds.setdefault(key, set()).add('bool')
+            elif isinstance(value, int):
+                kinds.setdefault(key, set()).add('int')
+            elif isinstance(value, float):
+                kinds.setdefault(key, set()).add('float')
+            else:
+                kinds.setdefault(key, set()).add('str')
+
+    fields = []
+    for key, seen in kinds.items():
+        if seen == {'int'}:
+            typ = pa.int64()
+        elif seen and seen <= {'int', 'float'}:
+            typ = pa.float64()
+        elif seen == {'bool'}:
+            typ = pa.bool_()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(key, typ))
+    return pa.schema(fields)
+
+
+def iter_parquet(records_factory, chunk_rows: int = 10000):
+    """
+    Genera un fichero Parquet en bloques de bytes (un row group por bloque).
+    Requiere `pyarrow`.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(records_factory())
+    if not schema:
+        return
+
+    names = schema.names
+    sink = io.BytesIO()
+
+    def _drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    def _table(rows):
+        columns = {name: [] for name in names}
+        for row in rows:
+            for name in names:
+                value = row.get(name)
+                if value is not None and schema.field(name).type == pa.string() and not isinstance(value, str):
+                    value = str(value)
+                columns[name].append(value)
+        return pa.table(columns, schema=schema)
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        rows = []
+        for record in records_factory():
+            rows.append(record)
+            if len(rows) >= chunk_rows:
+                writer.write_table(_table(rows))
+                rows = []
+                yield _drain()
+        if rows:
+            writer.write_table(_table(rows))
+    yield _drain()
+
+
+def gzip_stream(chunks, level: int = 6):
+    """
+    Comprime un iterador de bloques de bytes en formato gzip sobre la marcha.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(records_factory, fmt: str = 'csv', gzip: bool = False):
+    """
+    Punto de entrada único para las exportaciones en streaming.
+
+    Args:
+        records_factory: función que devuelve un iterador nuevo de registros
+        fmt: 'csv', 'ndjson' o 'parquet'
+        gzip: comprimir la salida
+    """
+    if fmt == 'csv':
+        chunks = iter_csv(records_factory)
+    elif fmt == 'ndjson':
+        chunks = iter_ndjson(records_factory())
+    elif fmt == 'parquet':
+        chunks = iter_parquet(records_factory)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return gzip_stream(chunks) if gzip else chunks
+
 
 def export_predictions_to_csv(predictions: list) -> bytes:
     """
@@ -8,16 +183,4 @@ def export_predictions_to_csv(predictions: list) -> bytes:
     """
     if not predictions:
         return b''
-
-    # Crear buffer en memoria
-    output = io.StringIO()
-    
-    # Obtener cabeceras del primer diccionario
-    fieldnames = list(predictions[0].keys())
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    
-    writer.writeheader()
-    for pred in predictions:
-        writer.writerow(pred)
-
-    return output.getvalue().encode('utf-8')
+    return b''.join(iter_csv(lambda: iter(predictions)))
@@ -0,0 +1,265 @@
+# utils/feedback_store.py
+import mmap
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl  # Bloqueo entre procesos (no disponible en Windows)
+except ImportError:
+    fcntl = None
+
+IMAGE_SHAPE = (28, 28)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    idx     INTEGER PRIMARY KEY,
+    label   INTEGER NOT NULL,
+    user    TEXT,
+    time    TEXT,
+    pred_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_samples_user ON samples (user);
+CREATE INDEX IF NOT EXISTS idx_samples_pred ON samples (pred_id);
+"""
+
+
+class FeedbackDataset:
+    """
+    Dataset persistente de feedback etiquetado para reentrenar.
+
+    Las imágenes (uint8 28x28) y etiquetas (uint8) viven en dos ficheros
+    mapeados en memoria (`mmap`, vistos como arrays NumPy) prerreservados
+    que crecen duplicando su capacidad. Un índice
+    SQLite guarda los metadatos de cada muestra (usuario, hora y id de la
+    predicción de origen) y es la fuente de verdad del número de muestras.
+
+    Varios procesos (p. ej. los workers de gunicorn) pueden compartir el
+    directorio: cada `append` toma un `flock` sobre `feedback.lock`, calcula
+    el índice como `MAX(idx)+1` en `meta.db`, vuelve a mapear los ficheros
+    si otro proceso los ha hecho crecer y solo entonces escribe. Las
+    lecturas toman el tamaño de la base de datos, no de un contador local.
+
+    Args:
+        root_dir: directorio donde se guardan `images.u8`, `labels.u8` y `meta.db`
+        initial_capacity: número de muestras reservadas al crear los ficheros
+    """
+
+    def __init__(self, root_dir: str, initial_capacity: int = 1024):
+        os.makedirs(root_dir, exist_ok=True)
+        self.root_dir = root_dir
+        self.images_path = os.path.join(root_dir, 'images.u8')
+        self.labels_path = os.path.join(root_dir, 'labels.u8')
+        self.lock_path = os.path.join(root_dir, 'feedback.lock')
+        self._lock = threading.RLock()
+
+        self._meta = sqlite3.connect(os.path.join(root_dir, 'meta.db'), check_same_thread=False, timeout=30)
+        self._meta.execute("PRAGMA journal_mode=WAL")
+        self._meta.executescript(_SCHEMA)
+        self._meta.commit()
+
+        with self._file_lock():
+            capacity = max(int(initial_capacity), self._db_size(), 1)
+            if os.path.exists(self.labels_path):
+                capacity = max(capacity, os.path.getsize(self.labels_path))
+            self._open(capacity)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as fh:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _db_size(self) -> int:
+        with self._lock:
+            return self._meta.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM samples").fetchone()[0]
+
+    # -------------------------
+    # Ficheros mapeados
+    # -------------------------
+    def _open(self, capacity: int):
+        for path, item_bytes in ((self.images_path, IMAGE_SHAPE[0] * IMAGE_SHAPE[1]), (self.labels_path, 1)):
+            size = capacity * item_bytes
+            with open(path, 'ab') as fh:
+                if fh.tell() < size:
+                    fh.truncate(size)
+        # mmap propio (no np.memmap) para poder sincronizar solo un rango
+        self._images_mm, self._images = self._map(self.images_path, (capacity, *IMAGE_SHAPE))
+        self._labels_mm, self._labels = self._map(self.labels_path, (capacity,))
+        self.capacity = capacity
+
+    @staticmethod
+    def _map(path: str, shape):
+        size = int(np.prod(shape, dtype=np.int64))
+        with open(path, 'r+b') as fh:
+            mm = mmap.mmap(fh.fileno(), size)
+        return mm, np.ndarray(shape, dtype=np.uint8, buffer=mm)
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self._images_mm.flush()
+        self._labels_mm.flush()
+        self._open(capacity)
+
+    def _ensure_mapped(self, needed: int):
+        """
+        Vuelve a mapear si otro proceso ya hizo crecer los ficheros.
+        """
+        if needed > self.capacity and os.path.exists(self.labels_path):
+            on_disk = os.path.getsize(self.labels_path)
+            if on_disk > self.capacity:
+                self._open(on_disk)
+
+    @staticmethod
+    def _flush_rows(mm: mmap.mmap, row_bytes: int, start: int, stop: int):
+        # Solo las páginas de las filas escritas, no todo el fichero
+        begin = start * row_bytes
+        aligned = begin - begin % mmap.ALLOCATIONGRANULARITY
+        mm.flush(aligned, stop * row_bytes - aligned)
+
+    # -------------------------
+    # Escritura
+    # -------------------------
+    def append(self, image, label: int, user: str = None, pred_id: str = None, time: str = None) -> int:
+        """
+        Añade una muestra. `image` puede ser uint8 en [0,255] o float en [0,1]
+        (28x28 o 784 valores). Devuelve su índice.
+        """
+        image = np.asarray(image)
+        if image.dtype != np.uint8:
+            image = np.clip(np.rint(image.astype(np.float32) * 255.0), 0, 255).astype(np.uint8)
+        image = image.reshape(IMAGE_SHAPE)
+
+        with self._file_lock():
+            idx = self._db_size()
+            self._ensure_mapped(idx + 1)
+            if idx >= self.capacity:
+                self._grow(idx + 1)
+            self._images[idx] = image
+            self._labels[idx] = int(label)
+            self._flush_rows(self._images_mm, IMAGE_SHAPE[0] * IMAGE_SHAPE[1], idx, idx + 1)
+            self._flush_rows(self._labels_mm, 1, idx, idx + 1)
+            with self._meta:
+                self._meta.execute(
+                    "INSERT INTO samples (idx, label, user, time, pred_id) VALUES (?, ?, ?, ?, ?)",
+                    (idx, int(label), user, time or datetime.utcnow().isoformat(), pred_id),
+                )
+        return idx
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+    def __len__(self):
+        return self._db_size()
+
+    def _current_size(self) -> int:
+        # Muestras confirmadas en meta.db, también las de otros procesos
+        with self._lock:
+            n = self._db_size()
+            self._ensure_mapped(n)
+            return min(n, self.capacity)
+
+    @property
+    def images(self) -> np.ndarray:
+        """Vista (sin copia) de las imágenes uint8 `(N,28,28)`."""
+        with self._lock:
+            n = self._current_size()
+            return self._images[:n]
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Vista (sin copia) de las etiquetas uint8 `(N,)`."""
+        with self._lock:
+            n = self._current_size()
+            return self._labels[:n]
+
+    def metadata(self, idx: int):
+        with self._lock:
+            row = self._meta.execute(
+                "SELECT idx, label, user, time, pred_id FROM samples WHERE idx = ?", (int(idx),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('idx', 'label', 'user', 'time', 'pred_id'), row))
+
+    def iter_metadata(self, start: int = 0):
+        """
+        Metadatos de las muestras con índice >= `start`, en orden de índice.
+        """
+        with self._lock:
+            rows = self._meta.execute(
+                "SELECT idx, label, user, time, pred_id FROM samples WHERE idx >= ? ORDER BY idx", (start,)
+            ).fetchall()
+        for row in rows:
+            yield dict(zip(('idx', 'label', 'user', 'time', 'pred_id'), row))
+
+    def iter_batches(self, batch_size: int = 256, shuffle: bool = False, seed: int = None,
+                     normalize: bool = True, flatten: bool = True, one_hot: bool = False,
+                     num_classes: int = 10):
+        """
+        Itera `(x, y)` por lotes leyendo del memmap bajo demanda.
+
+        Sin `shuffle` ni `normalize` los lotes son vistas del memmap (cero
+        copias). Con `shuffle` cada lote es un bloque contiguo elegido en orden
+        aleatorio, mezclado después en memoria, para leer el disco secuencialmente.
+        """
+        n = self._current_size()
+        images, labels = self._images, self._labels
+        starts = np.arange(0, n, batch_size)
+        if shuffle:
+            rng = np.random.default_rng(seed)
+            rng.shuffle(starts)
+        else:
+            rng = None
+
+        for start in starts:
+            end = min(start + batch_size, n)
+            x = images[start:end]
+            y = labels[start:end]
+            if rng is not None:
+                perm = rng.permutation(len(x))
+                x, y = x[perm], y[perm]
+            if flatten:
+                x = x.reshape(len(x), -1)
+            if normalize:
+                x = x.astype(np.float32) / 255.0
+            if one_hot:
+                y = np.eye(num_classes, dtype=np.float32)[y]
+            yield x, y
+
+    def as_tf_dataset(self, batch_size: int = 256, shuffle: bool = True, seed: int = None,
+                      flatten: bool = True, num_classes: int = 10):
+        """
+        `tf.data.Dataset` de lotes `(x float32, y one-hot)` listo para
+        `training_utils.incremental_train(model, dataset, None)`.
+        """
+        import tensorflow as tf
+
+        x_shape = (None, IMAGE_SHAPE[0] * IMAGE_SHAPE[1]) if flatten else (None, *IMAGE_SHAPE)
+        return tf.data.Dataset.from_generator(
+            lambda: self.iter_batches(batch_size, shuffle=shuffle, seed=seed, flatten=flatten,
+                                      one_hot=True, num_classes=num_classes),
+            output_signature=(
+                tf.TensorSpec(x_shape, tf.float32),
+                tf.TensorSpec((None, num_classes), tf.float32),
+            ),
+        ).prefetch(tf.data.AUTOTUNE)
+
+    def close(self):
+        with self._lock:
+            self._images_mm.flush()
+            self._labels_mm.flush()
+            self._meta.close()
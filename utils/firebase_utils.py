@@ -1,33 +1,368 @@
 # utils/firebase_utils.py
-import firebase_admin
-from firebase_admin import credentials, firestore
+import json
 import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 
-# Inicializar Firebase si no está ya inicializado
-if not firebase_admin._apps:
-    cred_path = os.path.join('firebase', 'serviceAccountKey.json')
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
+from utils.instrumentation import Histogram
 
-db = firestore.client()
+try:
+    import fcntl  # Bloqueo entre procesos (no disponible en Windows)
+except ImportError:
+    fcntl = None
 
+CRED_PATH = os.path.join('firebase', 'serviceAccountKey.json')
+SPOOL_PATH = os.path.join('app', 'firebase_spool.jsonl')
+MAX_BATCH_OPS = 500  # límite de operaciones de un WriteBatch de Firestore
+
+_client = None
+_client_lock = threading.Lock()
+
+# -------------------------
+# Cliente (perezoso)
+# -------------------------
+def _create_client():
+    """
+    Crea el cliente según el entorno:
+    - FIREBASE_BACKEND=memory: cliente en memoria (`utils.firestore_fake`)
+    - FIRESTORE_EMULATOR_HOST: emulador local, sin credenciales
+    - por defecto: firebase_admin con `firebase/serviceAccountKey.json`
+    """
+    if os.environ.get('FIREBASE_BACKEND') == 'memory':
+        from utils.firestore_fake import InMemoryFirestore
+        return InMemoryFirestore()
+
+    if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud import firestore as gcloud_firestore
+        project = os.environ.get('GCLOUD_PROJECT', 'demo-deep-learning')
+        return gcloud_firestore.Client(project=project, credentials=AnonymousCredentials())
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(CRED_PATH))
+    return firestore.client()
+
+def get_client():
+    """
+    Devuelve el cliente Firestore, creándolo en la primera llamada.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def set_client(client):
+    """
+    Sustituye el cliente (p. ej. por `InMemoryFirestore` en pruebas).
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def _prediction_doc(client, user_id: str, doc_id: str):
+    return client.collection('users').document(user_id).collection('predictions').document(doc_id)
+
+
+# -------------------------
+# Sincronización en segundo plano
+# -------------------------
+class FirestoreSync:
+    """
+    Cola de escritura asíncrona hacia Firestore.
+
+    `enqueue` no bloquea: el registro se encola y un hilo lo envía junto con
+    otros en un `WriteBatch` (hasta `batch_size` operaciones, máximo 500)
+    cuando el lote se llena o pasan `flush_interval_s`. Cada documento usa el
+    `id` de la predicción, así que reintentar un lote es idempotente.
+
+    Si un lote falla se reintenta con backoff exponencial (con jitter). Si
+    sigue fallando, los registros se guardan en `spool_path` (JSON Lines) y
+    se reenvían más tarde, también tras reiniciar el proceso.
+
+    El spool es común a todos los workers: cada acceso (añadir, reenviar,
+    contar) se hace con `flock` sobre `<spool>.lock`, así que un reenvío
+    nunca borra registros que otro proceso añadió mientras tanto.
+
+    Args:
+        client_factory: función que devuelve el cliente Firestore
+        batch_size: operaciones por WriteBatch
+        flush_interval_s: espera máxima antes de enviar un lote incompleto
+        spool_path: fichero donde se guarda la cola si no hay conexión
+        max_retries: reintentos de un lote antes de mandarlo al spool
+        backoff_base_s / backoff_max_s: espera inicial y máxima entre reintentos
+    """
+
+    COMMIT_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, client_factory=get_client, batch_size: int = MAX_BATCH_OPS, flush_interval_s: float = 2.0,
+                 spool_path: str = SPOOL_PATH, max_retries: int = 3, backoff_base_s: float = 0.5,
+                 backoff_max_s: float = 30.0):
+        self.client_factory = client_factory
+        self.batch_size = max(1, min(int(batch_size), MAX_BATCH_OPS))
+        self.flush_interval_s = flush_interval_s
+        self.spool_path = spool_path
+        self.lock_path = spool_path + '.lock'
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+
+        self._queue = queue.Queue()
+        self._spool_lock = threading.RLock()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._stopping = False
+        self._retry_spool_at = 0.0
+
+        self.committed = 0
+        self.batches = 0
+        self.failures = 0
+        self.spooled = 0
+        self.last_error = None
+        self.commit_ms = Histogram(self.COMMIT_BUCKETS_MS)
+
+        self._thread = threading.Thread(target=self._run, name="firestore-sync", daemon=True)
+        self._thread.start()
+
+    # -------------------------
+    # API pública
+    # -------------------------
+    def enqueue(self, user_id: str, record: dict) -> str:
+        """
+        Encola un registro para `users/<user_id>/predictions/<id>` y devuelve el id.
+        """
+        if self._stopping:
+            raise RuntimeError("La sincronización con Firestore se está deteniendo")
+        doc_id = str(record.get('id') or uuid.uuid4())
+        with self._idle:
+            self._in_flight += 1
+        self._queue.put((str(user_id), doc_id, dict(record)))
+        return doc_id
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def spool_size(self) -> int:
+        with self._file_lock():
+            if not os.path.exists(self.spool_path):
+                return 0
+            with open(self.spool_path, 'r', encoding='utf-8') as fh:
+                return sum(1 for line in fh if line.strip())
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Espera a que todo lo encolado se haya enviado (o guardado en el spool).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth(),
+            'spooled_pending': self.spool_size(),
+            'committed': self.committed,
+            'batches': self.batches,
+            'failures': self.failures,
+            'spooled_total': self.spooled,
+            'last_error': self.last_error,
+            'commit_ms': self.commit_ms.snapshot(),
+        }
+
+    def shutdown(self, timeout: float = 10.0):
+        """
+        Envía lo pendiente (o lo pasa al spool) y detiene el hilo.
+        """
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # -------------------------
+    # Hilo de fondo
+    # -------------------------
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                self._drain_spool()
+                continue
+            if first is None:
+                self._drain_spool()
+                return
+            batch = self._collect(first)
+            if not self._commit_with_retry(batch, retries=0 if self._stopping else self.max_retries):
+                self._spool(batch)
+            else:
+                self._drain_spool()
+            self._done(len(batch))
+
+    def _done(self, n: int):
+        with self._idle:
+            self._in_flight -= n
+            self._idle.notify_all()
+
+    def _commit(self, items):
+        client = self.client_factory()
+        write_batch = client.batch()
+        for user_id, doc_id, record in items:
+            write_batch.set(_prediction_doc(client, user_id, doc_id), record)
+        t0 = time.perf_counter()
+        write_batch.commit()
+        self.commit_ms.observe((time.perf_counter() - t0) * 1000.0)
+        self.committed += len(items)
+        self.batches += 1
+
+    def _commit_with_retry(self, items, retries: int) -> bool:
+        delay = self.backoff_base_s
+        for attempt in range(retries + 1):
+            try:
+                self._commit(items)
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Error enviando lote a Firestore (intento {attempt + 1}): {e}")
+                if attempt < retries and not self._stopping:
+                    time.sleep(min(delay, self.backoff_max_s) * (0.5 + random.random()))
+                    delay *= 2
+        return False
+
+    # -------------------------
+    # Spool en disco (sin conexión)
+    # -------------------------
+    @contextmanager
+    def _file_lock(self):
+        with self._spool_lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.lock_path, 'a') as fh:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _spool(self, items):
+        directory = os.path.dirname(self.spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._file_lock():
+            with open(self.spool_path, 'a', encoding='utf-8') as fh:
+                for user_id, doc_id, record in items:
+                    fh.write(json.dumps({'user': user_id, 'id': doc_id, 'record': record}) + '\n')
+                fh.flush()
+                os.fsync(fh.fileno())
+        self.spooled += len(items)
+        self._retry_spool_at = time.monotonic() + self.backoff_max_s
+
+    def _drain_spool(self):
+        """
+        Reenvía el spool en lotes; lo que no se pueda enviar se queda en disco.
+        Mantiene el `flock` hasta reescribir el fichero (un intento por lote),
+        de modo que otro worker no puede añadir registros entre la lectura y
+        la sustitución.
+        """
+        if time.monotonic() < self._retry_spool_at and not self._stopping:
+            return
+        with self._file_lock():
+            if not os.path.exists(self.spool_path):
+                return
+            with open(self.spool_path, 'r', encoding='utf-8') as fh:
+                items = [json.loads(line) for line in fh if line.strip()]
+            items = [(it['user'], it['id'], it['record']) for it in items]
+
+            sent = 0
+            for start in range(0, len(items), self.batch_size):
+                chunk = items[start:start + self.batch_size]
+                if not self._commit_with_retry(chunk, retries=0):
+                    break
+                sent += len(chunk)
+
+            remaining = items[sent:]
+            if remaining:
+                tmp = f"{self.spool_path}.{os.getpid()}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as fh:
+                    for user_id, doc_id, record in remaining:
+                        fh.write(json.dumps({'user': user_id, 'id': doc_id, 'record': record}) + '\n')
+                os.replace(tmp, self.spool_path)
+                self._retry_spool_at = time.monotonic() + self.backoff_max_s
+            else:
+                os.remove(self.spool_path)
+
+
+_sync = None
+
+def get_sync() -> FirestoreSync:
+    """
+    Instancia compartida de `FirestoreSync`, configurable por entorno
+    (FIREBASE_SYNC_BATCH_SIZE, FIREBASE_SYNC_INTERVAL_S, FIREBASE_SPOOL).
+    """
+    global _sync
+    if _sync is None:
+        with _client_lock:
+            if _sync is None:
+                _sync = FirestoreSync(
+                    batch_size=int(os.environ.get('FIREBASE_SYNC_BATCH_SIZE', MAX_BATCH_OPS)),
+                    flush_interval_s=float(os.environ.get('FIREBASE_SYNC_INTERVAL_S', 2)),
+                    spool_path=os.environ.get('FIREBASE_SPOOL', SPOOL_PATH),
+                )
+    return _sync
+
+
+# -------------------------
+# API
+# -------------------------
 def save_prediction_to_firebase(user_id: str, record: dict):
     """
-    Guarda una predicción en Firestore bajo el usuario especificado.
+    Encola una predicción para guardarla en Firestore bajo el usuario
+    especificado. No bloquea: el envío se hace por lotes en segundo plano.
     """
-    user_ref = db.collection('users').document(user_id)
-    predictions_ref = user_ref.collection('predictions')
-    predictions_ref.add(record)
+    return get_sync().enqueue(user_id, record)
 
 def get_user_predictions(user_id: str, limit: int = 50):
     """
-    Obtiene las últimas `limit` predicciones de un usuario.
+    Obtiene las últimas `limit` predicciones de un usuario (una sola consulta).
     """
-    user_ref = db.collection('users').document(user_id)
+    client = get_client()
     predictions_ref = (
-        user_ref.collection('predictions')
-        .order_by('time', direction=firestore.Query.DESCENDING)
+        client.collection('users').document(user_id).collection('predictions')
+        .order_by('time', direction='DESCENDING')
         .limit(limit)
     )
-    results = [doc.to_dict() for doc in predictions_ref.stream()]
-    return results
+    return [doc.to_dict() for doc in predictions_ref.get()]
@@ -0,0 +1,116 @@
+# utils/firestore_fake.py
+import copy
+import threading
+import uuid
+
+
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class _Query:
+    def __init__(self, collection, order=None, direction='ASCENDING', limit=None):
+        self._collection = collection
+        self._order = order
+        self._direction = direction
+        self._limit = limit
+
+    def order_by(self, field, direction='ASCENDING'):
+        return _Query(self._collection, field, direction, self._limit)
+
+    def limit(self, n):
+        return _Query(self._collection, self._order, self._direction, n)
+
+    def get(self):
+        with self._collection._db._lock:
+            docs = list(self._collection._docs().items())
+        if self._order:
+            docs.sort(key=lambda kv: kv[1].get(self._order) or '', reverse=self._direction == 'DESCENDING')
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return [_Snapshot(doc_id, data) for doc_id, data in docs]
+
+    def stream(self):
+        return iter(self.get())
+
+
+class _Document:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return _Collection(self._db, f"{self.path}/{name}")
+
+    def set(self, data):
+        with self._db._lock:
+            self._db._data.setdefault(self.path.rsplit('/', 1)[0], {})[self.id] = copy.deepcopy(data)
+
+    def get(self):
+        with self._db._lock:
+            data = self._db._data.get(self.path.rsplit('/', 1)[0], {}).get(self.id)
+        return _Snapshot(self.id, data) if data is not None else None
+
+
+class _Collection(_Query):
+    def __init__(self, db, path):
+        super().__init__(self)
+        self._db = db
+        self.path = path
+
+    def _docs(self):
+        return dict(self._db._data.get(self.path, {}))
+
+    def document(self, doc_id=None):
+        return _Document(self._db, f"{self.path}/{doc_id or uuid.uuid4().hex}")
+
+    def add(self, data):
+        doc = self.document()
+        doc.set(data)
+        return None, doc
+
+
+class _WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, doc, data):
+        self._ops.append((doc, data))
+
+    def commit(self):
+        self._db.commits += 1
+        if self._db.fail_commits > 0:
+            self._db.fail_commits -= 1
+            raise ConnectionError("Fallo simulado de Firestore")
+        if len(self._ops) > 500:
+            raise ValueError("Un WriteBatch admite como máximo 500 operaciones")
+        for doc, data in self._ops:
+            doc.set(data)
+
+
+class InMemoryFirestore:
+    """
+    Cliente Firestore en memoria con el subconjunto de la API que usa
+    `firebase_utils` (colecciones, documentos, WriteBatch y consultas
+    ordenadas). Sirve para desarrollo sin credenciales (FIREBASE_BACKEND=memory)
+    y para simular cortes de red con `fail_commits`.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.commits = 0
+        self.fail_commits = 0
+
+    def collection(self, name):
+        return _Collection(self, name)
+
+    def batch(self):
+        return _WriteBatch(self)
@@ -0,0 +1,146 @@
+# utils/inference_runtime.py
+import os
+import threading
+import numpy as np
+from utils.mlp_numpy import MLP
+
+BACKENDS = ('keras', 'function', 'tflite', 'numpy')
+DEFAULT_BACKEND = 'function'
+
+
+class InferenceRuntime:
+    """
+    Envoltorio ligero de inferencia para un modelo Keras ya cargado.
+
+    Backends disponibles:
+    - 'keras': `model.predict` (camino original, con su pipeline tf.data por llamada)
+    - 'function': `tf.function` con firma de entrada fija `[None, *input_shape]`,
+      que llama directamente a `model(x, training=False)`
+    - 'tflite': intérprete TFLite convertido desde el modelo Keras
+    - 'numpy': motor vectorizado de utils/mlp_numpy (solo MLP de capas Dense)
+
+    TensorFlow solo se importa al construir 'function' o 'tflite'; con
+    `engine` (un `utils.mlp_numpy.MLP` ya cargado) el backend 'numpy' no
+    necesita ni TensorFlow ni el modelo Keras.
+
+    Args:
+        model: modelo Keras (opcional si se pasa `engine`)
+        backend: uno de BACKENDS
+        name: nombre para logs
+        engine: motor NumPy ya construido
+    """
+
+    def __init__(self, model, backend: str = DEFAULT_BACKEND, name: str = None, engine=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend: {backend}")
+        if model is None and engine is None:
+            raise ValueError("A Keras model or a NumPy engine is required")
+        self.model = model
+        self.backend = backend
+        self.name = name or (model.name if model is not None else 'mlp')
+        self.input_shape = tuple(model.input_shape[1:]) if model is not None else (engine.input_dim,)
+        self._lock = threading.Lock()
+        self._fn = None
+        self._interpreter = None
+        self._engine = engine
+        self._build()
+
+    # -------------------------
+    # Construcción de backends
+    # -------------------------
+    def _build(self):
+        if self.backend in ('function', 'tflite'):
+            import tensorflow as tf
+
+        if self.backend == 'function':
+            spec = tf.TensorSpec([None, *self.input_shape], tf.float32)
+            model = self.model
+            self._fn = tf.function(lambda x: model(x, training=False), input_signature=[spec])
+        elif self.backend == 'tflite':
+            converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+            self._interpreter = tf.lite.Interpreter(model_content=converter.convert())
+            self._input = self._interpreter.get_input_details()[0]
+            self._output = self._interpreter.get_output_details()[0]
+            self._batch = None
+        elif self.backend == 'numpy' and self._engine is None:
+            self._engine = MLP.from_keras_model(self.model)
+
+    def refresh(self, weights=None):
+        """
+        Sincroniza el backend con los pesos actuales del modelo Keras (o con
+        la lista `weights` dada). Solo es necesario para 'tflite' y 'numpy'
+        (los otros leen las variables en vivo).
+        """
+        if self.backend == 'numpy':
+            self._engine.set_weights(weights if weights is not None else self.model.get_weights())
+        elif self.backend == 'tflite':
+            with self._lock:
+                self._build()
+
+    # -------------------------
+    # Inferencia
+    # -------------------------
+    def __call__(self, x) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32).reshape(-1, *self.input_shape)
+
+        if self.backend == 'keras':
+            return self.model.predict(x, verbose=0)
+
+        if self.backend == 'function':
+            return self._fn(x).numpy()
+
+        if self.backend == 'numpy':
+            return self._engine.predict(x)
+
+        # El intérprete TFLite no es reentrante
+        with self._lock:
+            if self._batch != len(x):
+                self._interpreter.resize_tensor_input(self._input['index'], x.shape)
+                self._interpreter.allocate_tensors()
+                self._batch = len(x)
+            self._interpreter.set_tensor(self._input['index'], x)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output['index']).copy()
+
+    def check_parity(self, sample=None, atol: float = 1e-4) -> float:
+        """
+        Compara la salida del backend con `model.predict` y lanza ValueError
+        si la diferencia absoluta máxima supera `atol`.
+
+        Returns:
+            diferencia absoluta máxima observada
+        """
+        if self.model is None:
+            raise ValueError("Parity check needs the Keras model")
+        if sample is None:
+            sample = np.random.default_rng(0).random((8, *self.input_shape), dtype=np.float32)
+        expected = self.model.predict(np.asarray(sample, dtype=np.float32), verbose=0)
+        diff = float(np.max(np.abs(self(sample) - expected)))
+        if diff > atol:
+            raise ValueError(
+                f"Paridad numérica fallida en '{self.name}' ({self.backend}): max|diff|={diff:.2e} > {atol:.0e}"
+            )
+        return diff
+
+
+def create_runtime(model, backend: str = None, check_parity: bool = None, name: str = None):
+    """
+    Crea el runtime de inferencia para un modelo. El backend se toma de la
+    variable de entorno INFERENCE_BACKEND si no se indica. Si el backend
+    elegido no se puede construir o no supera la comprobación de paridad,
+    se vuelve al camino 'keras'.
+    """
+    if model is None:
+        return None
+    backend = backend or os.environ.get('INFERENCE_BACKEND', DEFAULT_BACKEND)
+    if check_parity is None:
+        check_parity = os.environ.get('INFERENCE_PARITY_CHECK', '1') != '0'
+
+    try:
+        runtime = InferenceRuntime(model, backend=backend, name=name)
+        if check_parity and backend != 'keras':
+            runtime.check_parity()
+        return runtime
+    except Exception as e:
+        print(f"Runtime '{backend}' no disponible para {name or model.name}: {e}. Usando 'keras'.")
+        return InferenceRuntime(model, backend='keras', name=name)
@@ -0,0 +1,240 @@
+# utils/instrumentation.py
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (ms) de los histogramas de etapas
+STAGE_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    """
+    Histograma acumulativo sencillo con límites superiores fijos.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.total = 0.0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.total += value
+            self.n += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [str(b) for b in self.buckets] + ['+Inf']
+            return {
+                'buckets': dict(zip(labels, self.counts)),
+                'count': self.n,
+                'sum': self.total,
+                'mean': self.total / self.n if self.n else 0.0,
+            }
+
+
+# -------------------------
+# Registro de métricas
+# -------------------------
+class MetricsRegistry:
+    """
+    Registro de métricas para `/metrics` en formato de texto de Prometheus.
+
+    - Histogramas por etiqueta (`histogram_family(...).labels(valor)`), como
+      la duración de cada etapa de una predicción.
+    - Histogramas ya existentes en otros módulos (`register_histogram`).
+    - Gauges y contadores calculados al vuelo con una función
+      (`register_gauge`, `register_counter`); pueden devolver un número o un
+      diccionario `{valor_de_etiqueta: número}`.
+    """
+
+    def __init__(self, namespace: str = 'app'):
+        self.namespace = namespace
+        self._families = {}
+        self._histograms = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def histogram_family(self, name: str, help_text: str, label: str, buckets=STAGE_BUCKETS_MS):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = _HistogramFamily(name, help_text, label, buckets)
+            return family
+
+    def register_histogram(self, name: str, help_text: str, histogram: Histogram, labels: dict = None):
+        with self._lock:
+            self._histograms.append((name, help_text, labels or {}, histogram))
+
+    def register_gauge(self, name: str, help_text: str, fn, label: str = None):
+        with self._lock:
+            self._callbacks.append((name, help_text, 'gauge', label, fn))
+
+    def register_counter(self, name: str, help_text: str, fn, label: str = None):
+        with self._lock:
+            self._callbacks.append((name, help_text, 'counter', label, fn))
+
+    # -------------------------
+    # Exposición
+    # -------------------------
+    def render(self) -> str:
+        """
+        Devuelve todas las métricas en formato de texto de Prometheus 0.0.4.
+        """
+        with self._lock:
+            families = list(self._families.values())
+            histograms = list(self._histograms)
+            callbacks = list(self._callbacks)
+
+        lines = []
+        for family in families:
+            full = f"{self.namespace}_{family.name}"
+            lines.append(f"# HELP {full} {family.help_text}")
+            lines.append(f"# TYPE {full} histogram")
+            for value, hist in family.items():
+                lines.extend(_histogram_lines(full, {family.label: value}, hist))
+
+        seen = set()
+        for name, help_text, labels, hist in histograms:
+            full = f"{self.namespace}_{name}"
+            if full not in seen:
+                seen.add(full)
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} histogram")
+            lines.extend(_histogram_lines(full, labels, hist))
+
+        for name, help_text, kind, label, fn in callbacks:
+            full = f"{self.namespace}_{name}"
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"Error calculando la métrica {full}: {e}")
+                continue
+            if value is None:
+                continue
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            if isinstance(value, dict):
+                for label_value, v in value.items():
+                    lines.append(f"{full}{_labels({label: label_value})} {_number(v)}")
+            else:
+                lines.append(f"{full} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class _HistogramFamily:
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        hist = self._children.get(value)
+        if hist is None:
+            with self._lock:
+                hist = self._children.setdefault(value, Histogram(self.buckets))
+        return hist
+
+    def items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _histogram_lines(name: str, labels: dict, hist: Histogram) -> list:
+    snap = hist.snapshot()
+    lines = []
+    cumulative = 0
+    # Prometheus espera buckets acumulados (`le` = menor o igual)
+    for le, count in snap['buckets'].items():
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labels)} {_number(snap['sum'])}")
+    lines.append(f"{name}_count{_labels(labels)} {snap['count']}")
+    return lines
+
+
+# Registro global del proceso
+REGISTRY = MetricsRegistry()
+STAGES = REGISTRY.histogram_family('stage_duration_ms', 'Duración de cada etapa en milisegundos', 'stage')
+
+# -------------------------
+# Cronómetros de etapa y Server-Timing
+# -------------------------
+_request = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mide un bloque y lo registra en el histograma de la etapa `name`. Si el
+    hilo está atendiendo una petición con Server-Timing activo, también se
+    anota para la cabecera.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        STAGES.labels(name).observe(elapsed_ms)
+        timings = getattr(_request, 'timings', None)
+        if timings is not None:
+            timings.append((name, elapsed_ms))
+
+
+def timed(name: str):
+    """
+    Decorador equivalente a envolver la función en `stage(name)`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_request_timing():
+    """Empieza a anotar las etapas del hilo actual para Server-Timing."""
+    _request.timings = []
+
+
+def end_request_timing() -> list:
+    """Devuelve `[(etapa, ms), ...]` de la petición actual y deja de anotar."""
+    timings = getattr(_request, 'timings', None)
+    _request.timings = None
+    return timings or []
+
+
+def server_timing_header(timings) -> str:
+    """
+    Formatea la cabecera `Server-Timing` (etapas repetidas se suman).
+    """
+    totals = {}
+    for name, ms in timings:
+        totals[name] = totals.get(name, 0.0) + ms
+    return ', '.join(f"{name.replace(' ', '_')};dur={ms:.2f}" for name, ms in totals.items())
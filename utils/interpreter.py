@@ -1,75 +1,596 @@
-# app/app.py
-from flask import Flask, render_template, request, jsonify
+# utils/interpreter.py
+"""
+Compilador de arquitecturas escritas como texto, p. ej.:
+
+    "Dense(128, relu) -> Dense(64, relu) -> Dense(10, softmax)"
+    "Conv(32, 3, relu) -> MaxPool(2) -> Conv(64, 3x3, relu, same) -> Pool(2) -> Dense(10, softmax)"
+
+Capas:
+- Dense(unidades[, activación])
+- Conv(filtros, kernel[, activación][, valid|same])   (alias Conv2D; kernel `3` o `3x3`)
+- MaxPool(tamaño) / AvgPool(tamaño)                  (alias Pool, MaxPool2D, AvgPool2D)
+- Flatten, Dropout(tasa)
+
+Activaciones: las del motor NumPy (relu, sigmoid, softmax, linear), para que
+los dos backends calculen lo mismo. Antes de la primera Dense tras capas
+espaciales se añade un Flatten; si la entrada es un entero (784) y la red
+empieza por Conv/Pool, se interpreta como imagen cuadrada de un canal.
+
+La misma arquitectura se construye como modelo Keras (`compile_model`) o
+con el motor NumPy (`build_numpy_model`). Los pesos entrenados se guardan en
+`models/cache/<hash>.npz` (MODEL_CACHE_DIR), con un hash de arquitectura,
+entrada, hiperparámetros y dataset, así que un reinicio o una arquitectura
+repetida se cargan sin volver a entrenar (`get_trained_model`).
+
+Importar este módulo no importa TensorFlow ni entrena nada.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
 import numpy as np
-from tensorflow.keras.datasets import mnist
-from tensorflow.keras.utils import to_categorical
-from utils.interpreter import compile_model
-
-app = Flask(__name__)
-
-# ------------------------------
-# 1️⃣ Crear y compilar modelo Keras
-# ------------------------------
-architecture = "Dense(128, relu) -> Dense(64, relu) -> Dense(10, softmax)"
-input_dim = 28*28
-model = compile_model(architecture, input_dim)
-
-# Cargar MNIST y entrenar rápido para demo
-(x_train, y_train), (x_test, y_test) = mnist.load_data()
-x_train = x_train.reshape(-1, 28*28) / 255.0
-y_train = to_categorical(y_train, 10)
-x_test = x_test.reshape(-1, 28*28) / 255.0
-y_test = to_categorical(y_test, 10)
-
-model.fit(x_train, y_train, epochs=3, batch_size=32, validation_data=(x_test, y_test))
-
-# ------------------------------
-# 2️⃣ Rutas HTML
-# ------------------------------
-@app.route("/")
-def index():
-    return render_template("index.html")
-
-@app.route("/login")
-def login():
-    return render_template("login.html")
-
-@app.route("/register")
-def register():
-    return render_template("register.html")
-
-# ------------------------------
-# 3️⃣ Endpoint predicción canvas/subida
-# ------------------------------
-@app.route("/predict", methods=["POST"])
-def predict():
-    """
-    Recibe JSON con un array de 784 píxeles (0-255)
-    """
-    data = request.json
-    pixels = np.array(data["pixels"]).reshape(1, 784) / 255.0
-    pred = model.predict(pixels)
-    predicted_class = int(np.argmax(pred, axis=1)[0])
-    return jsonify({"prediction": predicted_class})
-
-# ------------------------------
-# 4️⃣ Endpoint para batch (subida de imágenes)
-# ------------------------------
-@app.route("/predict_batch", methods=["POST"])
-def predict_batch():
-    """
-    Recibe JSON con varias imágenes
-    """
-    data = request.json
-    results = []
-    for img in data["images"]:
-        pixels = np.array(img).reshape(1, 784) / 255.0
-        pred = model.predict(pixels)
-        results.append(int(np.argmax(pred, axis=1)[0]))
-    return jsonify({"predictions": results})
-
-# ------------------------------
-# 5️⃣ Ejecutar Flask
-# ------------------------------
-if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0")
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.mlp_numpy import ACTIVATIONS, MLP, Layer
+
+CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', os.path.join('models', 'cache'))
+ARTIFACT_VERSION = 1
+DEFAULT_HYPERPARAMS = {
+    'epochs': 3,
+    'batch_size': 32,
+    'learning_rate': 1e-3,
+    'optimizer': 'adam',
+    'seed': 0,
+}
+
+LayerSpec = namedtuple('LayerSpec', ['kind', 'params'])
+
+_ALIASES = {
+    'dense': 'Dense',
+    'conv': 'Conv', 'conv2d': 'Conv',
+    'pool': 'MaxPool', 'maxpool': 'MaxPool', 'maxpool2d': 'MaxPool', 'maxpooling2d': 'MaxPool',
+    'avgpool': 'AvgPool', 'avgpool2d': 'AvgPool', 'averagepooling2d': 'AvgPool',
+    'flatten': 'Flatten',
+    'dropout': 'Dropout',
+}
+_SPATIAL = ('Conv', 'MaxPool', 'AvgPool')
+_LAYER_RE = re.compile(r'^\s*([A-Za-z0-9_]+)\s*(?:\((.*)\))?\s*$')
+
+# -------------------------
+# Análisis del texto
+# -------------------------
+def _activation(value: str, text: str) -> str:
+    if value not in ACTIVATIONS:
+        supported = ', '.join(a for a in ACTIVATIONS if a)
+        raise ValueError(f"Activación no soportada en '{text}': {value} (usa {supported})")
+    return value
+
+def _parse_layer(text: str) -> LayerSpec:
+    match = _LAYER_RE.match(text)
+    if not match:
+        raise ValueError(f"Capa no válida: '{text.strip()}'")
+    name, args = match.group(1), match.group(2)
+    kind = _ALIASES.get(name.lower())
+    if kind is None:
+        raise ValueError(f"Tipo de capa desconocido: '{name}'")
+    args = [a.strip() for a in args.split(',')] if args and args.strip() else []
+
+    try:
+        if kind == 'Dense':
+            if not 1 <= len(args) <= 2:
+                raise ValueError
+            activation = _activation(args[1].lower(), text) if len(args) > 1 else 'linear'
+            return LayerSpec(kind, (('units', int(args[0])), ('activation', activation)))
+
+        if kind == 'Conv':
+            if not 2 <= len(args) <= 4:
+                raise ValueError
+            size = [int(v) for v in args[1].lower().split('x')]
+            kernel = (size[0], size[-1])
+            activation, padding = 'linear', 'valid'
+            for extra in args[2:]:
+                extra = extra.lower()
+                if extra in ('valid', 'same'):
+                    padding = extra
+                else:
+                    activation = _activation(extra, text)
+            return LayerSpec(kind, (('filters', int(args[0])), ('kernel', kernel),
+                                    ('activation', activation), ('padding', padding)))
+
+        if kind in ('MaxPool', 'AvgPool'):
+            if len(args) > 1:
+                raise ValueError
+            return LayerSpec(kind, (('size', int(args[0]) if args else 2),))
+
+        if kind == 'Dropout':
+            if len(args) != 1:
+                raise ValueError
+            return LayerSpec(kind, (('rate', float(args[0])),))
+
+        if args:
+            raise ValueError
+        return LayerSpec(kind, ())
+    except (ValueError, IndexError) as e:
+        if str(e).startswith('Activación'):
+            raise
+        raise ValueError(f"Argumentos no válidos en '{text.strip()}'") from None
+
+def _resolve(architecture, input_dim):
+    """
+    Capas, forma de entrada y forma de trabajo (la que ve la primera capa).
+    """
+    specs = parse_architecture(architecture) if isinstance(architecture, str) else list(architecture)
+    shape = tuple(int(v) for v in input_dim) if isinstance(input_dim, (tuple, list)) else (int(input_dim),)
+    work_shape = shape
+    if specs[0].kind in _SPATIAL:
+        if len(shape) == 1:
+            side = int(round(shape[0] ** 0.5))
+            if side * side != shape[0]:
+                raise ValueError(f"input_dim={shape[0]} no es una imagen cuadrada; indica la forma (alto, ancho, canales)")
+            work_shape = (side, side, 1)
+        elif len(shape) == 2:
+            work_shape = shape + (1,)
+    elif len(shape) > 1 and specs[0].kind != 'Flatten':
+        specs.insert(0, LayerSpec('Flatten', ()))
+    return specs, shape, work_shape
+
+def parse_architecture(architecture: str) -> list:
+    """
+    Convierte el texto en una lista de `LayerSpec(kind, params)`, añadiendo
+    los Flatten implícitos.
+    """
+    parts = [p for p in architecture.split('->')]
+    if not architecture.strip() or any(not p.strip() for p in parts):
+        raise ValueError(f"Arquitectura vacía o mal formada: '{architecture}'")
+    specs, spatial = [], False
+    for part in parts:
+        spec = _parse_layer(part)
+        if spec.kind in _SPATIAL:
+            if specs and not spatial:
+                raise ValueError(f"'{part.strip()}' necesita una entrada espacial (no puede ir después de Dense/Flatten)")
+            spatial = True
+        elif spec.kind == 'Dense' and spatial:
+            specs.append(LayerSpec('Flatten', ()))
+            spatial = False
+        elif spec.kind == 'Flatten':
+            spatial = False
+        specs.append(spec)
+    if specs[-1].kind != 'Dense':
+        raise ValueError("La última capa debe ser Dense")
+    return specs
+
+def canonical(architecture) -> str:
+    """
+    Forma normalizada de la arquitectura (la misma para textos equivalentes).
+    """
+    specs = parse_architecture(architecture) if isinstance(architecture, str) else architecture
+    out = []
+    for spec in specs:
+        values = []
+        for _, v in spec.params:
+            values.append('x'.join(map(str, v)) if isinstance(v, tuple) else str(v))
+        out.append(f"{spec.kind}({', '.join(values)})" if values else spec.kind)
+    return ' -> '.join(out)
+
+# -------------------------
+# Backend Keras
+# -------------------------
+def _keras():
+    import tensorflow as tf
+    return tf.keras
+
+def build_keras_model(architecture, input_dim=784, name: str = None):
+    """
+    Construye (sin compilar) el modelo Keras Sequential de la arquitectura.
+    """
+    keras = _keras()
+    specs, shape, work_shape = _resolve(architecture, input_dim)
+    layers = [keras.Input(shape=shape)]
+    if work_shape != shape:
+        layers.append(keras.layers.Reshape(work_shape))
+    for spec in specs:
+        p = dict(spec.params)
+        if spec.kind == 'Dense':
+            layers.append(keras.layers.Dense(p['units'], activation=p['activation']))
+        elif spec.kind == 'Conv':
+            layers.append(keras.layers.Conv2D(p['filters'], p['kernel'], activation=p['activation'], padding=p['padding']))
+        elif spec.kind == 'MaxPool':
+            layers.append(keras.layers.MaxPooling2D(p['size']))
+        elif spec.kind == 'AvgPool':
+            layers.append(keras.layers.AveragePooling2D(p['size']))
+        elif spec.kind == 'Dropout':
+            layers.append(keras.layers.Dropout(p['rate']))
+        elif spec.kind == 'Flatten':
+            layers.append(keras.layers.Flatten())
+    return keras.Sequential(layers, name=name)
+
+def _optimizer(name: str, learning_rate: float = None):
+    keras = _keras()
+    optimizer = keras.optimizers.get(name)
+    if learning_rate is not None:
+        optimizer.learning_rate = learning_rate
+    return optimizer
+
+def compile_model(architecture: str, input_dim=784, optimizer: str = 'adam', learning_rate: float = None,
+                  loss: str = 'categorical_crossentropy'):
+    """
+    Construye y compila el modelo Keras de `architecture`.
+
+    Args:
+        architecture: texto de la arquitectura
+        input_dim: tamaño de la entrada (784) o forma (alto, ancho[, canales])
+        optimizer / learning_rate: optimizador de Keras y su tasa de aprendizaje
+        loss: pérdida ('categorical_crossentropy' para etiquetas one-hot)
+    """
+    model = build_keras_model(architecture, input_dim)
+    model.compile(optimizer=_optimizer(optimizer, learning_rate), loss=loss, metrics=['accuracy'])
+    return model
+
+# -------------------------
+# Backend NumPy
+# -------------------------
+class Conv2D:
+    """
+    Convolución 2D (stride 1, canales al final) con pesos en el formato de
+    Keras: kernel `(kh, kw, entrada, filtros)`. Se calcula como un único
+    producto matricial sobre las ventanas (im2col).
+    """
+
+    def __init__(self, filters, kernel, in_channels, activation='linear', padding='valid', dtype=np.float32):
+        kh, kw = kernel
+        self.kernel = np.zeros((kh, kw, in_channels, filters), dtype=dtype)
+        self.bias = np.zeros(filters, dtype=dtype)
+        self.padding = padding
+        self.activation = ACTIVATIONS[activation]
+
+    def output_shape(self, shape):
+        h, w, _ = shape
+        kh, kw = self.kernel.shape[:2]
+        if self.padding == 'same':
+            return (h, w, self.kernel.shape[3])
+        return (h - kh + 1, w - kw + 1, self.kernel.shape[3])
+
+    def forward(self, x):
+        kh, kw = self.kernel.shape[:2]
+        if self.padding == 'same':
+            ph, pw = kh - 1, kw - 1
+            x = np.pad(x, ((0, 0), (ph // 2, ph - ph // 2), (pw // 2, pw - pw // 2), (0, 0)))
+        windows = sliding_window_view(x, (kh, kw), axis=(1, 2))  # (N, H', W', C, kh, kw)
+        out = np.tensordot(windows, self.kernel, axes=([4, 5, 3], [0, 1, 2]))
+        out += self.bias
+        return self.activation(out, out=out)
+
+
+class Pool2D:
+    """
+    Pooling máximo o medio sin solape (como MaxPooling2D/AveragePooling2D de Keras).
+    """
+
+    def __init__(self, size, mode='max'):
+        self.size = size
+        self.mode = mode
+
+    def output_shape(self, shape):
+        h, w, c = shape
+        return (h // self.size, w // self.size, c)
+
+    def forward(self, x):
+        n, h, w, c = x.shape
+        s = self.size
+        blocks = x[:, :h // s * s, :w // s * s].reshape(n, h // s, s, w // s, s, c)
+        return blocks.max(axis=(2, 4)) if self.mode == 'max' else blocks.mean(axis=(2, 4))
+
+
+class NumpySequential:
+    """
+    Motor NumPy para arquitecturas con capas Conv/Pool. Como `mlp_numpy.MLP`,
+    expone `input_dim`, `predict` y `get_weights`/`set_weights` en el orden
+    de Keras, así que sirve como motor de `InferenceRuntime(backend='numpy')`.
+    """
+
+    def __init__(self, specs, input_shape, work_shape, dtype=np.float32):
+        self.dtype = dtype
+        self.input_shape = tuple(input_shape)
+        self.work_shape = tuple(work_shape)
+        self.layers = []
+        shape = self.work_shape
+        for spec in specs:
+            p = dict(spec.params)
+            if spec.kind == 'Conv':
+                layer = Conv2D(p['filters'], p['kernel'], shape[-1], p['activation'], p['padding'], dtype=dtype)
+            elif spec.kind in ('MaxPool', 'AvgPool'):
+                layer = Pool2D(p['size'], mode='max' if spec.kind == 'MaxPool' else 'avg')
+            elif spec.kind == 'Dense':
+                layer = Layer(shape[-1], p['units'], p['activation'], dtype=dtype)
+            else:
+                # Dropout es la identidad en inferencia
+                if spec.kind == 'Flatten':
+                    shape = (int(np.prod(shape)),)
+                    self.layers.append('flatten')
+                continue
+            shape = layer.output_shape(shape) if hasattr(layer, 'output_shape') else (layer.n_neurons,)
+            if min(shape) <= 0:
+                raise ValueError(f"La capa {canonical([spec])} deja una salida vacía {shape}")
+            self.layers.append(layer)
+
+    @property
+    def input_dim(self):
+        return int(np.prod(self.input_shape))
+
+    def _weighted(self):
+        return [l for l in self.layers if isinstance(l, (Conv2D, Layer))]
+
+    def get_weights(self):
+        weights = []
+        for layer in self._weighted():
+            weights.extend([layer.kernel, layer.bias] if isinstance(layer, Conv2D) else [layer.weights, layer.bias])
+        return weights
+
+    def set_weights(self, weights):
+        layers = self._weighted()
+        if len(weights) != 2 * len(layers):
+            raise ValueError(f"Expected {2 * len(layers)} arrays, got {len(weights)}")
+        for i, layer in enumerate(layers):
+            w, b = weights[2*i], weights[2*i + 1]
+            if isinstance(layer, Conv2D):
+                if np.shape(w) != layer.kernel.shape:
+                    raise ValueError(f"Invalid kernel shape: {np.shape(w)} != {layer.kernel.shape}")
+                layer.kernel = np.ascontiguousarray(w, dtype=self.dtype)
+                layer.bias = np.ascontiguousarray(b, dtype=self.dtype)
+            else:
+                layer.set_weights(w, b)
+
+    def count_params(self) -> int:
+        return int(sum(w.size for w in self.get_weights()))
+
+    def predict(self, X):
+        out = np.asarray(X, dtype=self.dtype).reshape(-1, *self.work_shape)
+        for layer in self.layers:
+            if layer == 'flatten':
+                out = out.reshape(len(out), -1)
+            else:
+                out = layer.forward(out)
+        return out.copy()
+
+    __call__ = predict
+
+
+def build_numpy_model(architecture, input_dim=784, weights=None):
+    """
+    Construye la arquitectura con el motor NumPy: `mlp_numpy.MLP` si solo
+    tiene capas Dense (y Dropout), `NumpySequential` si tiene Conv/Pool.
+    """
+    specs, shape, work_shape = _resolve(architecture, input_dim)
+    dense = [s for s in specs if s.kind == 'Dense']
+    if all(s.kind in ('Dense', 'Dropout') for s in specs) and len(shape) == 1:
+        model = MLP([shape[0]] + [dict(s.params)['units'] for s in dense],
+                    [dict(s.params)['activation'] for s in dense])
+    else:
+        model = NumpySequential(specs, shape, work_shape)
+    if weights is not None:
+        model.set_weights(weights)
+    return model
+
+def count_params(architecture, input_dim=784) -> int:
+    """
+    Número de parámetros entrenables, sin construir el modelo Keras.
+    """
+    model = build_numpy_model(architecture, input_dim)
+    return int(sum(w.size for w in model.get_weights()))
+
+# -------------------------
+# Datos
+# -------------------------
+def load_mnist():
+    """
+    MNIST normalizado en [0,1] y aplanado: (x_train, y_train, x_test, y_test),
+    con las etiquetas como enteros.
+    """
+    (x_train, y_train), (x_test, y_test) = _keras().datasets.mnist.load_data()
+    x_train = (x_train.reshape(len(x_train), -1) / 255.0).astype(np.float32)
+    x_test = (x_test.reshape(len(x_test), -1) / 255.0).astype(np.float32)
+    return x_train, y_train.astype(np.int64), x_test, y_test.astype(np.int64)
+
+def dataset_fingerprint(data) -> str:
+    """
+    Hash del contenido de los arrays de un dataset (forma, tipo y bytes).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for arr in data:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.shape}{arr.dtype}".encode('ascii'))
+        h.update(memoryview(arr).cast('B'))
+    return h.hexdigest()
+
+# -------------------------
+# Caché de modelos entrenados
+# -------------------------
+def artifact_key(architecture, input_dim=784, hyperparams: dict = None, dataset: str = 'mnist') -> str:
+    """
+    Clave del artefacto: hash de la arquitectura normalizada, la entrada,
+    los hiperparámetros (con sus valores por defecto) y el dataset.
+    """
+    payload = {
+        'version': ARTIFACT_VERSION,
+        'architecture': canonical(architecture),
+        'input_dim': list(input_dim) if isinstance(input_dim, (tuple, list)) else int(input_dim),
+        'hyperparams': {**DEFAULT_HYPERPARAMS, **(hyperparams or {})},
+        'dataset': dataset,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+def _artifact_path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{key}.npz")
+
+def load_artifact(key: str, cache_dir: str = CACHE_DIR):
+    """
+    Devuelve `(pesos, metadatos)` del artefacto o None si no existe.
+    """
+    path = _artifact_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            weights = [data[f'w{i}'] for i in range(meta['n_weights'])]
+    except Exception as e:
+        print(f"Error leyendo el artefacto {path}: {e}")
+        return None
+    return weights, meta
+
+def save_artifact(key: str, weights, meta: dict, cache_dir: str = CACHE_DIR) -> str:
+    """
+    Guarda pesos y metadatos de forma atómica (fichero temporal + rename).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _artifact_path(key, cache_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    meta = {**meta, 'n_weights': len(weights)}
+    with open(tmp, 'wb') as fh:
+        np.savez(fh, meta=np.array(json.dumps(meta)), **{f'w{i}': np.asarray(w) for i, w in enumerate(weights)})
+    os.replace(tmp, path)
+    return path
+
+def memmap_batches(x, y, batch_size: int, shuffle: bool = False, seed: int = 0):
+    """
+    `tf.data.Dataset` que lee los lotes de `x`/`y` (p. ej. memmaps) bajo
+    demanda, en vez de convertir los arrays enteros en tensores. Con
+    `shuffle`, cada época recorre una permutación distinta.
+    """
+    import tensorflow as tf
+
+    rng = np.random.default_rng(seed)
+    n = len(x)
+
+    def generate():
+        order = rng.permutation(n) if shuffle else None
+        for start in range(0, n, batch_size):
+            if order is None:
+                idx = slice(start, start + batch_size)
+            else:
+                # Índices ordenados: lecturas más contiguas en el memmap
+                idx = np.sort(order[start:start + batch_size])
+            yield np.asarray(x[idx]), np.asarray(y[idx])
+
+    signature = (
+        tf.TensorSpec(shape=(None, *x.shape[1:]), dtype=tf.as_dtype(x.dtype)),
+        tf.TensorSpec(shape=(None, *y.shape[1:]), dtype=tf.as_dtype(y.dtype)),
+    )
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=signature)
+    # Cardinalidad conocida: Keras sabe cuántos pasos tiene cada época
+    dataset = dataset.apply(tf.data.experimental.assert_cardinality(-(-n // batch_size)))
+    return dataset.prefetch(2)
+
+def train_model(architecture: str, input_dim=784, hyperparams: dict = None, data=None, callbacks=None, verbose=0):
+    """
+    Entrena la arquitectura y la evalúa en el conjunto de test.
+
+    Args:
+        data: (x_train, y_train, x_test, y_test) con etiquetas enteras; por defecto
+            MNIST. Si son memmaps se entrena por lotes con `memmap_batches`
+        callbacks: callbacks de Keras (p. ej. parada temprana)
+
+    Returns:
+        (modelo Keras, metadatos con historial, exactitud y parámetros)
+    """
+    hp = {**DEFAULT_HYPERPARAMS, **(hyperparams or {})}
+    keras = _keras()
+    keras.utils.set_random_seed(hp['seed'])
+    x_train, y_train, x_test, y_test = data if data is not None else load_mnist()
+
+    model = compile_model(architecture, input_dim, optimizer=hp['optimizer'], learning_rate=hp['learning_rate'],
+                          loss='sparse_categorical_crossentropy')
+    t0 = time.perf_counter()
+    if isinstance(x_train, np.memmap):
+        # Sin copiar el dataset a memoria: solo se lee cada lote del memmap
+        history = model.fit(memmap_batches(x_train, y_train, hp['batch_size'], shuffle=True, seed=hp['seed']),
+                            epochs=hp['epochs'], validation_data=memmap_batches(x_test, y_test, 1024),
+                            shuffle=False, callbacks=callbacks, verbose=verbose)
+    else:
+        history = model.fit(x_train, y_train, epochs=hp['epochs'], batch_size=hp['batch_size'],
+                            validation_data=(x_test, y_test), callbacks=callbacks, verbose=verbose)
+    train_s = time.perf_counter() - t0
+
+    values = {k: [float(v) for v in vs] for k, vs in history.history.items()}
+    meta = {
+        'architecture': canonical(architecture),
+        'input_dim': list(input_dim) if isinstance(input_dim, (tuple, list)) else int(input_dim),
+        'hyperparams': hp,
+        'history': values,
+        'epochs_run': len(values.get('loss', [])),
+        'val_accuracy': values['val_accuracy'][-1] if values.get('val_accuracy') else None,
+        'params': int(model.count_params()),
+        'train_seconds': train_s,
+    }
+    return model, meta
+
+def get_trained_model(architecture: str, input_dim=784, backend: str = 'keras', hyperparams: dict = None,
+                      data=None, dataset: str = None, cache_dir: str = CACHE_DIR, callbacks=None, verbose=0):
+    """
+    Devuelve la arquitectura entrenada, cargándola de la caché si ya existe.
+
+    Args:
+        backend: 'keras' (modelo compilado) o 'numpy' (motor NumPy, sin TensorFlow si está en caché)
+        data: dataset propio (x_train, y_train, x_test, y_test); por defecto MNIST
+        dataset: nombre estable del dataset para la clave; si se pasa `data`
+            sin nombre, se usa un hash de su contenido
+        callbacks: callbacks de Keras; si detienen el entrenamiento antes de
+            tiempo el resultado no se guarda en la caché
+
+    Returns:
+        (modelo, metadatos); `metadatos['cached']` indica si vino de la caché
+    """
+    if backend not in ('keras', 'numpy'):
+        raise ValueError(f"Unsupported backend: {backend}")
+    if dataset is None:
+        dataset = 'mnist' if data is None else dataset_fingerprint(data)
+    key = artifact_key(architecture, input_dim, hyperparams, dataset)
+
+    artifact = load_artifact(key, cache_dir)
+    if artifact is not None:
+        weights, meta = artifact
+        if backend == 'numpy':
+            model = build_numpy_model(architecture, input_dim, weights)
+        else:
+            hp = meta['hyperparams']
+            model = compile_model(architecture, input_dim, optimizer=hp['optimizer'],
+                                  learning_rate=hp['learning_rate'], loss='sparse_categorical_crossentropy')
+            model.set_weights(weights)
+        return model, {**meta, 'key': key, 'cached': True}
+
+    model, meta = train_model(architecture, input_dim, hyperparams, data=data, callbacks=callbacks, verbose=verbose)
+    meta['dataset'] = dataset
+    weights = model.get_weights()
+    if meta['epochs_run'] == meta['hyperparams']['epochs']:
+        save_artifact(key, weights, meta, cache_dir)
+    if backend == 'numpy':
+        model = build_numpy_model(architecture, input_dim, weights)
+    return model, {**meta, 'key': key, 'cached': False}
+
+
+# -------------------------
+# Uso desde la línea de comandos
+# -------------------------
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Entrena (o carga de la caché) una arquitectura sobre MNIST")
+    parser.add_argument('architecture', nargs='?', default="Dense(128, relu) -> Dense(64, relu) -> Dense(10, softmax)")
+    parser.add_argument('--input-dim', type=int, default=28*28)
+    parser.add_argument('--epochs', type=int, default=DEFAULT_HYPERPARAMS['epochs'])
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_HYPERPARAMS['batch_size'])
+    parser.add_argument('--learning-rate', type=float, default=DEFAULT_HYPERPARAMS['learning_rate'])
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    _, meta = get_trained_model(
+        args.architecture, args.input_dim, backend='numpy', cache_dir=args.cache_dir, verbose=1,
+        hyperparams={'epochs': args.epochs, 'batch_size': args.batch_size, 'learning_rate': args.learning_rate},
+    )
+    origen = 'caché' if meta['cached'] else 'entrenado'
+    print(f"{meta['architecture']}: val_accuracy={meta['val_accuracy']:.4f}, "
+          f"{meta['params']} parámetros ({origen}, {time.perf_counter() - t0:.2f}s)")
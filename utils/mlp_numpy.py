@@ -1,47 +1,186 @@
 # utils/mlp_numpy.py
+import io
+import json
+import threading
+import zipfile
 import numpy as np
 
-def sigmoid(x):
-    return 1 / (1 + np.exp(-x))
+# -------------------------
+# Activaciones (in-place sobre el buffer de la capa)
+# -------------------------
+def sigmoid(x, out=None):
+    out = np.negative(x, out=out)
+    np.exp(out, out=out)
+    out += 1.0
+    np.reciprocal(out, out=out)
+    return out
 
-def relu(x):
-    return np.maximum(0, x)
+def relu(x, out=None):
+    return np.maximum(x, 0, out=out)
 
-class Neuron:
-    def __init__(self, n_inputs, activation='sigmoid'):
-        self.weights = np.random.randn(n_inputs) * 0.01
-        self.bias = 0.0
-        self.activation_name = activation
-        if activation == 'sigmoid':
-            self.activation = sigmoid
-        elif activation == 'relu':
-            self.activation = relu
-        else:
-            raise ValueError(f"Unsupported activation: {activation}")
+def softmax(x, out=None):
+    out = np.subtract(x, x.max(axis=-1, keepdims=True), out=out)
+    np.exp(out, out=out)
+    out /= out.sum(axis=-1, keepdims=True)
+    return out
+
+def linear(x, out=None):
+    if out is None or out is x:
+        return x
+    np.copyto(out, x)
+    return out
+
+ACTIVATIONS = {
+    'sigmoid': sigmoid,
+    'relu': relu,
+    'softmax': softmax,
+    'linear': linear,
+    None: linear,
+}
 
-    def forward(self, x):
-        z = np.dot(x, self.weights) + self.bias
-        return self.activation(z)
 
 class Layer:
-    def __init__(self, n_inputs, n_neurons, activation='sigmoid'):
-        self.neurons = [Neuron(n_inputs, activation) for _ in range(n_neurons)]
+    """
+    Capa densa con pesos en una matriz contigua `W (n_inputs, n_neurons)`.
+
+    El forward es un único `X @ W + b` por lote. Los buffers de salida se
+    reservan por tamaño de lote y se reutilizan entre llamadas (uno por hilo).
+    """
+
+    def __init__(self, n_inputs, n_neurons, activation='sigmoid', dtype=np.float32):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}")
+        self.weights = np.ascontiguousarray(np.random.randn(n_inputs, n_neurons) * 0.01, dtype=dtype)
+        self.bias = np.zeros(n_neurons, dtype=dtype)
+        self.activation_name = activation
+        self.activation = ACTIVATIONS[activation]
+        self._local = threading.local()
+
+    @property
+    def n_inputs(self):
+        return self.weights.shape[0]
+
+    @property
+    def n_neurons(self):
+        return self.weights.shape[1]
+
+    def set_weights(self, weights, bias):
+        weights = np.asarray(weights)
+        bias = np.asarray(bias)
+        if weights.ndim != 2 or bias.shape != (weights.shape[1],):
+            raise ValueError(f"Invalid weight shapes: {weights.shape}, {bias.shape}")
+        self.weights = np.ascontiguousarray(weights, dtype=self.weights.dtype)
+        self.bias = np.ascontiguousarray(bias, dtype=self.bias.dtype)
+        self._local = threading.local()
+
+    def _buffer(self, n_rows):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(n_rows)
+        if buf is None or buf.shape[1] != self.n_neurons:
+            buf = buffers[n_rows] = np.empty((n_rows, self.n_neurons), dtype=self.weights.dtype)
+        return buf
 
     def forward(self, X):
-        return np.array([neuron.forward(X) for neuron in self.neurons]).T
+        out = np.matmul(X, self.weights, out=self._buffer(len(X)))
+        out += self.bias
+        return self.activation(out, out=out)
+
 
 class MLP:
-    def __init__(self, layer_sizes, activations):
+    def __init__(self, layer_sizes, activations, dtype=np.float32):
         """
         layer_sizes: lista de tamaño de capas, ej. [784, 128, 64, 10]
         activations: lista de activaciones para cada capa (excepto entrada)
         """
+        self.dtype = dtype
         self.layers = []
         for i in range(1, len(layer_sizes)):
-            self.layers.append(Layer(layer_sizes[i-1], layer_sizes[i], activations[i-1]))
+            self.layers.append(Layer(layer_sizes[i-1], layer_sizes[i], activations[i-1], dtype=dtype))
+
+    @property
+    def input_dim(self):
+        return self.layers[0].n_inputs
+
+    def get_weights(self):
+        """
+        Lista [W0, b0, W1, b1, ...] en el mismo orden que `keras.Model.get_weights()`.
+        """
+        weights = []
+        for layer in self.layers:
+            weights.extend([layer.weights, layer.bias])
+        return weights
+
+    def set_weights(self, weights):
+        if len(weights) != 2 * len(self.layers):
+            raise ValueError(f"Expected {2 * len(self.layers)} arrays, got {len(weights)}")
+        for i, layer in enumerate(self.layers):
+            layer.set_weights(weights[2*i], weights[2*i + 1])
 
     def predict(self, X):
-        out = X
+        """
+        Forward por lotes. Acepta `(N, input_dim)` o imágenes `(N, 28, 28)`
+        y devuelve una copia de la salida de la última capa.
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        out = X.reshape(-1, self.input_dim) if X.ndim != 2 or X.shape[1] != self.input_dim else X
         for layer in self.layers:
             out = layer.forward(out)
-        return out
+        return out.copy()
+
+    __call__ = predict
+
+    @classmethod
+    def from_keras_model(cls, model):
+        """
+        Construye el motor NumPy a partir de un modelo Keras Sequential de capas Dense.
+        """
+        dense = [layer for layer in model.layers if layer.__class__.__name__ == 'Dense']
+        if not dense or len(dense) != len(model.layers):
+            raise ValueError("Only Sequential models made of Dense layers are supported")
+        sizes = [dense[0].get_weights()[0].shape[0]] + [layer.units for layer in dense]
+        acts = [layer.get_config()['activation'] for layer in dense]
+        mlp = cls(sizes, acts)
+        mlp.set_weights(model.get_weights())
+        return mlp
+
+
+def load_keras_mlp(path: str) -> MLP:
+    """
+    Carga un MLP guardado en formato `.keras` (Keras 3) sin importar TensorFlow.
+
+    Lee la arquitectura de `config.json` y los pesos de las capas Dense de
+    `model.weights.h5` (grupos `layers/<clave>/vars/{0,1}`) con h5py. Keras 3
+    no usa el nombre de la capa como clave sino la clase con un contador en
+    el orden del modelo (`dense`, `dense_1`, ...); en h5 esas claves se
+    listan por orden alfabético (`dense_10` antes que `dense_2`), así que se
+    reconstruyen a partir del orden de `config.json`.
+    """
+    import h5py
+
+    with zipfile.ZipFile(path) as zf:
+        config = json.loads(zf.read('config.json'))
+        weights_blob = zf.read('model.weights.h5')
+
+    layers_cfg = [l for l in config['config']['layers'] if l['class_name'] != 'InputLayer']
+    if any(l['class_name'] != 'Dense' for l in layers_cfg):
+        raise ValueError("Only Sequential models made of Dense layers are supported")
+
+    weights = []
+    with h5py.File(io.BytesIO(weights_blob), 'r') as h5:
+        stored = h5['layers']
+        for i, l in enumerate(layers_cfg):
+            key = 'dense' if i == 0 else f'dense_{i}'
+            if key not in stored:
+                key = l['config']['name']  # ficheros que usan el nombre de la capa
+            if key not in stored:
+                raise ValueError(f"Weights for layer '{l['config']['name']}' not found in model.weights.h5")
+            group = stored[key]['vars']
+            weights.extend([group['0'][()], group['1'][()]])
+
+    sizes = [weights[0].shape[0]] + [l['config']['units'] for l in layers_cfg]
+    acts = [l['config']['activation'] for l in layers_cfg]
+    mlp = MLP(sizes, acts)
+    mlp.set_weights(weights)
+    return mlp
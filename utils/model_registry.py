@@ -0,0 +1,122 @@
+# utils/model_registry.py
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Tiempos de arranque (imports y cargas de modelos) en segundos
+STARTUP_TIMINGS = {}
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def record_timing(label: str):
+    """
+    Mide el bloque y lo guarda en STARTUP_TIMINGS[label].
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            STARTUP_TIMINGS[label] = time.perf_counter() - t0
+
+
+def timed_import(module_name: str):
+    """
+    Importa un módulo bajo demanda registrando cuánto tardó la primera vez.
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with record_timing(f"import {module_name}"):
+        return importlib.import_module(module_name)
+
+
+class ModelRegistry:
+    """
+    Registro de modelos con carga perezosa.
+
+    Cada entrada se registra con una función `loader` que no se ejecuta hasta
+    el primer `get(name)` (o hasta `warmup`). La carga está protegida por un
+    lock por entrada, así que peticiones concurrentes esperan a una única
+    carga. `publish` sustituye el objeto servido de forma atómica.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._objects = {}
+        self._locks = {}
+        self._errors = {}
+        self._warmup_thread = None
+
+    def register(self, name: str, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._objects
+
+    def get(self, name: str):
+        """
+        Devuelve el objeto registrado, cargándolo si es la primera vez.
+        """
+        try:
+            return self._objects[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name not in self._objects:
+                try:
+                    with record_timing(f"load {name}"):
+                        obj = self._loaders[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._errors.pop(name, None)
+                self._objects[name] = obj
+            return self._objects[name]
+
+    def publish(self, name: str, obj):
+        """
+        Sustituye el objeto servido bajo `name`.
+        """
+        self._objects[name] = obj
+
+    def warmup(self, names=None, imports=(), background: bool = True):
+        """
+        Carga las entradas indicadas (todas por defecto) y precarga módulos.
+        Con `background=True` se hace en un hilo daemon y no bloquea el arranque.
+        """
+        names = list(names or self._loaders)
+
+        def _run():
+            for module_name in imports:
+                try:
+                    timed_import(module_name)
+                except Exception as e:
+                    print(f"Error importando {module_name}: {e}")
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Error cargando modelo '{name}': {e}")
+
+        if not background:
+            _run()
+            return None
+        self._warmup_thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def status(self) -> dict:
+        return {
+            name: {
+                'loaded': name in self._objects,
+                'available': self._objects.get(name) is not None,
+                'load_seconds': STARTUP_TIMINGS.get(f"load {name}"),
+                'error': self._errors.get(name),
+            }
+            for name in self._loaders
+        }
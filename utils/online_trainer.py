@@ -0,0 +1,204 @@
+# utils/online_trainer.py
+import queue
+import threading
+import time
+
+import numpy as np
+
+from utils.instrumentation import Histogram
+from utils.training_utils import incremental_train
+
+
+def load_mnist_replay():
+    """
+    Carga MNIST (train) normalizado y aplanado para usarlo como replay.
+    """
+    from tensorflow import keras
+
+    (x_train, y_train), _ = keras.datasets.mnist.load_data()
+    x_train = x_train.reshape(-1, 28*28).astype(np.float32) / 255.0
+    return x_train, y_train.astype(np.int64)
+
+
+class OnlineTrainer:
+    """
+    Entrenamiento en segundo plano a partir del feedback etiquetado.
+
+    Las muestras se encolan con `submit` y un hilo las agrupa en mini-lotes
+    (`batch_size` o `max_wait_s` desde la primera). Cada mini-lote se mezcla
+    con `replay_ratio` veces su tamaño de muestras MNIST, para evitar el
+    olvido catastrófico, y se entrena con `incremental_train`.
+
+    Hay dos copias del modelo (doble buffer): se entrena siempre la copia de
+    reserva y después se publica con `publish(model, runtime)`, de modo que
+    las predicciones en curso nunca ven pesos a medio actualizar.
+
+    Args:
+        front_model: modelo Keras que se está sirviendo
+        front_runtime: runtime de inferencia asociado a `front_model`
+        make_runtime: función `model -> runtime` para la copia de reserva
+        publish: función `(model, runtime) -> None` que sustituye lo servido
+        batch_size: tamaño del mini-lote de feedback
+        max_wait_s: espera máxima antes de entrenar un lote incompleto
+        replay_ratio: muestras de replay por muestra de feedback
+        replay_loader: función que devuelve `(x, y)` para el replay
+        on_publish: callback tras cada publicación (p. ej. invalidar cachés)
+    """
+
+    DEPLOY_BUCKETS_S = (0.5, 1, 2, 5, 10, 30, 60, 300)
+    TRAIN_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self, front_model, front_runtime, make_runtime, publish,
+                 batch_size: int = 32, max_wait_s: float = 2.0, replay_ratio: float = 1.0,
+                 replay_loader=load_mnist_replay, on_publish=None, num_classes: int = 10):
+        from tensorflow import keras
+
+        self.keras = keras
+        self.publish = publish
+        self.on_publish = on_publish
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait_s = max_wait_s
+        self.replay_ratio = replay_ratio
+        self.replay_loader = replay_loader
+        self.num_classes = num_classes
+
+        back_model = keras.models.clone_model(front_model)
+        back_model.set_weights(front_model.get_weights())
+        back_model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+        self._front = (front_model, front_runtime)
+        self._back = (back_model, make_runtime(back_model))
+
+        self._queue = queue.Queue()
+        self._replay = None
+        self._rng = np.random.default_rng()
+        self._thread = threading.Thread(target=self._run, name="online-trainer", daemon=True)
+        self._stopping = False
+
+        self.samples_trained = 0
+        self.batches_trained = 0
+        self.last_deploy = None
+        self.last_error = None
+        self.feedback_to_deploy_s = Histogram(self.DEPLOY_BUCKETS_S)
+        self.train_ms = Histogram(self.TRAIN_BUCKETS_MS)
+
+        self._thread.start()
+
+    # -------------------------
+    # API pública
+    # -------------------------
+    def submit(self, x, label: int) -> int:
+        """
+        Encola una muestra (28x28 o 784 valores en [0,1]) y devuelve la
+        profundidad de la cola.
+        """
+        if self._stopping:
+            raise RuntimeError("El entrenador en línea se está deteniendo")
+        self._queue.put((np.asarray(x, dtype=np.float32).reshape(-1), int(label), time.time()))
+        return self._queue.qsize()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth(),
+            'batch_size': self.batch_size,
+            'max_wait_s': self.max_wait_s,
+            'replay_ratio': self.replay_ratio,
+            'samples_trained': self.samples_trained,
+            'batches_trained': self.batches_trained,
+            'last_deploy': self.last_deploy,
+            'last_error': self.last_error,
+            'feedback_to_deploy_s': self.feedback_to_deploy_s.snapshot(),
+            'train_ms': self.train_ms.snapshot(),
+        }
+
+    def shutdown(self, drain: bool = True, timeout: float = None):
+        self._stopping = True
+        if not drain:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # -------------------------
+    # Hilo de fondo
+    # -------------------------
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            try:
+                self._train_and_publish(batch)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error en entrenamiento en línea: {e}")
+
+    def _replay_sample(self, n: int):
+        if n <= 0 or self.replay_loader is None:
+            return None
+        if self._replay is None:
+            try:
+                self._replay = self.replay_loader()
+            except Exception as e:
+                print(f"Replay no disponible: {e}")
+                self.replay_loader = None
+                return None
+        x, y = self._replay
+        idx = self._rng.choice(len(x), size=min(n, len(x)), replace=False)
+        return x[idx], y[idx]
+
+    def _train_and_publish(self, batch):
+        x = np.stack([item[0] for item in batch])
+        y = np.array([item[1] for item in batch], dtype=np.int64)
+
+        replay = self._replay_sample(int(round(len(batch) * self.replay_ratio)))
+        if replay is not None:
+            x = np.concatenate([x, replay[0]])
+            y = np.concatenate([y, replay[1]])
+        perm = self._rng.permutation(len(x))
+        x, y = x[perm], y[perm]
+        y_onehot = self.keras.utils.to_categorical(y, num_classes=self.num_classes)
+
+        back_model, back_runtime = self._back
+        front_model, _ = self._front
+        # La copia de reserva parte de los últimos pesos publicados
+        back_model.set_weights(front_model.get_weights())
+
+        t0 = time.perf_counter()
+        incremental_train(back_model, x, y_onehot, epochs=1, batch_size=len(x), verbose=0)
+        self.train_ms.observe((time.perf_counter() - t0) * 1000.0)
+        back_runtime.refresh(back_model.get_weights())
+
+        # Intercambio de buffers
+        self._front, self._back = self._back, self._front
+        self.publish(*self._front)
+        if self.on_publish:
+            self.on_publish()
+
+        now = time.time()
+        self.last_deploy = now
+        self.samples_trained += len(batch)
+        self.batches_trained += 1
+        for _, _, enqueued in batch:
+            self.feedback_to_deploy_s.observe(now - enqueued)
@@ -0,0 +1,238 @@
+# utils/prediction_store.py
+import os
+import json
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    id       TEXT UNIQUE,
+    user     TEXT,
+    time     TEXT,
+    pred_mlp INTEGER,
+    pred_cnn INTEGER,
+    record   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions (user, seq);
+CREATE INDEX IF NOT EXISTS idx_predictions_time ON predictions (time);
+"""
+
+
+class PredictionStore:
+    """
+    Almacén de predicciones sobre SQLite en modo WAL.
+
+    Cada escritura es un INSERT (append-only, O(1) respecto al tamaño del
+    historial). `id` tiene un índice único y `user` un índice secundario,
+    de modo que las consultas por id o por usuario no recorren todo el log.
+    El registro original se guarda tal cual como JSON en la columna `record`.
+    """
+
+    def __init__(self, db_path: str, legacy_json: str = None):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._listeners = []
+        if hasattr(os, 'register_at_fork'):
+            # Las conexiones SQLite no se pueden compartir entre procesos
+            os.register_at_fork(after_in_child=self._reset_connections)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+        if legacy_json and os.path.exists(legacy_json):
+            self._import_legacy_json(legacy_json)
+
+    # -------------------------
+    # Conexiones (una por hilo)
+    # -------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _reset_connections(self):
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _import_legacy_json(self, path: str):
+        """
+        Importa una única vez el antiguo `predictions.json` (lista con el
+        registro más reciente primero) si la base de datos está vacía.
+        """
+        if self.count() > 0:
+            return
+        with open(path, 'r', encoding='utf-8') as fh:
+            try:
+                data = json.load(fh)
+            except json.JSONDecodeError:
+                data = []
+        # El JSON antiguo está en orden descendente; se inserta del más
+        # antiguo al más reciente para conservar el orden por `seq`.
+        self.add_many(list(reversed(data)))
+
+    # -------------------------
+    # Escritura
+    # -------------------------
+    @staticmethod
+    def _row(record: dict):
+        return (
+            record.get('id'),
+            record.get('user'),
+            record.get('time'),
+            record.get('pred_mlp'),
+            record.get('pred_cnn'),
+            json.dumps(record, ensure_ascii=False),
+        )
+
+    def add(self, record: dict) -> dict:
+        """
+        Añade un registro al final del almacén.
+        """
+        return self.add_many([record])[0]
+
+    def add_many(self, records: list) -> list:
+        """
+        Añade varios registros en una sola transacción.
+        """
+        if not records:
+            return records
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions "
+                "(id, user, time, pred_mlp, pred_cnn, record) VALUES (?, ?, ?, ?, ?, ?)",
+                [self._row(r) for r in records],
+            )
+        for listener in self._listeners:
+            try:
+                listener(records)
+            except Exception as e:
+                print(f"Error notificando una escritura de predicciones: {e}")
+        return records
+
+    def add_listener(self, fn):
+        """
+        Registra `fn(records)`, llamada tras cada escritura confirmada.
+        """
+        self._listeners.append(fn)
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+    @staticmethod
+    def _where(user: str = None, since: str = None, until: str = None, digit: int = None,
+               before: int = None, after: int = None):
+        clauses, params = [], []
+        if before is not None:
+            clauses.append("seq < ?")
+            params.append(before)
+        if after is not None:
+            clauses.append("seq > ?")
+            params.append(after)
+        if user:
+            clauses.append("user = ?")
+            params.append(user)
+        if since:
+            clauses.append("time >= ?")
+            params.append(since)
+        if until:
+            clauses.append("time <= ?")
+            params.append(until)
+        if digit is not None:
+            clauses.append("(pred_mlp = ? OR pred_cnn = ?)")
+            params.extend([digit, digit])
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def get(self, pred_id: str):
+        """
+        Devuelve el registro con ese id o None.
+        """
+        row = self._conn().execute(
+            "SELECT record FROM predictions WHERE id = ?", (pred_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recent(self, limit: int = 50, user: str = None, pred: int = None) -> list:
+        """
+        Devuelve los `limit` registros más recientes, opcionalmente filtrados
+        por usuario y por dígito predicho (MLP o CNN).
+        """
+        return self.query(limit=limit, user=user, digit=pred)[0]
+
+    def query(self, limit: int = 50, cursor: int = None, user: str = None,
+              since: str = None, until: str = None, digit: int = None):
+        """
+        Página de registros (más reciente primero) con paginación por cursor.
+
+        Args:
+            limit: tamaño de página
+            cursor: `next_cursor` de la página anterior (None = primera página)
+            user / since / until / digit: mismos filtros que `iter_records`
+
+        Returns:
+            (registros, next_cursor); next_cursor es None en la última página
+        """
+        where, params = self._where(user=user, since=since, until=until, digit=digit, before=cursor)
+        sql = "SELECT seq, record FROM predictions" + where + " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self._conn().execute(sql, params).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(raw) for _, raw in rows[:limit]], next_cursor
+
+    def last_seq(self) -> int:
+        """
+        Secuencia de la última escritura; cambia con cada inserción, así que
+        sirve como versión barata del almacén (ETag).
+        """
+        return self._conn().execute("SELECT COALESCE(MAX(seq), 0) FROM predictions").fetchone()[0]
+
+    def iter_records(self, user: str = None, since: str = None, until: str = None,
+                     digit: int = None, batch_size: int = 500, before: int = None,
+                     after: int = None, oldest_first: bool = False):
+        """
+        Itera los registros (más reciente primero) en bloques de `batch_size`
+        filas, sin cargarlos todos en memoria.
+
+        Args:
+            user: solo registros de ese usuario
+            since / until: límites ISO-8601 inclusivos sobre `time`
+            digit: dígito predicho por MLP o CNN
+            before / after: solo registros con `seq` menor / mayor que este
+            oldest_first: en orden de escritura en vez del más reciente primero
+        """
+        where, params = self._where(user=user, since=since, until=until, digit=digit, before=before, after=after)
+        sql = "SELECT record FROM predictions" + where + (" ORDER BY seq" if oldest_first else " ORDER BY seq DESC")
+
+        # Conexión propia: el generador puede vivir más que la petición
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for (raw,) in rows:
+                    yield json.loads(raw)
+        finally:
+            conn.close()
+
+    def iter_all(self):
+        """
+        Itera todos los registros (más reciente primero) sin cargarlos en memoria.
+        """
+        return self.iter_records()
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
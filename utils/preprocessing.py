@@ -3,8 +3,11 @@ import numpy as np
 from PIL import Image, ImageOps
 import base64
 import io
+import threading
 import cv2  # Necesario para centrado y bounding box
 
+from utils.instrumentation import stage, timed
+
 # Compatibilidad con diferentes versiones de Pillow
 try:
     resample_method = Image.Resampling.LANCZOS  # Pillow 10+
@@ -25,7 +28,13 @@ def _mnist_style_preprocess(img: Image.Image, target_size=(28, 28)):
 
     # Convertir a array numpy para procesar
     arr = np.array(img)
+    return _mnist_style_preprocess_array(arr, target_size)
 
+def _mnist_style_preprocess_array(arr: np.ndarray, target_size=(28, 28)):
+    """
+    Núcleo de `_mnist_style_preprocess` sobre un array uint8 que ya está en
+    polaridad MNIST (tinta blanca sobre fondo negro).
+    """
     # Binarizar para facilitar el recorte
     _, thresh = cv2.threshold(arr, 10, 255, cv2.THRESH_BINARY)
 
@@ -42,7 +51,8 @@ def _mnist_style_preprocess(img: Image.Image, target_size=(28, 28)):
     # Escalar manteniendo proporción a 20x20 máximo
     max_side = max(w, h)
     scale = 20.0 / max_side
-    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    # Trazos muy finos: al menos 1 px por lado (cv2.resize no acepta 0)
+    new_w, new_h = max(int(round(w * scale)), 1), max(int(round(h * scale)), 1)
 
     resized = cv2.resize(cropped, (new_w, new_h), interpolation=cv2.INTER_AREA)
 
@@ -61,31 +71,173 @@ def preprocess_image(image_input, target_size=(28,28), flatten=True):
     Convierte una imagen (bytes o base64) a un array normalizado listo para Keras,
     aplicando un preprocesamiento tipo MNIST.
     """
-    # Si es base64 tipo 'data:image/png;base64,...'
-    if isinstance(image_input, str) and image_input.startswith('data:image'):
-        header, base64_data = image_input.split(',', 1)
-        image_input = base64.b64decode(base64_data)
+    with stage('decode'):
+        # Si es base64 tipo 'data:image/png;base64,...'
+        if isinstance(image_input, str) and image_input.startswith('data:image'):
+            header, base64_data = image_input.split(',', 1)
+            image_input = base64.b64decode(base64_data)
+
+        img = Image.open(io.BytesIO(image_input))
+        img.load()
 
-    img = Image.open(io.BytesIO(image_input))
-    processed = _mnist_style_preprocess(img, target_size)
+    with stage('preprocess'):
+        processed = _mnist_style_preprocess(img, target_size)
 
     if flatten:
         processed = processed.flatten()
 
     return processed
 
-def preprocess_canvas_data(canvas_data, target_size=(28,28), flatten=True):
+def preprocess_canvas_data(canvas_data, target_size=(28,28), flatten=True, inverted=False):
     """
     Convierte datos de canvas (p. ej. array de píxeles) a formato listo para Keras.
-    """
-    arr = np.array(canvas_data, dtype=np.float32)
-    if arr.max() > 1:
-        arr /= 255.0  # normalizar
 
-    img = Image.fromarray((arr*255).astype(np.uint8)).convert('L')
-    processed = _mnist_style_preprocess(img, target_size)
+    Camino rápido: si `canvas_data` ya es un array uint8 2D (p. ej. el cuerpo
+    binario de /predict) se procesa directamente, sin pasar por float ni PIL.
+    Con `inverted=True` se indica que ya está en polaridad MNIST (tinta clara
+    sobre fondo negro) y no se invierte.
+    """
+    if isinstance(canvas_data, np.ndarray) and canvas_data.dtype == np.uint8 and canvas_data.ndim == 2:
+        with stage('preprocess'):
+            arr = canvas_data if inverted else 255 - canvas_data
+            processed = _mnist_style_preprocess_array(np.ascontiguousarray(arr), target_size)
+    else:
+        arr = np.array(canvas_data, dtype=np.float32)
+        if arr.max() > 1:
+            arr /= 255.0  # normalizar
+        if inverted:
+            arr = 1.0 - arr
+
+        img = Image.fromarray((arr*255).astype(np.uint8)).convert('L')
+        processed = _mnist_style_preprocess(img, target_size)
 
     if flatten:
         processed = processed.flatten()
 
     return processed
+
+# -------------------------
+# Preprocesado por lotes
+# -------------------------
+_batch_buffers = threading.local()
+
+def decode_image(image_input) -> np.ndarray:
+    """
+    Decodifica bytes o un data URL base64 a un array uint8 en escala de grises
+    (tinta oscura sobre fondo claro, igual que `Image.convert("L")`).
+    """
+    if isinstance(image_input, str) and image_input.startswith('data:image'):
+        header, base64_data = image_input.split(',', 1)
+        image_input = base64.b64decode(base64_data)
+    return np.asarray(Image.open(io.BytesIO(image_input)).convert("L"))
+
+def _to_gray(arr: np.ndarray) -> np.ndarray:
+    """
+    Convierte RGB/RGBA a gris con la misma fórmula entera que PIL (ITU-R 601-2).
+    """
+    arr = np.asarray(arr)
+    if arr.ndim == 2:
+        return arr.astype(np.uint8, copy=False)
+    rgb = arr[..., :3].astype(np.uint32)
+    gray = (rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000) >> 16
+    return gray.astype(np.uint8)
+
+def _scratch(n: int, target_size) -> np.ndarray:
+    """
+    Lienzo uint8 `(n, *target_size)` reutilizado entre llamadas (uno por hilo).
+    """
+    buf = getattr(_batch_buffers, 'canvas', None)
+    if buf is None or buf.shape[0] < n or buf.shape[1:] != tuple(target_size):
+        buf = _batch_buffers.canvas = np.empty((max(n, 1), *target_size), dtype=np.uint8)
+    view = buf[:n]
+    view.fill(0)
+    return view
+
+def _bounding_boxes(stack: np.ndarray):
+    """
+    Bounding boxes de los píxeles > 10 para un bloque `(G,H,W)` de imágenes
+    invertidas del mismo tamaño. Devuelve (x0, y0, x1, y1, vacía), cada uno `(G,)`.
+    """
+    mask = stack > 10
+    rows = mask.any(axis=2)
+    cols = mask.any(axis=1)
+    empty = ~rows.any(axis=1)
+    y0 = rows.argmax(axis=1)
+    y1 = rows.shape[1] - rows[:, ::-1].argmax(axis=1)
+    x0 = cols.argmax(axis=1)
+    x1 = cols.shape[1] - cols[:, ::-1].argmax(axis=1)
+    return x0, y0, x1, y1, empty
+
+@timed('preprocess_batch')
+def preprocess_batch(images, target_size=(28,28), invert=True, out=None, return_errors=False):
+    """
+    Versión por lotes de `_mnist_style_preprocess`.
+
+    Args:
+        images: lista de arrays decodificados (gris `(H,W)` o RGB/RGBA), p. ej.
+            de `decode_image`; pueden tener tamaños distintos
+        target_size: tamaño del lienzo de salida
+        invert: invertir (tinta oscura sobre fondo claro -> blanco sobre negro)
+        out: array float32 `(N, *target_size)` donde escribir el resultado
+        return_errors: devolver también la lista de errores por imagen
+
+    Returns:
+        tensor contiguo `(N, *target_size)` float32 en [0,1]; con
+        `return_errors`, `(tensor, errores)` donde `errores[i]` es None o el
+        mensaje de la imagen i (su fila queda a cero). Sin `return_errors`
+        el primer error se lanza como antes.
+    """
+    n = len(images)
+    if out is None:
+        out = np.empty((n, *target_size), dtype=np.float32)
+    canvas = _scratch(n, target_size)
+    errors = [None] * n
+
+    # Agrupar por tamaño para calcular los bounding boxes vectorizados
+    groups = {}
+    for i, img in enumerate(images):
+        try:
+            gray = _to_gray(img)
+            if gray.ndim != 2:
+                raise ValueError(f"Forma de imagen no soportada: {np.shape(img)}")
+        except Exception as e:
+            if not return_errors:
+                raise
+            errors[i] = str(e)
+            continue
+        groups.setdefault(gray.shape, ([], []))
+        groups[gray.shape][0].append(i)
+        groups[gray.shape][1].append(gray)
+
+    for idx, grays in groups.values():
+        stack = np.stack(grays)
+        if invert:
+            np.subtract(255, stack, out=stack)
+        x0, y0, x1, y1, empty = _bounding_boxes(stack)
+        w, h = x1 - x0, y1 - y0
+        max_side = np.maximum(np.maximum(w, h), 1)
+        scale = 20.0 / max_side
+        # Trazos muy finos: al menos 1 px por lado, igual que el camino por imagen
+        new_w = np.maximum(np.rint(w * scale).astype(np.int64), 1)
+        new_h = np.maximum(np.rint(h * scale).astype(np.int64), 1)
+        x_off = (target_size[0] - new_w) // 2
+        y_off = (target_size[1] - new_h) // 2
+
+        for k, i in enumerate(idx):
+            if empty[k]:
+                continue
+            try:
+                cropped = stack[k, y0[k]:y1[k], x0[k]:x1[k]]
+                canvas[i, y_off[k]:y_off[k]+new_h[k], x_off[k]:x_off[k]+new_w[k]] = cv2.resize(
+                    cropped, (int(new_w[k]), int(new_h[k])), interpolation=cv2.INTER_AREA
+                )
+            except Exception as e:
+                if not return_errors:
+                    raise
+                errors[i] = str(e)
+                canvas[i].fill(0)
+
+    np.divide(canvas, np.float32(255.0), out=out, dtype=np.float32)
+    if return_errors:
+        return out, errors
+    return out
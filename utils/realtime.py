@@ -0,0 +1,399 @@
+# utils/realtime.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from utils.instrumentation import Histogram
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Formatea un evento Server-Sent Events con `data` serializado en JSON.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class RealtimeSession:
+    """
+    Canal de vista previa de un cliente: guarda solo el último frame pendiente.
+
+    Cada `push` sustituye al frame que aún no se ha procesado, así que los
+    trazos intermedios que llegan mientras se evalúa uno nunca se calculan.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.latest_seq = -1
+        self.closed = False
+        self._frame = None
+        self._cond = threading.Condition()
+
+    def push(self, seq: int, payload, received: float = None) -> str:
+        """
+        Encola un frame. Devuelve 'queued', 'replaced' (había otro pendiente
+        que se descarta) o 'stale' (`seq` no es más nuevo que el último).
+        `received` es el instante de llegada (perf_counter) si no es ahora.
+        """
+        with self._cond:
+            if seq <= self.latest_seq:
+                return 'stale'
+            status = 'replaced' if self._frame is not None else 'queued'
+            received = time.perf_counter() if received is None else received
+            self._frame = (seq, payload, received)
+            self.latest_seq = seq
+            self._cond.notify()
+            return status
+
+    def next_frame(self, timeout: float):
+        """
+        Espera el siguiente frame pendiente; None si vence `timeout` o se cierra.
+        """
+        with self._cond:
+            if self._frame is None and not self.closed:
+                self._cond.wait(timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+    def is_current(self, seq: int) -> bool:
+        return seq == self.latest_seq
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class RemoteSession:
+    """
+    Sesión abierta en otro proceso: sus frames se dejan en `SharedFrames`.
+    """
+
+    closed = False
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+
+
+_FRAMES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id     TEXT PRIMARY KEY,
+    pid    INTEGER NOT NULL,
+    opened REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    session  TEXT PRIMARY KEY,
+    seq      INTEGER NOT NULL,
+    payload  BLOB NOT NULL,
+    received REAL NOT NULL
+);
+"""
+
+
+class SharedFrames:
+    """
+    Sesiones y último frame pendiente de cada una, compartidos entre
+    procesos sobre SQLite (WAL).
+
+    Con varios workers el POST de un frame puede llegar a un proceso
+    distinto del que mantiene el flujo SSE: ese proceso deja el frame aquí
+    (solo si es más nuevo que el guardado) y el dueño lo recoge al sondear.
+
+    Args:
+        db_path: ruta de la base de datos compartida
+        encode: función `payload -> bytes`
+        decode: función `bytes -> payload`
+    """
+
+    def __init__(self, db_path: str, encode, decode):
+        self.db_path = db_path
+        self.encode = encode
+        self.decode = decode
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            # Las conexiones SQLite no se pueden compartir entre procesos
+            os.register_at_fork(after_in_child=self._reset_connections)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_FRAMES_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _reset_connections(self):
+        self._local = threading.local()
+
+    # -------------------------
+    # Sesiones
+    # -------------------------
+    def register(self, session_id: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (id, pid, opened) VALUES (?, ?, ?)",
+            (session_id, os.getpid(), time.time()),
+        )
+
+    def unregister(self, session_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM frames WHERE session = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def exists(self, session_id: str) -> bool:
+        """
+        True si la sesión está abierta en un proceso vivo; las de procesos
+        que ya no existen (p. ej. un worker caído) se borran.
+        """
+        row = self._conn().execute("SELECT pid FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return False
+        if _pid_alive(row[0]):
+            return True
+        self.unregister(session_id)
+        return False
+
+    # -------------------------
+    # Frames
+    # -------------------------
+    def put(self, session_id: str, seq: int, payload) -> str:
+        """
+        Guarda el frame si es más nuevo que el pendiente. Devuelve 'queued',
+        'replaced' o 'stale' como `RealtimeSession.push`.
+        """
+        blob = sqlite3.Binary(self.encode(payload))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT seq FROM frames WHERE session = ?", (session_id,)).fetchone()
+            if row is not None and seq <= row[0]:
+                status = 'stale'
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO frames (session, seq, payload, received) VALUES (?, ?, ?, ?)",
+                    (session_id, seq, blob, time.time()),
+                )
+                status = 'queued' if row is None else 'replaced'
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def take(self, session_id: str):
+        """
+        Saca el frame pendiente de una sesión: `(seq, payload, received)`
+        con `received` en el reloj de `perf_counter`, o None.
+        """
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT seq, payload, received FROM frames WHERE session = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        seq, blob, received = row
+        # Si entretanto llegó otro más nuevo, no coincide `seq` y se recoge en el siguiente sondeo
+        conn.execute("DELETE FROM frames WHERE session = ? AND seq = ?", (session_id, seq))
+        age_s = max(0.0, time.time() - received)
+        return seq, self.decode(bytes(blob)), time.perf_counter() - age_s
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RealtimeHub:
+    """
+    Registro de sesiones de vista previa en tiempo real (SSE + POST de frames).
+
+    El flujo SSE de cada sesión es quien procesa sus frames: toma el último
+    pendiente, llama a `handle_frame(payload)` y emite el resultado solo si
+    mientras tanto no ha llegado otro más nuevo.
+
+    Con `shared` (varios procesos) las sesiones se registran también en
+    `SharedFrames`: `get` devuelve un `RemoteSession` para las abiertas en
+    otro proceso y el flujo sondea cada `poll_s` los frames que dejaron allí.
+
+    Args:
+        handle_frame: función `payload -> dict` con el resultado de un frame
+        max_sessions: número máximo de flujos abiertos a la vez
+        keepalive_s: segundos entre comentarios de keep-alive en el flujo
+        shared: `SharedFrames` común a todos los procesos, o None
+        poll_s: intervalo de sondeo de `shared`
+    """
+
+    LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000)
+
+    def __init__(self, handle_frame, max_sessions: int = 256, keepalive_s: float = 15.0,
+                 shared: SharedFrames = None, poll_s: float = 0.02):
+        self.handle_frame = handle_frame
+        self.max_sessions = max_sessions
+        self.keepalive_s = keepalive_s
+        self.shared = shared
+        self.poll_s = poll_s
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._closing = False
+
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_superseded = 0
+        self.frames_stale = 0
+        self.errors = 0
+        self.latency_ms = Histogram(self.LATENCY_BUCKETS_MS)
+
+    # -------------------------
+    # Sesiones
+    # -------------------------
+    def open(self) -> RealtimeSession:
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("El servidor se está deteniendo")
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Demasiadas sesiones en tiempo real abiertas")
+            session = RealtimeSession(uuid.uuid4().hex)
+            self._sessions[session.id] = session
+        if self.shared is not None:
+            try:
+                self.shared.register(session.id)
+            except Exception:
+                self.close(session)
+                raise
+        return session
+
+    def get(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None and self.shared is not None and self.shared.exists(session_id):
+            return RemoteSession(session_id)
+        return session
+
+    def close(self, session: RealtimeSession):
+        session.close()
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        if self.shared is not None:
+            try:
+                self.shared.unregister(session.id)
+            except Exception as e:
+                print(f"Error cerrando la sesión compartida {session.id}: {e}")
+
+    def shutdown(self):
+        """
+        Rechaza sesiones nuevas y cierra las abiertas (sus flujos terminan).
+        """
+        with self._lock:
+            self._closing = True
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.close()
+
+    # -------------------------
+    # Frames
+    # -------------------------
+    def push(self, session, seq: int, payload) -> str:
+        if isinstance(session, RemoteSession):
+            status = self.shared.put(session.id, seq, payload)
+        else:
+            status = session.push(seq, payload)
+        with self._lock:
+            self.frames_received += 1
+            if status == 'replaced':
+                self.frames_superseded += 1
+            elif status == 'stale':
+                self.frames_stale += 1
+        return status
+
+    def _next_frame(self, session: RealtimeSession):
+        """
+        Siguiente frame de la sesión, local o dejado en `shared` por otro
+        proceso; None si pasan `keepalive_s` sin ninguno.
+        """
+        if self.shared is None:
+            return session.next_frame(self.keepalive_s)
+        deadline = time.monotonic() + self.keepalive_s
+        while not session.closed:
+            frame = session.next_frame(min(self.poll_s, max(0.0, deadline - time.monotonic())))
+            if frame is not None:
+                return frame
+            remote = self.shared.take(session.id)
+            if remote is not None:
+                seq, payload, received = remote
+                if session.push(seq, payload, received=received) == 'stale':
+                    with self._lock:
+                        self.frames_stale += 1
+                    continue
+                return session.next_frame(0)
+            if time.monotonic() >= deadline:
+                return None
+        return None
+
+    def stream(self, session: RealtimeSession):
+        """
+        Generador SSE de una sesión: evento `ready` con su id y después un
+        evento `prediction` por frame procesado. Cierra la sesión al terminar.
+        """
+        try:
+            yield sse_event('ready', {'session': session.id})
+            while not session.closed:
+                frame = self._next_frame(session)
+                if frame is None:
+                    # Comentario SSE: mantiene viva la conexión y detecta desconexiones
+                    yield ": keepalive\n\n"
+                    continue
+
+                seq, payload, received = frame
+                try:
+                    result = self.handle_frame(payload)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    yield sse_event('error', {'seq': seq, 'error': str(e)})
+                    continue
+
+                if not session.is_current(seq):
+                    # Llegó un trazo más nuevo mientras se evaluaba este
+                    with self._lock:
+                        self.frames_superseded += 1
+                    continue
+
+                with self._lock:
+                    self.frames_processed += 1
+                self.latency_ms.observe((time.perf_counter() - received) * 1000.0)
+                yield sse_event('prediction', {'seq': seq, **result})
+        finally:
+            self.close(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'shared': self.shared is not None,
+                'frames_received': self.frames_received,
+                'frames_processed': self.frames_processed,
+                'frames_superseded': self.frames_superseded,
+                'frames_stale': self.frames_stale,
+                'errors': self.errors,
+                'latency_ms': self.latency_ms.snapshot(),
+            }
@@ -0,0 +1,416 @@
+# utils/sweep.py
+"""
+Barrido de arquitecturas e hiperparámetros sobre el DSL de utils/interpreter.
+
+    python -m utils.sweep \\
+        --arch "Dense(128, relu) -> Dense(10, softmax)" \\
+        --arch "Dense(256, relu) -> Dense(64, relu) -> Dense(10, softmax)" \\
+        --epochs 3 5 --batch-size 32 128 --workers 4 --min-accuracy 0.97
+
+- Los candidatos (rejilla completa o `--random N` muestras) se entrenan en
+  paralelo en un pool de procesos. Cada proceso limita los hilos de
+  TensorFlow/BLAS a `--threads` (por defecto, núcleos / workers).
+- El dataset se guarda una vez como `.npy` en models/cache/<dataset> (con
+  su huella en fingerprint.json) y cada worker lo abre con `mmap_mode='r'`:
+  todos comparten las mismas páginas en memoria y el entrenamiento lee los
+  lotes del memmap (`memmap_batches`), sin copiar el dataset en cada proceso.
+- Un candidato se detiene pronto si, tras `--check-epoch` épocas, su
+  exactitud de validación queda por debajo de la mejor terminada menos
+  `--margin` (o de `--floor`).
+- Se mide la latencia de inferencia con un ejemplo (motor NumPy por
+  defecto, el que usa el servidor para el MLP) y el número de parámetros,
+  y se informa del frente de Pareto (exactitud / latencia / parámetros) y
+  del modelo más rápido que alcanza `--min-accuracy`.
+
+Los modelos terminados quedan en la caché de utils/interpreter, así que
+repetir el barrido solo entrena los candidatos nuevos.
+"""
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from utils.interpreter import CACHE_DIR, DEFAULT_HYPERPARAMS, canonical, dataset_fingerprint, load_mnist
+
+DATA_DIR = os.path.join(CACHE_DIR, 'mnist')
+FINGERPRINT_FILE = 'fingerprint.json'
+DATA_FILES = ('x_train', 'y_train', 'x_test', 'y_test')
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS')
+OBJECTIVES = (('val_accuracy', 'max'), ('latency_ms', 'min'), ('params', 'min'))
+
+# -------------------------
+# Espacio de búsqueda
+# -------------------------
+def grid(architectures, **hyperparams) -> list:
+    """
+    Producto cartesiano de arquitecturas y listas de hiperparámetros.
+
+    Ejemplo: grid(archs, epochs=[3, 5], learning_rate=[1e-3, 3e-4])
+    """
+    names = sorted(hyperparams)
+    values = [hyperparams[n] if isinstance(hyperparams[n], (list, tuple)) else [hyperparams[n]] for n in names]
+    return [
+        {'architecture': canonical(arch), 'hyperparams': dict(zip(names, combo))}
+        for arch in architectures
+        for combo in itertools.product(*values)
+    ]
+
+def random_space(architectures, n: int, seed: int = 0, **hyperparams) -> list:
+    """
+    `n` candidatos al azar (sin repetir). Cada hiperparámetro es una lista
+    de valores o un par `(mín, máx)` de floats, muestreado en escala
+    logarítmica (útil para `learning_rate`).
+    """
+    rng = random.Random(seed)
+    architectures = [canonical(a) for a in architectures]
+    seen, out = set(), []
+    for _ in range(n * 20):
+        if len(out) >= n:
+            break
+        hp = {}
+        for name, space in sorted(hyperparams.items()):
+            if isinstance(space, tuple) and len(space) == 2 and all(isinstance(v, float) for v in space):
+                hp[name] = float(f"{math.exp(rng.uniform(math.log(space[0]), math.log(space[1]))):.3g}")
+            else:
+                hp[name] = rng.choice(space if isinstance(space, (list, tuple)) else [space])
+        candidate = {'architecture': rng.choice(architectures), 'hyperparams': hp}
+        key = json.dumps(candidate, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            out.append(candidate)
+    return out
+
+# -------------------------
+# Datos compartidos (memmap)
+# -------------------------
+def data_dir_for(dataset: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, dataset)
+
+def _stored_fingerprint(data_dir: str, dataset: str):
+    try:
+        with open(os.path.join(data_dir, FINGERPRINT_FILE), 'r', encoding='utf-8') as fh:
+            stored = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return stored.get('fingerprint') if stored.get('dataset') == dataset else None
+
+def prepare_shared_data(dataset: str = 'mnist', data=None, data_dir: str = None):
+    """
+    Escribe el dataset como `.npy` en su propio directorio
+    (models/cache/<dataset>) para abrirlo con memmap desde cada worker. Por
+    defecto, MNIST normalizado de utils/interpreter.
+
+    Los ficheros solo se reutilizan si su huella (`dataset_fingerprint`)
+    coincide con la guardada y, con `data`, con la de los datos pedidos.
+
+    Returns:
+        (directorio, huella del contenido)
+    """
+    data_dir = data_dir or data_dir_for(dataset)
+    stored = _stored_fingerprint(data_dir, dataset)
+    if stored is not None:
+        try:
+            current = dataset_fingerprint(open_shared_data(data_dir))
+        except (OSError, ValueError):
+            current = None
+        wanted = current if data is None else dataset_fingerprint(data)
+        if current == stored == wanted:
+            return data_dir, stored
+
+    if data is None and dataset != 'mnist':
+        raise ValueError(f"No hay datos guardados para el dataset '{dataset}': pásalos en `data`")
+    if data is not None and dataset == 'mnist':
+        raise ValueError("Con un dataset propio indica también su nombre (`dataset`)")
+    os.makedirs(data_dir, exist_ok=True)
+    arrays = data if data is not None else load_mnist()
+    marker = os.path.join(data_dir, FINGERPRINT_FILE)
+    if os.path.exists(marker):
+        os.remove(marker)  # los .npy dejan de ser válidos hasta escribir la huella nueva
+    for name, arr in zip(DATA_FILES, arrays):
+        path = os.path.join(data_dir, f"{name}.npy")
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, np.ascontiguousarray(arr))
+        os.replace(tmp, path)
+    fingerprint = dataset_fingerprint(arrays)
+    tmp = f"{marker}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump({'dataset': dataset, 'fingerprint': fingerprint}, fh)
+    os.replace(tmp, marker)
+    return data_dir, fingerprint
+
+def open_shared_data(data_dir: str = DATA_DIR):
+    return tuple(np.load(os.path.join(data_dir, f"{n}.npy"), mmap_mode='r') for n in DATA_FILES)
+
+# -------------------------
+# Worker
+# -------------------------
+_worker = {}
+
+def _init_worker(threads: int, data_dir: str, best):
+    # Antes de importar TensorFlow: leen estas variables al inicializarse
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _worker['data'] = open_shared_data(data_dir)
+    _worker['best'] = best
+
+
+def _weak_candidate_stop(check_epoch: int, floor: float, margin: float, best):
+    """
+    Callback de Keras: tras `check_epoch` épocas detiene el entrenamiento si
+    la exactitud de validación no llega a max(floor, mejor terminado - margin).
+    """
+    import tensorflow as tf
+
+    class WeakCandidateStop(tf.keras.callbacks.Callback):
+        threshold = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            if epoch + 1 != check_epoch:
+                return
+            self.threshold = max(floor, best.value - margin if best.value > 0 else 0.0)
+            if (logs or {}).get('val_accuracy', 0.0) < self.threshold:
+                self.model.stop_training = True
+
+    return WeakCandidateStop()
+
+
+def _latency(model, architecture: str, input_dim, backend: str, repeats: int) -> dict:
+    from utils.inference_runtime import InferenceRuntime
+    from utils.interpreter import build_numpy_model
+
+    engine = build_numpy_model(architecture, input_dim, model.get_weights()) if backend == 'numpy' else None
+    runtime = InferenceRuntime(model, backend=backend, engine=engine)
+    x = np.asarray(_worker['data'][2][:1], dtype=np.float32)
+    for _ in range(5):
+        runtime(x)
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        runtime(x)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return {'latency_ms': float(np.percentile(samples, 50)), 'latency_p95_ms': float(np.percentile(samples, 95))}
+
+
+def _run_candidate(index: int, candidate: dict, settings: dict) -> dict:
+    from utils.interpreter import get_trained_model
+
+    best = _worker['best']
+    hp = {**DEFAULT_HYPERPARAMS, **candidate['hyperparams']}
+    stopper = None
+    if settings['check_epoch'] and settings['check_epoch'] < hp['epochs']:
+        stopper = _weak_candidate_stop(settings['check_epoch'], settings['floor'], settings['margin'], best)
+
+    t0 = time.perf_counter()
+    model, meta = get_trained_model(
+        candidate['architecture'], settings['input_dim'], backend='keras', hyperparams=hp,
+        data=_worker['data'], dataset=settings['dataset'], cache_dir=settings['cache_dir'],
+        callbacks=[stopper] if stopper else None,
+    )
+    result = {
+        'index': index,
+        'architecture': meta['architecture'],
+        'hyperparams': hp,
+        'key': meta['key'],
+        'cached': meta['cached'],
+        'epochs_run': meta['epochs_run'],
+        'val_accuracy': meta['val_accuracy'],
+        'params': meta['params'],
+        'train_seconds': meta['train_seconds'] if not meta['cached'] else 0.0,
+        'wall_seconds': time.perf_counter() - t0,
+        'status': 'done' if meta['epochs_run'] == hp['epochs'] else 'stopped',
+    }
+    if result['status'] == 'stopped':
+        result['threshold'] = stopper.threshold
+        return result
+
+    result.update(_latency(model, candidate['architecture'], settings['input_dim'],
+                           settings['latency_backend'], settings['latency_repeats']))
+    with best.get_lock():
+        if result['val_accuracy'] > best.value:
+            best.value = result['val_accuracy']
+    return result
+
+# -------------------------
+# Resultados
+# -------------------------
+def pareto_front(results, objectives=OBJECTIVES) -> list:
+    """
+    Candidatos terminados que ningún otro domina (igual o mejor en todos
+    los objetivos y estrictamente mejor en alguno).
+    """
+    done = [r for r in results if r.get('status') == 'done']
+
+    def key(r):
+        return [r[name] if sense == 'min' else -r[name] for name, sense in objectives]
+
+    front = []
+    for r in done:
+        kr = key(r)
+        dominated = any(
+            all(a <= b for a, b in zip(ko, kr)) and any(a < b for a, b in zip(ko, kr))
+            for ko in (key(o) for o in done if o is not r)
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: r['latency_ms'])
+
+def fastest_meeting(results, min_accuracy: float):
+    """
+    El candidato terminado más rápido con `val_accuracy >= min_accuracy` (o None).
+    """
+    ok = [r for r in results if r.get('status') == 'done' and r['val_accuracy'] >= min_accuracy]
+    return min(ok, key=lambda r: (r['latency_ms'], r['params'])) if ok else None
+
+def format_report(report: dict) -> str:
+    lines = [f"{'':2} {'val_acc':>8} {'lat_ms':>8} {'params':>9} {'épocas':>6}  arquitectura / hiperparámetros"]
+    front = {r['index'] for r in report['pareto_front']}
+    failed = [r for r in report['results'] if r['status'] == 'error']
+    rows = sorted((r for r in report['results'] if r['status'] != 'error'),
+                  key=lambda r: (r['status'] != 'done', r.get('latency_ms', 0.0)))
+    for r in rows:
+        mark = '*' if r['index'] in front else ('x' if r['status'] == 'stopped' else ' ')
+        latency = f"{r['latency_ms']:8.3f}" if 'latency_ms' in r else f"{'-':>8}"
+        hp = ', '.join(f"{k}={v}" for k, v in sorted(r['hyperparams'].items()) if k != 'seed')
+        lines.append(f"{mark:2} {r['val_accuracy']:8.4f} {latency} {r['params']:9d} {r['epochs_run']:6d}  "
+                     f"{r['architecture']}  [{hp}]")
+    for r in failed:
+        lines.append(f"{'!':2} {'error':>8} {'-':>8} {'-':>9} {'-':>6}  {r['architecture']}  [{r['error']}]")
+    lines.append("* = frente de Pareto, x = detenido pronto" + (", ! = error" if failed else ""))
+    choice = report.get('choice')
+    if report.get('min_accuracy') is not None:
+        if choice:
+            lines.append(f"Más rápido con val_accuracy >= {report['min_accuracy']}: "
+                         f"{choice['architecture']} ({choice['latency_ms']:.3f} ms, {choice['val_accuracy']:.4f})")
+        else:
+            lines.append(f"Ningún candidato alcanza val_accuracy >= {report['min_accuracy']}")
+    return '\n'.join(lines)
+
+# -------------------------
+# Ejecución
+# -------------------------
+def run_sweep(candidates, workers: int = None, threads: int = None, data=None, dataset: str = 'mnist',
+              input_dim=784, data_dir: str = None, cache_dir: str = CACHE_DIR, check_epoch: int = 1,
+              floor: float = 0.0, margin: float = 0.05, latency_backend: str = 'numpy',
+              latency_repeats: int = 100, min_accuracy: float = None, verbose: bool = True) -> dict:
+    """
+    Entrena y mide los candidatos en un pool de procesos.
+
+    Args:
+        candidates: lista de `{'architecture', 'hyperparams'}` (`grid` / `random_space`)
+        workers: procesos en paralelo (por defecto, núcleos / 2)
+        threads: hilos de TensorFlow/BLAS por proceso (por defecto, núcleos / workers)
+        data / dataset: dataset propio (x_train, y_train, x_test, y_test) y su
+            nombre; por defecto MNIST. Se guarda en models/cache/<dataset>
+            (o `data_dir`) y la clave de la caché de modelos incluye su huella
+        check_epoch / floor / margin: parada temprana de candidatos débiles (0 = sin parada)
+        latency_backend: backend de InferenceRuntime para medir la latencia
+        min_accuracy: exactitud mínima para elegir el modelo más rápido
+
+    Returns:
+        informe con `results`, `pareto_front` y `choice`
+    """
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or max(1, cpus // 2), len(candidates) or 1))
+    threads = threads or max(1, cpus // workers)
+    if data is not None and dataset == 'mnist':
+        raise ValueError("Con un dataset propio indica también su nombre (`dataset`)")
+    data_dir, fingerprint = prepare_shared_data(dataset, data, data_dir)
+
+    settings = {
+        # MNIST conserva la clave 'mnist' de utils/interpreter; un dataset propio
+        # usa su huella para no reutilizar modelos entrenados con otros datos
+        'input_dim': input_dim, 'dataset': dataset if data is None else f"{dataset}-{fingerprint}",
+        'cache_dir': cache_dir, 'check_epoch': check_epoch,
+        'floor': floor, 'margin': margin, 'latency_backend': latency_backend, 'latency_repeats': latency_repeats,
+    }
+    # spawn: TensorFlow no sobrevive a un fork y el padre puede haberlo importado
+    ctx = multiprocessing.get_context('spawn')
+    best = ctx.Value('d', 0.0)
+
+    results = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(threads, data_dir, best)) as pool:
+        futures = {pool.submit(_run_candidate, i, c, settings): (i, c) for i, c in enumerate(candidates)}
+        for future in as_completed(futures):
+            index, candidate = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'index': index, **candidate, 'status': 'error', 'error': str(e)}
+                print(f"Error en el candidato {index} ({candidate['architecture']}): {e}")
+            results.append(result)
+            if verbose and result['status'] != 'error':
+                print(f"[{len(results)}/{len(candidates)}] {result['status']:7} "
+                      f"val_acc={result['val_accuracy']:.4f} {result['architecture']}")
+
+    results.sort(key=lambda r: r['index'])
+    valid = [r for r in results if r['status'] != 'error']
+    return {
+        'workers': workers,
+        'threads_per_worker': threads,
+        'seconds': time.perf_counter() - t0,
+        'min_accuracy': min_accuracy,
+        'results': results,
+        'pareto_front': pareto_front(valid),
+        'choice': fastest_meeting(valid, min_accuracy) if min_accuracy is not None else None,
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Barrido de arquitecturas e hiperparámetros sobre MNIST")
+    parser.add_argument('--arch', action='append', required=True, help="arquitectura en el DSL (repetible)")
+    parser.add_argument('--epochs', type=int, nargs='+', default=[DEFAULT_HYPERPARAMS['epochs']])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[DEFAULT_HYPERPARAMS['batch_size']])
+    parser.add_argument('--learning-rate', type=float, nargs='+', default=[DEFAULT_HYPERPARAMS['learning_rate']],
+                        help="valores; con --random, dos valores = rango log-uniforme")
+    parser.add_argument('--random', type=int, default=0, help="N candidatos al azar en vez de la rejilla")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--check-epoch', type=int, default=1)
+    parser.add_argument('--floor', type=float, default=0.0)
+    parser.add_argument('--margin', type=float, default=0.05)
+    parser.add_argument('--latency-backend', default='numpy', choices=('numpy', 'function', 'keras'))
+    parser.add_argument('--min-accuracy', type=float)
+    parser.add_argument('--output', help="guardar el informe en JSON")
+    args = parser.parse_args(argv)
+
+    space = {'epochs': args.epochs, 'batch_size': args.batch_size, 'learning_rate': args.learning_rate}
+    if args.random:
+        if len(args.learning_rate) == 2:
+            space['learning_rate'] = tuple(args.learning_rate)
+        candidates = random_space(args.arch, args.random, seed=args.seed, **space)
+    else:
+        candidates = grid(args.arch, **space)
+    print(f"{len(candidates)} candidatos")
+
+    report = run_sweep(
+        candidates, workers=args.workers, threads=args.threads, check_epoch=args.check_epoch, floor=args.floor,
+        margin=args.margin, latency_backend=args.latency_backend, min_accuracy=args.min_accuracy,
+    )
+    # El JSON se guarda antes de formatear el informe: nunca se pierde un barrido terminado
+    if args.output:
+        tmp = args.output + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        os.replace(tmp, args.output)
+    print(format_report(report))
+    print(f"{report['seconds']:.1f}s con {report['workers']} procesos x {report['threads_per_worker']} hilos")
+
+
+if __name__ == '__main__':
+    main()
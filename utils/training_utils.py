@@ -17,21 +17,27 @@ def load_base_model(model_path: str):
         return tf.keras.models.load_model(model_path)
     return None
 
-def incremental_train(model, x_new: np.ndarray, y_new: np.ndarray, epochs=1, batch_size=32):
+def incremental_train(model, x_new, y_new, epochs=1, batch_size=32, verbose=1):
     """
     Entrenamiento incremental: ajusta un modelo existente con nuevos datos.
     
     Args:
         model: modelo Keras existente
-        x_new: datos de entrada normalizados y aplanados
-        y_new: etiquetas one-hot
+        x_new: datos de entrada normalizados y aplanados, o un `tf.data.Dataset`
+            / generador de lotes `(x, y)` (p. ej. `FeedbackDataset.as_tf_dataset()`)
+        y_new: etiquetas one-hot (None si `x_new` ya produce lotes `(x, y)`)
         epochs: número de épocas
         batch_size: tamaño de batch
+        verbose: verbosidad de Keras
     
     Returns:
         history de Keras (objeto con métricas)
     """
-    history = model.fit(x_new, y_new, epochs=epochs, batch_size=batch_size, verbose=1)
+    if y_new is None:
+        # El dataset ya viene en lotes (y barajado si procede)
+        history = model.fit(x_new, epochs=epochs, verbose=verbose, shuffle=False)
+    else:
+        history = model.fit(x_new, y_new, epochs=epochs, batch_size=batch_size, verbose=verbose)
     return history
 
 def save_model(model, save_path: str):
@@ -0,0 +1,151 @@
+# utils/user_store.py
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # Bloqueo entre procesos (no disponible en Windows)
+except ImportError:
+    fcntl = None
+
+
+class UserStore:
+    """
+    Usuarios (`{usuario: hash}`) persistidos en un JSON con caché en memoria.
+
+    - Lecturas: se sirven del diccionario en memoria y solo se vuelve a
+      parsear el fichero si cambia su firma (mtime, tamaño, inodo), p. ej.
+      porque otro proceso lo ha reescrito.
+    - Escrituras: lock por proceso más `flock` sobre `<fichero>.lock` entre
+      procesos; se relee el fichero, se aplica el cambio y se escribe en un
+      temporal que sustituye al original con `os.replace` (atómico), así
+      que un registro concurrente nunca pisa a otro ni deja el JSON a medias.
+
+    Args:
+        path: ruta del fichero JSON de usuarios
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.RLock()
+        self._users = {}
+        self._signature = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path):
+            with self._file_lock():
+                if not os.path.exists(path):
+                    self._write({})
+
+    # -------------------------
+    # Fichero
+    # -------------------------
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as fh:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _refresh(self, force: bool = False):
+        """
+        Recarga la caché si el fichero ha cambiado desde la última lectura.
+        """
+        signature = self._stat_signature()
+        if not force and signature == self._signature:
+            return
+        if signature is None:
+            users = {}
+        else:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                users = json.load(fh)
+        self._users = users
+        self._signature = signature
+
+    def _write(self, users: dict):
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp = tempfile.mkstemp(prefix='.users-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(users, fh, indent=2)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._users = users
+        self._signature = self._stat_signature()
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+    def get(self, username: str):
+        """
+        Hash de la contraseña de `username` o None si no existe.
+        """
+        with self._lock:
+            self._refresh()
+            return self._users.get(username)
+
+    def __contains__(self, username: str) -> bool:
+        return self.get(username) is not None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._users)
+
+    def all(self) -> dict:
+        """Copia del diccionario completo de usuarios."""
+        with self._lock:
+            self._refresh()
+            return dict(self._users)
+
+    # -------------------------
+    # Escritura
+    # -------------------------
+    def add(self, username: str, password_hash: str) -> bool:
+        """
+        Registra un usuario nuevo. Devuelve False si ya existía.
+        """
+        with self._file_lock():
+            self._refresh()
+            if username in self._users:
+                return False
+            users = dict(self._users)
+            users[username] = password_hash
+            self._write(users)
+            return True
+
+    def set(self, username: str, password_hash: str):
+        """Crea o sustituye el hash de `username`."""
+        with self._file_lock():
+            self._refresh()
+            users = dict(self._users)
+            users[username] = password_hash
+            self._write(users)
+
+    def replace_all(self, users: dict):
+        """Sustituye todos los usuarios (compatibilidad con `save_users`)."""
+        with self._file_lock():
+            self._write(dict(users))